@@ -4,6 +4,7 @@ import pytest
 from plugins.file import File
 from plugins.kernel_configs import KernelConfigs
 from plugins.parse_file import ParseFile
+from plugins.performance import BootProfile, boot_profile_regressions
 from plugins.shell import ShellRunner
 from plugins.sysctl import Sysctl
 from plugins.systemd import Systemd
@@ -99,6 +100,23 @@ def test_startup_time(systemd: Systemd):
     )
 
 
+@pytest.mark.booted(
+    reason="We can only measure startup time if we actually boot the system"
+)
+@pytest.mark.performance_metric
+def test_boot_profile(
+    boot_profile: BootProfile, boot_profile_baseline: BootProfile | None
+):
+    for timing in boot_profile.slowest():
+        print(f"{timing.seconds:8.3f}s {timing.unit}")
+    print(f"critical path: {' -> '.join(boot_profile.critical_path())}")
+
+    if boot_profile_baseline is None:
+        pytest.skip(f"no boot profile baseline for flavor {boot_profile.flavor}")
+    regressions = boot_profile_regressions(boot_profile_baseline, boot_profile)
+    assert not regressions, f"Boot slower than baseline: {', '.join(regressions)}"
+
+
 @pytest.mark.booted(reason="Kernel test makes sense only on booted system")
 def test_kernel_not_tainted():
     with open("/proc/sys/kernel/tainted", "r") as f:
@@ -126,17 +144,13 @@ def test_no_failed_units(systemd: Systemd, shell: ShellRunner):
     ), f"{len(failed_systemd_units)} systemd units failed to load"
 
 
-def test_kernel_configs_sysrq_not_set_cloud(
-    parse_file: ParseFile, kernel_configs: KernelConfigs
-):
+def test_kernel_configs_sysrq_not_set_cloud(kernel_configs: KernelConfigs):
     """Test that the kernel config does not set magic sysrq."""
     for config in kernel_configs.get_installed():
-        line = "# CONFIG_MAGIC_SYSRQ is not set"
-        lines = parse_file.lines(
-            config.path,
-            comment_char=[],  # Disable comment filtering for kernel config files
-        )
-        assert line in lines, f"Could not find line {line} in {config.path}."
+        # Explicitly "is not set", not just missing from the config
+        assert (
+            config.options.get("CONFIG_MAGIC_SYSRQ") == "n"
+        ), f"Could not find line # CONFIG_MAGIC_SYSRQ is not set in {config.path}."
 
 
 @pytest.mark.testcov(["GL-TESTCOV-base-config-sysctl-sysrq-disable"])
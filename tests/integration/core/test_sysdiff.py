@@ -45,7 +45,10 @@ def test_sysdiff_after_tests(sysdiff: Sysdiff):
             before_snapshot is not None
         ), f"{before_suffix} snapshot not found. Make sure test_sysdiff_before_tests ran first."
 
-        after_snapshot = sysdiff.create_snapshot(after_suffix).name
+        # Only files whose stat metadata changed since before-tests are re-hashed
+        after_snapshot = sysdiff.create_snapshot(
+            after_suffix, base_snapshot=before_snapshot
+        ).name
 
         diff_result = sysdiff.compare_snapshots(before_snapshot, after_snapshot)
         if diff_result.has_changes:
@@ -67,7 +67,7 @@ def test_lib_directories_are_only_root_writable(ld_library_paths, file):
 @pytest.mark.feature("disaSTIGmedium")
 def test_python_lib_directory_is_only_root_writable(file, dpkg):
     """Verify /usr/lib/python3/dist-packages is root:root with mode rwxr-xr-x."""
-    python_pkg = dpkg.collect_installed_packages().get_package("python3")
+    python_pkg = dpkg.get_package("python3")
     if python_pkg:
         dist_packages = "/usr/lib/python3/dist-packages"
         assert file.get_owner(dist_packages) == ("root", "root")
@@ -77,7 +77,7 @@ def test_python_lib_directory_is_only_root_writable(file, dpkg):
 @pytest.mark.security_id(203675)
 def test_python_disallows_installing_packages_with_pip_on_system_level(dpkg, file):
     """Verify /usr/lib/pythonX.Y/EXTERNALLY-MANAGED exists for the installed python3 version."""
-    python_pkg = dpkg.collect_installed_packages().get_package("python3")
+    python_pkg = dpkg.get_package("python3")
     if python_pkg:
         python_major_minor_ver = ".".join(python_pkg["Version"].split(".")[:2])
         assert file.exists(
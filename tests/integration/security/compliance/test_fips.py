@@ -57,29 +57,25 @@ def test_dracut_modules_was_extended_for_fips_module(parse_file: ParseFile):
 
 
 @pytest.mark.feature("_fips")
-def test_kernel_configs_crypto_benchmark(
-    parse_file: ParseFile, kernel_configs: KernelConfigs
-):
+def test_kernel_configs_crypto_benchmark(kernel_configs: KernelConfigs):
     """
     The tcrypot module is hidden in the CONFIG_CRYPTO_BENCHMARK configuration. This needs
     to be present on our current kernel.
     """
     for config in kernel_configs.get_installed():
-        parsed_config = parse_file.parse(config.path, format="keyval")
         assert (
-            parsed_config["CONFIG_CRYPTO_BENCHMARK"] == "m"
+            config.get("CONFIG_CRYPTO_BENCHMARK") == "m"
         ), f"CONFIG_CRYPTO_BENCHMARK not set to 'm' in {config.path}"
 
 
 @pytest.mark.feature("_fips")
-def test_kernel_configs_fips(parse_file: ParseFile, kernel_configs: KernelConfigs):
+def test_kernel_configs_fips(kernel_configs: KernelConfigs):
     """
     Ensuer that we have the fips module is configured.
     """
     for config in kernel_configs.get_installed():
-        parsed_config = parse_file.parse(config.path, format="keyval")
         assert (
-            parsed_config["CONFIG_CRYPTO_FIPS"] == "y"
+            config.get("CONFIG_CRYPTO_FIPS") == "y"
         ), f"CONFIG_CRYPTO_FIPS not set to 'y' in {config.path}"
 
 
@@ -462,9 +458,7 @@ def test_kernel_hmac_file_is_present(file: File, kernel_versions: KernelVersions
     assert file.is_regular_file(f"/boot/.vmlinuz-{running_kernel.version}.hmac")
 
 
-def test_kernel_configs_btrfs_is_disabled(
-    parse_file: ParseFile, kernel_configs: KernelConfigs
-):
+def test_kernel_configs_btrfs_is_disabled(kernel_configs: KernelConfigs):
     """
     Based on our issue regarding xxhash64, we need to disable BTRFS within the kernel, since it uses
     not approved algortiehm. This test ensure that BTRFS is disabled.
@@ -474,9 +468,8 @@ def test_kernel_configs_btrfs_is_disabled(
     See: https://github.com/gardenlinux/security/issues/405
     """
     for config in kernel_configs.get_installed():
-        parsed_config = parse_file.parse(config.path, format="keyval")
         assert (
-            "CONFIG_BTRFS_FS" not in parsed_config.keys()
+            config.get("CONFIG_BTRFS_FS") == "n"
         ), f"CONFIG_BTRFS is set in {config.path}"
 
 
@@ -502,17 +495,14 @@ def test_kernel_hmac_file_is_correct(
 
 
 @pytest.mark.feature("_fips")
-def test_kernel_configs_FIPS_vendor_is_set(
-    parse_file: ParseFile, kernel_configs: KernelConfigs
-):
+def test_kernel_configs_FIPS_vendor_is_set(kernel_configs: KernelConfigs):
     """
     Ensure that the FIPS module name is set correctly for the kernel.
     It should look like as follows:
        - SAP SE Garden Linux [RELEASE] Kernel Cryptographic Module
     """
     for config in kernel_configs.get_installed():
-        parsed_config = parse_file.parse(config.path, format="keyval")
         assert (
-            parsed_config["CONFIG_CRYPTO_FIPS_NAME"]
+            config.get("CONFIG_CRYPTO_FIPS_NAME")
             == "SAP SE Garden Linux nightly Kernel Cryptographic Module"
         ), f"CONFIG_CRYPTO_BENCHMARK not set to 'm' in {config.path}"
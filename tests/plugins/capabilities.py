@@ -1,36 +1,98 @@
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
 import pytest
 from pyprctl import FileCaps
 
 from .find import FIND_RESULT_TYPE_FILE, Find
+from .inventory import FilesystemInventory
 from .shell import ShellRunner
 
+CAPABILITY_ROOTS = ["/boot", "/etc", "/usr", "/var"]
+
+CAPABILITY_XATTR = "security.capability"
+
+# Files are probed in batches to keep the per task overhead of the pool low
+PROBE_BATCH_SIZE = 512
+
+
+def has_capability_xattr(path: str) -> bool:
+    """Cheap probe whether a file (or the target of a symlink) carries file capabilities"""
+    try:
+        os.getxattr(path, CAPABILITY_XATTR)
+    except OSError:
+        return False
+    return True
+
 
 class Capabilities:
-    def __init__(self, find: Find, shell: ShellRunner):
+    def __init__(
+        self,
+        find: Find,
+        shell: ShellRunner,
+        inventory: Optional[FilesystemInventory] = None,
+        workers: Optional[int] = None,
+    ):
         self._find = find
         self._shell = shell
+        self._inventory = inventory
+        self._workers = workers or os.process_cpu_count() or 1
 
-    def get(self) -> set[str]:
-        capabilities = set()
+    def _files(self) -> Iterable[str]:
+        """
+        Files below CAPABILITY_ROOTS on the same mount, from the inventory if possible.
+        Files the inventory recorded without any extended attribute are left out.
+        """
+        if self._inventory is not None:
+            files = []
+            for root in CAPABILITY_ROOTS:
+                found = self._inventory.find(
+                    root, FIND_RESULT_TYPE_FILE, may_have_xattrs=True
+                )
+                if found is None:
+                    break
+                files.extend(found)
+            else:
+                return files
 
         self._find.same_mnt_only = True
-        self._find.root_paths = ["/boot", "/etc", "/usr", "/var"]
+        self._find.root_paths = CAPABILITY_ROOTS
         self._find.entry_type = FIND_RESULT_TYPE_FILE
+        return self._find
 
-        for file in self._find:
+    @staticmethod
+    def _probe(files: Iterable[str]) -> List[str]:
+        """Decode the capabilities of the files carrying the capability xattr"""
+        capabilities = []
+        for file in files:
+            if not has_capability_xattr(file):
+                continue
             try:
                 capability = FileCaps.get_for_file(file)
             except OSError:
-                # Skip files without capability xattr or unreadable entries
+                # Skip unreadable entries
                 continue
 
             if capability:
                 # getcap style output
-                capabilities.add(f"{file} {str(capability)}")
+                capabilities.append(f"{file} {str(capability)}")
+        return capabilities
+
+    def get(self) -> set[str]:
+        capabilities = set()
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            batches = itertools.batched(self._files(), PROBE_BATCH_SIZE)
+            for found in executor.map(self._probe, batches):
+                capabilities.update(found)
 
         return capabilities
 
 
 @pytest.fixture
-def capabilities(find: Find, shell: ShellRunner) -> Capabilities:
-    return Capabilities(find, shell)
+def capabilities(
+    find: Find, shell: ShellRunner, inventory: Optional[FilesystemInventory]
+) -> Capabilities:
+    return Capabilities(find, shell, inventory)
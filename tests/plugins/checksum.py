@@ -0,0 +1,111 @@
+import hashlib
+import io
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+# Files are read with a fixed buffer, large files (kernels, initrds, EFI binaries)
+# are hashed from the page cache through mmap without copying them
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+CHECKSUM_MMAP_THRESHOLD = 8 * 1024 * 1024
+
+StatKey = Tuple[int, int, int, int, int]
+
+
+def stat_key(st: os.stat_result) -> StatKey:
+    """Return the (dev, inode, size, mtime_ns, ctime_ns) key identifying a file version"""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+
+class ChecksumCache:
+    """Memo of file digests keyed on the stat key of the hashed file"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._digests: Dict[StatKey, Dict[str, str]] = {}
+
+    def get(self, key: StatKey) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._digests.get(key, {}))
+
+    def put(self, key: StatKey, digests: Dict[str, str]):
+        with self._lock:
+            self._digests.setdefault(key, {}).update(digests)
+
+    def clear(self):
+        with self._lock:
+            self._digests.clear()
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
+def digest_fileobj(
+    fileobj: io.BufferedIOBase, algorithms: Iterable[str] = ("sha256",)
+) -> Tuple[Dict[str, str], int]:
+    """
+    Hash an open binary file with all algorithms in a single read.
+
+    Args:
+        fileobj: File opened in binary mode, read from the current position
+        algorithms: hashlib algorithm names, e.g. ("md5", "sha256", "sha512")
+
+    Returns:
+        Tuple of algorithm => hex digest and the number of bytes hashed
+    """
+    # usedforsecurity=False is needed to use md5 in a FIPS environment
+    hashers = [hashlib.new(name, usedforsecurity=False) for name in algorithms]
+    size = os.fstat(fileobj.fileno()).st_size
+
+    if size >= CHECKSUM_MMAP_THRESHOLD and fileobj.tell() == 0:
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for hasher in hashers:
+                hasher.update(mapped)
+            hashed = len(mapped)
+    else:
+        # Pseudo files (e.g. in /proc) report a size of 0, read until EOF
+        buffer = bytearray(CHECKSUM_CHUNK_SIZE)
+        view = memoryview(buffer)
+        hashed = 0
+        while count := fileobj.readinto(buffer):
+            for hasher in hashers:
+                hasher.update(view[:count])
+            hashed += count
+
+    return {hasher.name: hasher.hexdigest() for hasher in hashers}, hashed
+
+
+def file_digests(
+    path: str | Path,
+    algorithms: Iterable[str] = ("sha256",),
+    cache: Optional[ChecksumCache] = None,
+) -> Dict[str, str]:
+    """
+    Return algorithm => hex digest of a file, all digests are computed in one pass.
+
+    With a cache only digests missing for the current version of the file are
+    computed, unchanged files are not read again.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    algorithms = [name.lower() for name in algorithms]
+    with open(path, "rb") as fileobj:
+        key = stat_key(os.fstat(fileobj.fileno()))
+        digests = cache.get(key) if cache is not None else {}
+        missing = [name for name in algorithms if name not in digests]
+        if missing:
+            computed, _ = digest_fileobj(fileobj, missing)
+            digests.update(computed)
+            if cache is not None:
+                cache.put(key, computed)
+    return {name: digests[name] for name in algorithms}
+
+
+def file_digest(
+    path: str | Path, algorithm: str = "sha256", cache: Optional[ChecksumCache] = None
+) -> str:
+    """Return the hex digest of a single algorithm of a file"""
+    return next(iter(file_digests(path, (algorithm,), cache).values()))
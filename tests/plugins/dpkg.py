@@ -1,8 +1,14 @@
-from typing import List
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
 
 import pytest
 from debian import deb822
 
+DPKG_STATUS_PATH = "/var/lib/dpkg/status"
+
+INSTALLED_STATUS = b"install ok installed"
+
 
 class InstalledPackages:
     """Collection of installed packages using deb822 paragraphs"""
@@ -11,6 +17,7 @@ class InstalledPackages:
 
     def __init__(self, packages: List[deb822.Deb822]):
         self.packages = packages
+        self._by_name: Optional[Dict[str, deb822.Deb822]] = None
 
     def __len__(self) -> int:
         return len(self.packages)
@@ -23,7 +30,133 @@ class InstalledPackages:
 
     def get_package(self, name: str):
         """Get package by name"""
-        return next((p for p in self.packages if p.get("Package") == name), None)
+        if self._by_name is None:
+            self._by_name = {}
+            for package in self.packages:
+                package_name = package.get("Package")
+                if package_name is None:
+                    continue
+                self._by_name.setdefault(package_name, package)
+        return self._by_name.get(name)
+
+
+class PackageDatabase:
+    """
+    Index of the installed packages in a dpkg status file.
+
+    The index maps package names to the byte range of their paragraph and is built in
+    one pass over the file. Paragraphs are only parsed on access. The index is rebuilt
+    whenever the status file is replaced or modified.
+    """
+
+    def __init__(self, path: str = DPKG_STATUS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._index: Dict[str, List[Tuple[int, int]]] = {}
+        self._parsed: Dict[Tuple[int, int], deb822.Deb822] = {}
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp is not None and stamp == self._stamp:
+                return
+            self._index = self._build_index()
+            self._parsed = {}
+            self._stamp = stamp
+
+    def _build_index(self) -> Dict[str, List[Tuple[int, int]]]:
+        """Map names of installed packages to (offset, length) of their paragraphs"""
+        index: Dict[str, List[Tuple[int, int]]] = {}
+        try:
+            f = open(self.path, "rb")
+        except (FileNotFoundError, PermissionError):
+            return index
+
+        with f:
+            offset = start = 0
+            name = status = None
+            for line in f:
+                if line.strip():
+                    if line.startswith(b"Package:"):
+                        name = line[8:].strip().decode()
+                    elif line.startswith(b"Status:"):
+                        status = line[7:].strip()
+                else:
+                    if name and status and status.startswith(INSTALLED_STATUS):
+                        index.setdefault(name, []).append((start, offset - start))
+                    name = status = None
+                    start = offset + len(line)
+                offset += len(line)
+            if name and status and status.startswith(INSTALLED_STATUS):
+                index.setdefault(name, []).append((start, offset - start))
+        return index
+
+    def _parse(self, f, span: Tuple[int, int]) -> deb822.Deb822:
+        paragraph = self._parsed.get(span)
+        if paragraph is None:
+            f.seek(span[0])
+            paragraph = deb822.Deb822(f.read(span[1]).decode("utf-8"))
+            self._parsed[span] = paragraph
+        return paragraph
+
+    def _read(self, spans: List[Tuple[int, int]]) -> List[deb822.Deb822]:
+        if all(span in self._parsed for span in spans):
+            return [self._parsed[span] for span in spans]
+        try:
+            with open(self.path, "rb") as f:
+                return [self._parse(f, span) for span in spans]
+        except (FileNotFoundError, PermissionError):
+            return []
+
+    def __contains__(self, name: object) -> bool:
+        self._refresh()
+        return name in self._index
+
+    def __len__(self) -> int:
+        self._refresh()
+        return sum(len(spans) for spans in self._index.values())
+
+    def names(self) -> List[str]:
+        """Sorted names of all installed packages"""
+        self._refresh()
+        return sorted(self._index)
+
+    def get(self, name: str) -> Optional[deb822.Deb822]:
+        """Parsed paragraph of an installed package, the first one for multiarch packages"""
+        self._refresh()
+        spans = self._index.get(name)
+        if not spans:
+            return None
+        paragraphs = self._read(spans[:1])
+        return paragraphs[0] if paragraphs else None
+
+    def installed_packages(self) -> InstalledPackages:
+        """All installed packages sorted by name, parses every paragraph"""
+        self._refresh()
+        spans = [span for name in sorted(self._index) for span in self._index[name]]
+        return InstalledPackages(self._read(spans))
+
+
+_package_databases: Dict[str, PackageDatabase] = {}
+
+
+def package_database(path: Optional[str] = None) -> PackageDatabase:
+    """Package database shared by all Dpkg instances of the test session"""
+    path = path or DPKG_STATUS_PATH
+    database = _package_databases.get(path)
+    if database is None:
+        database = _package_databases.setdefault(path, PackageDatabase(path))
+    return database
 
 
 class Dpkg:
@@ -32,21 +165,15 @@ class Dpkg:
 
     def collect_installed_packages(self) -> InstalledPackages:
         """Use deb822 to return installed packages"""
-        try:
-            with open("/var/lib/dpkg/status", "r", encoding="utf-8") as f:
-                packages = [
-                    paragraph
-                    for paragraph in deb822.Deb822.iter_paragraphs(f)
-                    if paragraph.get("Status", "").startswith("install ok installed")
-                ]
-                packages.sort(key=lambda p: p.get("Package", ""))
-                return InstalledPackages(packages)
-        except (FileNotFoundError, PermissionError):
-            return InstalledPackages([])
+        return package_database().installed_packages()
+
+    def get_package(self, package: str) -> Optional[deb822.Deb822]:
+        """Get an installed package by name without parsing the other packages"""
+        return package_database().get(package)
 
     def package_is_installed(self, package: str) -> bool:
         """Check if package is installed"""
-        return self.collect_installed_packages().get_package(package) is not None
+        return package in package_database()
 
     def architecture_native(self) -> str:
         """Get the native architecture of the system"""
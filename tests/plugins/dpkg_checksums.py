@@ -1,13 +1,105 @@
-import hashlib
+import io
 import os
+import shlex
+import shutil
+import tarfile
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
 from shutil import chown
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import pytest
 
+from .checksum import ChecksumCache, file_digest
+from .dpkg import package_database
+
+# Downloaded packages are looked up here before asking the apt repository
+DEB_CACHE_DIR = "/var/cache/apt/archives"
+
+AR_MAGIC = b"!<arch>\n"
+AR_HEADER_SIZE = 60
+
+
+@dataclass
+class FileChecksum:
+    """Recorded md5sum of a file shipped by a package and the md5sum of the file on disk"""
+
+    path: str
+    package: str
+    expected: str
+    actual: Optional[str]
+
+    @property
+    def matches(self) -> bool:
+        return self.actual == self.expected
+
+
+def read_deb_member(deb_path: str, prefix: str) -> Tuple[str, bytes]:
+    """
+    Return name and content of the first member of a .deb (ar) archive whose name
+    starts with prefix. Members in front of it are skipped without reading them.
+    """
+    with open(deb_path, "rb") as f:
+        if f.read(len(AR_MAGIC)) != AR_MAGIC:
+            raise ValueError(f"{deb_path} is not a deb archive")
+        while header := f.read(AR_HEADER_SIZE):
+            if len(header) < AR_HEADER_SIZE or header[58:60] != b"`\n":
+                raise ValueError(f"{deb_path} has a malformed ar member header")
+            name = header[:16].decode().strip().rstrip("/")
+            size = int(header[48:58])
+            if name.startswith(prefix):
+                return name, f.read(size)
+            # ar members are aligned to two bytes
+            f.seek(size + size % 2, os.SEEK_CUR)
+    raise ValueError(f"{deb_path} has no {prefix} member")
+
+
+def parse_md5sums(content: str) -> Dict[str, str]:
+    """Parse a md5sums control file into a dict of filepath => md5sum"""
+    checksums = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        md5, path = line.split(maxsplit=1)
+        checksums[f"/{path}"] = md5
+    return checksums
+
+
+def read_deb_md5sums(deb_path: str) -> Dict[str, str]:
+    """
+    Read the md5sums control file of a .deb in-process.
+    Raises tarfile.ReadError if the control archive uses an unsupported compression.
+    """
+    _, control = read_deb_member(deb_path, "control.tar")
+    with tarfile.open(fileobj=io.BytesIO(control), mode="r:*") as tar:
+        for member in tar:
+            if os.path.normpath(member.name) == "md5sums" and member.isfile():
+                md5sums = tar.extractfile(member)
+                if md5sums is None:
+                    raise ValueError(f"{deb_path} has an unreadable md5sums member")
+                return parse_md5sums(md5sums.read().decode())
+    # Packages without files (e.g. metapackages) do not ship md5sums
+    return {}
+
+
+def md5_file(path: str, cache: Optional[ChecksumCache] = None) -> Optional[str]:
+    """md5 checksum of a file, None if it cannot be read"""
+    try:
+        return file_digest(path, "md5", cache)
+    except OSError:
+        return None
+
 
 class DpkgChecksums:
-    def __init__(self, shell):
+    def __init__(
+        self,
+        shell,
+        cache_dirs: Iterable[str] = (DEB_CACHE_DIR,),
+        workers: Optional[int] = None,
+    ):
         """
         This plugin can be used to compare recorded checksums of files in a deb
         package to checksums of the actual files on disk in order to check if
@@ -27,55 +119,170 @@ class DpkgChecksums:
         4. you can compare a checksum from ideal_checksums to a checksum of a
         file on a disk:
         dpkg_checksums.is_matching_with_installed(ideal_checksums, "/path/to/file/from/the/package"
+
+        To check many packages at once use verify_packages, which returns a
+        report of all files shipped by the packages:
+        report = dpkg_checksums.verify_packages(["auditd", "openssh-server"])
+        assert all(entry.matches for entry in report.values())
+
+        .deb files are taken from cache_dirs if present, missing ones are
+        downloaded once into a temporary directory.
         """
         self._shell = shell
+        self._cache_dirs = [Path(d) for d in cache_dirs]
+        self._download_dir: Optional[Path] = None
+        self._workers = workers or os.process_cpu_count() or 1
+        self._checksum_cache = ChecksumCache()
+
+    def _installed_version(self, package_name: str) -> Tuple[str, str]:
+        """Version and architecture of an installed package"""
+        package = package_database().get(package_name)
+        if package is None:
+            raise ValueError(f"package {package_name} is not installed")
+        return package["Version"], package.get("Architecture", "")
+
+    def _find_deb(self, package_name: str, version: str, arch: str) -> Optional[Path]:
+        """Look up a .deb in the cache directories, apt quotes ':' of epochs as %3a"""
+        quoted_version = version.replace(":", "%3a")
+        dirs = self._cache_dirs + (
+            [self._download_dir] if self._download_dir is not None else []
+        )
+        for directory in dirs:
+            if arch:
+                deb = directory / f"{package_name}_{quoted_version}_{arch}.deb"
+                if deb.is_file():
+                    return deb
+            else:
+                candidates = sorted(
+                    directory.glob(f"{package_name}_{quoted_version}_*.deb")
+                )
+                if candidates:
+                    return candidates[0]
+        return None
+
+    def _get_download_dir(self) -> Path:
+        if self._download_dir is None:
+            self._download_dir = Path(tempfile.mkdtemp(prefix="dpkg-checksums-"))
+            if self._shell.user is not None:
+                uid, _ = self._shell.user
+                chown(self._download_dir, uid)
+        return self._download_dir
+
+    def fetch_debs(self, packages: Dict[str, Tuple[str, str]]) -> Dict[str, Path]:
+        """
+        Return the .deb files of package => (version, architecture), missing
+        ones are downloaded with a single apt-get call.
+        """
+        debs = {}
+        missing = []
+        for name, (version, arch) in packages.items():
+            deb = self._find_deb(name, version, arch)
+            if deb is None:
+                missing.append(name)
+            else:
+                debs[name] = deb
+
+        if missing:
+            download_dir = self._get_download_dir()
+            specs = " ".join(
+                shlex.quote(f"{name}={packages[name][0]}") for name in missing
+            )
+            self._shell(
+                f"cd {shlex.quote(str(download_dir))} && apt-get download {specs}"
+            )
+            for name in missing:
+                deb = self._find_deb(name, *packages[name])
+                if deb is None:
+                    raise RuntimeError(f"apt-get download did not provide {name}")
+                debs[name] = deb
+
+        return debs
+
+    def _read_md5sums(self, deb: Path) -> Dict[str, str]:
+        try:
+            return read_deb_md5sums(str(deb))
+        except tarfile.ReadError:
+            # e.g. zstd compressed control archives
+            result = self._shell(
+                f"dpkg-deb --info {shlex.quote(str(deb))} md5sums",
+                capture_output=True,
+                ignore_exit_code=True,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"dpkg-deb could not read md5sums of {deb}: {result.stderr.strip()}"
+                )
+            return parse_md5sums(result.stdout)
+
+    def _checksums(
+        self, packages: Dict[str, Tuple[str, str]]
+    ) -> Dict[str, Dict[str, str]]:
+        debs = self.fetch_debs(packages)
+        names = list(debs)
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            md5sums = executor.map(self._read_md5sums, (debs[n] for n in names))
+            return dict(zip(names, md5sums))
 
     def for_package(self, package_name, package_version="INSTALLED") -> dict:
         """
         Returns a dict of filepath => md5sum (as recorded in a package's
         md5sums control file).
         As we cannot trust md5sums files stored in /var/lib/dpkg/info, we do
-        not use debsums and instead this code fetches md5sums control file from
-        a package in an apt repository.
+        not use debsums and instead this code reads the md5sums control file from
+        the package as downloaded from an apt repository.
         """
         if package_version == "INSTALLED":
-            package_version = self._shell(
-                f"dpkg-query -W -f='${{Version}}' {package_name}", capture_output=True
-            ).stdout
+            version, arch = self._installed_version(package_name)
+        else:
+            version, arch = package_version, ""
+        return self._checksums({package_name: (version, arch)})[package_name]
 
-        oldpwd = os.getcwd()
+    def for_packages(self, package_names: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """Returns package => (filepath => md5sum) for the installed versions of packages"""
+        return self._checksums(
+            {name: self._installed_version(name) for name in package_names}
+        )
 
-        with tempfile.TemporaryDirectory(delete=False) as td:
-            uid, _ = self._shell.user
-            chown(td, uid)
-
-            os.chdir(td)
-
-            self._shell(f"apt-get download {package_name}={package_version}")
-            self._shell(f"dpkg-deb --control {package_name}*.deb")
-
-            checksums = {
-                f"/{path}": md5
-                for line in open("DEBIAN/md5sums")
-                for md5, path in [line.strip().split()]
+    def verify_packages(self, package_names: Iterable[str]) -> Dict[str, FileChecksum]:
+        """
+        Compare the files of the installed packages on disk with their recorded md5sums.
+        Returns filepath => FileChecksum, files are hashed in parallel.
+        """
+        expected: List[Tuple[str, str, str]] = [
+            (path, package, md5)
+            for package, checksums in self.for_packages(package_names).items()
+            for path, md5 in checksums.items()
+        ]
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            actual = executor.map(
+                partial(md5_file, cache=self._checksum_cache),
+                (path for path, _, _ in expected),
+            )
+            return {
+                path: FileChecksum(path, package, md5, real)
+                for (path, package, md5), real in zip(expected, actual)
             }
 
-            os.chdir(oldpwd)
-
-        return checksums
-
     def is_matching_with_installed(self, package_checksums, file_on_disk_path) -> bool:
         """
         Compares an md5 checksum of a file on disk with the one from package's
         md5sums control file.
 
-        usedforsecurity=False is needed to run in a FIPS environment
+        Raises:
+            OSError: If the file on disk is missing or cannot be read.
         """
-        with open(file_on_disk_path, "rb") as f:
-            real_checksum = hashlib.md5(f.read(), usedforsecurity=False).hexdigest()
-            return real_checksum == package_checksums[file_on_disk_path]
+        actual = file_digest(file_on_disk_path, "md5", self._checksum_cache)
+        return actual == package_checksums[file_on_disk_path]
+
+    def cleanup(self):
+        """Remove downloaded packages"""
+        if self._download_dir is not None:
+            shutil.rmtree(self._download_dir, ignore_errors=True)
+            self._download_dir = None
 
 
 @pytest.fixture
 def dpkg_checksums(shell, kernel_module):
-    return DpkgChecksums(shell)
+    dpkg_checksums = DpkgChecksums(shell)
+    yield dpkg_checksums
+    dpkg_checksums.cleanup()
@@ -1,13 +1,41 @@
 import grp
-import hashlib
 import os
 import pwd
 import stat
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Iterable, Optional, Tuple
 
 import pytest
 
+from .checksum import ChecksumCache, file_digests
+
+FILE_TYPES = {
+    stat.S_IFREG: "file",
+    stat.S_IFDIR: "directory",
+    stat.S_IFLNK: "symlink",
+    stat.S_IFCHR: "char_device",
+    stat.S_IFBLK: "block_device",
+    stat.S_IFIFO: "fifo",
+    stat.S_IFSOCK: "socket",
+}
+
+# The session wide File instance, its caches are dropped after every test
+_session_file: Optional["File"] = None
+
+
+@dataclass
+class FileInfo:
+    """Metadata of a path as returned by ``File.describe``, symlinks are not followed"""
+
+    path: str
+    type: str
+    mode: str
+    user: str
+    group: str
+    size: int
+    target: Optional[str] = None
+
 
 class File:
     """Pytest-facing facade for file metadata operations.
@@ -16,6 +44,87 @@ class File:
     existence, type, permissions, ownership, etc.
     """
 
+    def __init__(self):
+        self._checksum_cache = ChecksumCache()
+        self._lstat_cache: Dict[str, os.stat_result] = {}
+        self._user_names: Dict[int, Optional[str]] = {}
+        self._group_names: Dict[int, Optional[str]] = {}
+
+    def clear_cache(self):
+        """Drop cached stat results and user/group names."""
+        self._lstat_cache.clear()
+        self._user_names.clear()
+        self._group_names.clear()
+
+    def _user_name(self, uid: int) -> Optional[str]:
+        if uid not in self._user_names:
+            try:
+                self._user_names[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self._user_names[uid] = None
+        return self._user_names[uid]
+
+    def _group_name(self, gid: int) -> Optional[str]:
+        if gid not in self._group_names:
+            try:
+                self._group_names[gid] = grp.getgrgid(gid).gr_name
+            except KeyError:
+                self._group_names[gid] = None
+        return self._group_names[gid]
+
+    def _uid_to_name(self, uid: int) -> str:
+        name = self._user_name(uid)
+        if name is None:
+            raise KeyError(f"getpwuid(): uid not found: {uid}")
+        return name
+
+    def _gid_to_name(self, gid: int) -> str:
+        name = self._group_name(gid)
+        if name is None:
+            raise KeyError(f"getgrgid(): gid not found: {gid}")
+        return name
+
+    def _lstat(self, path: str) -> os.stat_result:
+        st = self._lstat_cache.get(path)
+        if st is None:
+            st = os.lstat(path)
+            self._lstat_cache[path] = st
+        return st
+
+    def describe(self, paths: Iterable[str | Path]) -> Dict[str, Optional[FileInfo]]:
+        """Get type, mode, ownership, size and symlink target of many paths.
+
+        Every path is lstat-ed once per test, user and group names are resolved
+        once per id. Unknown ids are reported as numbers.
+
+        Args:
+            paths: File paths.
+
+        Returns:
+            Dict[str, Optional[FileInfo]]: Metadata per path, None if the path does not exist.
+
+        Raises:
+            PermissionError: If permission to access a path is denied.
+        """
+        infos: Dict[str, Optional[FileInfo]] = {}
+        for path in map(str, paths):
+            try:
+                st = self._lstat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                infos[path] = None
+                continue
+            file_type = FILE_TYPES.get(stat.S_IFMT(st.st_mode), "unknown")
+            infos[path] = FileInfo(
+                path=path,
+                type=file_type,
+                mode=f"{stat.S_IMODE(st.st_mode):04o}",
+                user=self._user_name(st.st_uid) or str(st.st_uid),
+                group=self._group_name(st.st_gid) or str(st.st_gid),
+                size=st.st_size,
+                target=os.readlink(path) if file_type == "symlink" else None,
+            )
+        return infos
+
     def exists(self, path: str | Path) -> bool:
         """Check if a path exists (any type).
 
@@ -245,9 +354,11 @@ class File:
             FileNotFoundError: If the path does not exist.
             PermissionError: If permission to access the path is denied.
         """
-        user = self.get_user(path)
-        group = self.get_group(path)
-        return (user, group)
+        stat_info = Path(path).stat()
+        return (
+            self._uid_to_name(stat_info.st_uid),
+            self._gid_to_name(stat_info.st_gid),
+        )
 
     def get_user(self, path: str | Path) -> str:
         """Get file owner username.
@@ -262,8 +373,7 @@ class File:
             FileNotFoundError: If the path does not exist.
             PermissionError: If permission to access the path is denied.
         """
-        stat_info = Path(path).stat()
-        return pwd.getpwuid(stat_info.st_uid).pw_name
+        return self._uid_to_name(Path(path).stat().st_uid)
 
     def get_group(self, path: str | Path) -> str:
         """Get file owner group name.
@@ -278,8 +388,7 @@ class File:
             FileNotFoundError: If the path does not exist.
             PermissionError: If permission to access the path is denied.
         """
-        stat_info = Path(path).stat()
-        return grp.getgrgid(stat_info.st_gid).gr_name
+        return self._gid_to_name(Path(path).stat().st_gid)
 
     def is_owned_by_user(self, path: str | Path, user: str) -> bool:
         """Check if a file is owned by a specific user.
@@ -328,7 +437,7 @@ class File:
             FileNotFoundError: If the path does not exist.
             PermissionError: If permission to access the path is denied.
         """
-        return self.get_user(path) == user and self.get_group(path) == group
+        return self.get_owner(path) == (user, group)
 
     def has_permissions(self, path: str | Path, permissions: str | int) -> bool:
         """Check if a file has the specified permission mode.
@@ -435,13 +544,53 @@ class File:
 
         return special | mode
 
-    def checksum(self, file_path):
-        with open(file_path, "rb") as fd:
-            md5sum = hashlib.md5(fd.read(), usedforsecurity=False).hexdigest()
-        return md5sum
+    def checksum(self, file_path: str | Path, algorithm: str = "md5") -> str:
+        """Get the checksum of a file.
+
+        Args:
+            file_path: File path.
+            algorithm: hashlib algorithm name (e.g., "md5", "sha256").
+
+        Returns:
+            str: Hex digest of the file content.
+
+        Raises:
+            FileNotFoundError: If the path does not exist.
+            PermissionError: If permission to access the path is denied.
+        """
+        return self.checksums(file_path, (algorithm,))[algorithm.lower()]
+
+    def checksums(
+        self, file_path: str | Path, algorithms: Iterable[str] = ("md5", "sha256")
+    ) -> Dict[str, str]:
+        """Get several checksums of a file, computed in a single read.
+
+        Digests are memoized per file version (inode, size, mtime, ctime), an
+        unchanged file is not read again.
+
+        Args:
+            file_path: File path.
+            algorithms: hashlib algorithm names (e.g., ("md5", "sha256", "sha512")).
+
+        Returns:
+            Dict[str, str]: Hex digest per algorithm.
+
+        Raises:
+            FileNotFoundError: If the path does not exist.
+            PermissionError: If permission to access the path is denied.
+        """
+        return file_digests(file_path, algorithms, self._checksum_cache)
+
+
+def pytest_runtest_teardown(item: pytest.Item):
+    # Stat results are only valid within a test, tests may change files and users
+    if _session_file is not None:
+        _session_file.clear_cache()
 
 
 @pytest.fixture(scope="session")
 def file() -> File:
     """Fixture providing the ``File`` helper for file metadata operations."""
-    return File()
+    global _session_file
+    _session_file = File()
+    return _session_file
@@ -1,6 +1,8 @@
 import fnmatch
 import os
-from typing import Iterator, Optional, Union
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Optional, Union
 
 import pytest
 
@@ -8,6 +10,38 @@ FIND_RESULT_TYPE_FILE = "files"
 FIND_RESULT_TYPE_DIR = "directories"
 FIND_RESULT_TYPE_FILE_AND_DIR = "both"
 
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+
+
+@lru_cache(maxsize=64)
+def compile_patterns(patterns: tuple[str, ...]) -> Callable[[str], Optional[re.Match]]:
+    """Compile fnmatch patterns into a single match function for entry names"""
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns)).match
+
+
+def wanted_entry_types(entry_type: str) -> tuple[bool, bool]:
+    """Return (want directories, want files) for a FIND_RESULT_TYPE_* value"""
+    return (
+        entry_type in (FIND_RESULT_TYPE_DIR, FIND_RESULT_TYPE_FILE_AND_DIR),
+        entry_type in (FIND_RESULT_TYPE_FILE, FIND_RESULT_TYPE_FILE_AND_DIR),
+    )
+
+
+def read_mount_points() -> Optional[frozenset[str]]:
+    """Return all mount points of the current mount namespace, None if unknown"""
+    try:
+        with open(MOUNTINFO_PATH, "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    # mountinfo escapes space, tab, newline and backslash as octal
+    unescape = re.compile(r"\\([0-7]{3})")
+    return frozenset(
+        unescape.sub(lambda m: chr(int(m.group(1), 8)), line.split()[4])
+        for line in lines
+        if line.strip()
+    )
+
 
 class Find:
 
@@ -17,66 +51,122 @@ class Find:
 
         Attributes:
             same_mnt_only (bool): If True, restricts search to the same mount point.
+                Directories on other devices (mounts, btrfs subvolumes) are not
+                descended into.
             root_paths (Union[str, list[str]]): The root directory paths to start the search from.
                 If a list is provided, all paths will be searched.
             entry_type (str):
                 Specifies the type of entries to search for (files, directories, or both).
-            pattern (str):
-                Specifies the pattern to search for. If None, all files and directories will be searched.
+            pattern (Union[str, list[str]]):
+                Specifies the pattern (or any of several patterns) entry names have to match.
+                If None, all files and directories will be searched.
         """
         self.same_mnt_only: bool = False
         self.root_paths: Union[str, list[str]] = "/"
         self.entry_type: str = FIND_RESULT_TYPE_FILE
-        self.pattern: Optional[str] = None
+        self.pattern: Optional[Union[str, list[str]]] = None
 
     def __iter__(self) -> Iterator[str]:
-        return iter(list(self._find()))
-
-    def _find(self) -> Iterator[str]:
-        # Intentionally don't use pathlib/rglob for performance reasons
+        # Settings are captured here, changing them does not affect running iterations
         root_paths = self.root_paths
         if isinstance(root_paths, str):
             root_paths = [root_paths]
+        return self._find(
+            list(root_paths),
+            self.entry_type,
+            self._pattern_matcher(),
+            self.same_mnt_only,
+        )
+
+    def _pattern_matcher(self) -> Optional[Callable[[str], Optional[re.Match]]]:
+        if not self.pattern:
+            return None
+        if isinstance(self.pattern, str):
+            return compile_patterns((self.pattern,))
+        return compile_patterns(tuple(self.pattern))
+
+    def _find(
+        self,
+        root_paths: Iterable[str],
+        entry_type: str,
+        match: Optional[Callable[[str], Optional[re.Match]]],
+        same_mnt_only: bool,
+    ) -> Iterator[str]:
+        """
+        Walk the root paths like os.walk (top-down, symlinks to directories are
+        reported but not followed) using the cached type information of os.scandir.
+
+        With same_mnt_only only symlinks, directories and mount points (or every
+        entry if the mount table cannot be read) are stat-ed. The device only changes
+        at directories (mounts, btrfs subvolumes without a mountinfo entry) and at
+        files that are mount points themselves, every other file is on the device
+        of its directory.
+        """
+        # Intentionally don't use pathlib/rglob for performance reasons
+        want_dirs, want_files = wanted_entry_types(entry_type)
+        mount_points = read_mount_points() if same_mnt_only else None
 
         for root_path in root_paths:
             root_dev = os.stat(root_path).st_dev
-            for dirpath, dirnames, filenames in os.walk(root_path):
-
-                if self.entry_type in (
-                    FIND_RESULT_TYPE_DIR,
-                    FIND_RESULT_TYPE_FILE_AND_DIR,
-                ):
-                    for dirname in dirnames:
-                        # Apply pattern matching if pattern is specified
-                        if self.pattern and not fnmatch.fnmatch(dirname, self.pattern):
+            # Stack of (path as reported, resolved path for mount point lookups)
+            pending = [(root_path, os.path.realpath(root_path))]
+            while pending:
+                dirpath, real_dirpath = pending.pop()
+                try:
+                    with os.scandir(dirpath) as it:
+                        entries = list(it)
+                except OSError:
+                    continue
+
+                dirs = []
+                files = []
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+
+                    if same_mnt_only:
+                        try:
+                            if entry.is_symlink():
+                                # Symlinks are judged by their target like os.stat does
+                                on_root_dev = entry.stat().st_dev == root_dev
+                            elif (
+                                is_dir
+                                or mount_points is None
+                                or os.path.join(real_dirpath, entry.name)
+                                in mount_points
+                            ):
+                                stat_result = entry.stat(follow_symlinks=False)
+                                on_root_dev = stat_result.st_dev == root_dev
+                            else:
+                                on_root_dev = True
+                        # Skip dead symlinks
+                        except FileNotFoundError:
                             continue
-                        full_path = os.path.join(dirpath, dirname)
-                        if self.same_mnt_only:
-                            try:
-                                if os.stat(full_path).st_dev != root_dev:
-                                    continue
-                            # Skip dead symlinks
-                            except FileNotFoundError:
-                                continue
-                        yield full_path
-
-                if self.entry_type in (
-                    FIND_RESULT_TYPE_FILE,
-                    FIND_RESULT_TYPE_FILE_AND_DIR,
-                ):
-                    for filename in filenames:
-                        # Apply pattern matching if pattern is specified
-                        if self.pattern and not fnmatch.fnmatch(filename, self.pattern):
+                        if not on_root_dev:
                             continue
-                        full_path = os.path.join(dirpath, filename)
-                        if self.same_mnt_only:
-                            try:
-                                if os.stat(full_path).st_dev != root_dev:
-                                    continue
-                            # Skip dead symlinks
-                            except FileNotFoundError:
-                                continue
-                        yield full_path
+
+                    if is_dir:
+                        dirs.append(entry)
+                    else:
+                        files.append(entry)
+
+                if want_dirs:
+                    for entry in dirs:
+                        if match is None or match(entry.name):
+                            yield entry.path
+                if want_files:
+                    for entry in files:
+                        if match is None or match(entry.name):
+                            yield entry.path
+
+                # Descend in os.walk order, symlinks to directories are not followed
+                pending.extend(
+                    (entry.path, os.path.join(real_dirpath, entry.name))
+                    for entry in reversed(dirs)
+                    if not entry.is_symlink()
+                )
 
 
 @pytest.fixture
@@ -0,0 +1,269 @@
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import re
+import shutil
+import subprocess
+import threading
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Set
+
+try:
+    # Python 3.14+
+    from compression import zstd  # type: ignore[import-not-found]
+except ImportError:
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+CPIO_NEWC_MAGICS = (b"070701", b"070702")
+CPIO_HEADER_SIZE = 110
+CPIO_TRAILER = "TRAILER!!!"
+CPIO_SKIP_CHUNK_SIZE = 1024 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+BZIP2_MAGIC = b"BZh"
+
+# lsinitrd prints this file as the list of dracut modules
+DRACUT_MODULES_FILES = ("usr/lib/dracut/modules.txt", "lib/dracut/modules.txt")
+
+KERNEL_MODULE_PATH = re.compile(
+    r"(usr/)?lib/modules/(?P<kernel_version>[^/]+)/kernel/(?:[^/]+/)*"
+    r"(?P<module_name>[^/]+)\.ko(\.(xz|zst))?$"
+)
+
+
+class InitramfsError(Exception):
+    """Raised if an initramfs cannot be read natively"""
+
+
+class InitramfsIndex:
+    """
+    Paths, kernel modules and dracut modules of an initramfs, indexed for
+    constant time lookups.
+    """
+
+    def __init__(self, paths: Iterable[str], dracut_modules: Iterable[str] = ()):
+        self.paths: Set[str] = set(paths)
+        self.dracut_modules: List[str] = list(dracut_modules)
+        self._dracut_module_set = set(self.dracut_modules)
+
+        # Every trailing part of every path, e.g. "sbin/fsck" and "fsck" for "usr/sbin/fsck"
+        self._suffixes: Set[str] = set()
+        # kernel version => module name => module path
+        self._modules: Dict[str, Dict[str, str]] = {}
+        for path in self.paths:
+            parts = path.split("/")
+            for i in range(1, len(parts)):
+                self._suffixes.add("/".join(parts[i:]))
+            m = KERNEL_MODULE_PATH.search(path)
+            if m:
+                self._modules.setdefault(m.group("kernel_version"), {})[
+                    m.group("module_name")
+                ] = path
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def contains_path(self, path: str) -> bool:
+        """True if the path or a path ending with /path is in the initramfs"""
+        return path in self.paths or path in self._suffixes
+
+    def contains_dracut_module(self, module_name: str) -> bool:
+        return module_name in self._dracut_module_set
+
+    def module_path(self, kernel_version: str, module_name: str) -> Optional[str]:
+        """Path of the module file, e.g. for the module name "nvme-core" """
+        return self._modules.get(kernel_version, {}).get(module_name)
+
+    def modules(self, kernel_version: str) -> List[str]:
+        """Paths of all kernel modules of a kernel version, sorted"""
+        return sorted(self._modules.get(kernel_version, {}).values())
+
+
+def _normalize(name: str) -> str:
+    return name.removeprefix("./").lstrip("/")
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise InitramfsError("unexpected end of cpio archive")
+    return data
+
+
+def _skip(stream: BinaryIO, size: int):
+    if stream.seekable():
+        stream.seek(size, io.SEEK_CUR)
+        return
+    while size > 0:
+        chunk = stream.read(min(size, CPIO_SKIP_CHUNK_SIZE))
+        if not chunk:
+            raise InitramfsError("unexpected end of cpio archive")
+        size -= len(chunk)
+
+
+def _read_cpio(
+    stream: BinaryIO, magic: bytes, paths: Set[str], captured: Dict[str, bytes]
+):
+    """
+    Read a newc cpio archive up to and including its trailer. The magic of the
+    first header has already been read from the stream.
+    """
+    while True:
+        if magic not in CPIO_NEWC_MAGICS:
+            raise InitramfsError(f"invalid cpio header magic {magic!r}")
+        header = _read_exact(stream, CPIO_HEADER_SIZE - len(magic))
+        try:
+            file_size = int(header[48:56], 16)
+            name_size = int(header[88:96], 16)
+        except ValueError as e:
+            raise InitramfsError("invalid cpio header") from e
+
+        # Header and name are padded to a multiple of 4 bytes, so is the data
+        name_field = _read_exact(
+            stream, name_size + (-(CPIO_HEADER_SIZE + name_size) % 4)
+        )
+        name = name_field[: name_size - 1].decode("utf-8", errors="surrogateescape")
+        if name == CPIO_TRAILER:
+            return
+
+        path = _normalize(name)
+        if path in DRACUT_MODULES_FILES:
+            captured[path] = _read_exact(stream, file_size)
+            _skip(stream, -file_size % 4)
+        else:
+            _skip(stream, file_size + (-file_size % 4))
+        if path and path != ".":
+            paths.add(path)
+
+        magic = _read_exact(stream, len(CPIO_NEWC_MAGICS[0]))
+
+
+class _ProcessOutput(io.RawIOBase):
+    """Stdout of a process as a stream, the process is reaped on close"""
+
+    def __init__(self, process: subprocess.Popen):
+        self._process = process
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._process.stdout.readinto(buffer)  # type: ignore[union-attr]
+
+    def close(self):
+        if not self.closed:
+            self._process.stdout.close()  # type: ignore[union-attr]
+            self._process.wait()
+        super().close()
+
+
+def _zstd_cli(stream: BinaryIO) -> BinaryIO:
+    """Decompress with the zstd command on Python versions without compression.zstd"""
+    if shutil.which("zstd") is None:
+        raise InitramfsError("zstd compressed initramfs but no zstd decompressor")
+    process = subprocess.Popen(
+        ["zstd", "--decompress", "--stdout", "--quiet"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+
+    def feed():
+        try:
+            shutil.copyfileobj(stream, process.stdin)  # type: ignore[misc]
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()  # type: ignore[union-attr]
+            except BrokenPipeError:
+                pass
+
+    threading.Thread(target=feed, daemon=True).start()
+    return io.BufferedReader(_ProcessOutput(process))  # type: ignore[return-value]
+
+
+def _decompressor(magic: bytes) -> Optional[Callable[[BinaryIO], BinaryIO]]:
+    if magic.startswith(GZIP_MAGIC):
+        return lambda stream: gzip.GzipFile(fileobj=stream)  # type: ignore[return-value]
+    if magic.startswith(XZ_MAGIC):
+        return lambda stream: lzma.LZMAFile(stream)  # type: ignore[return-value]
+    if magic.startswith(ZSTD_MAGIC):
+        if zstd is None:
+            return _zstd_cli
+        # Bound here, the narrowing of the module global does not reach the lambda
+        zstd_file = zstd.ZstdFile
+        return lambda stream: zstd_file(stream)  # type: ignore[return-value]
+    if magic.startswith(BZIP2_MAGIC):
+        return lambda stream: bz2.BZ2File(stream)  # type: ignore[return-value]
+    return None
+
+
+def _next_magic(stream: BinaryIO) -> bytes:
+    """Read the magic of the next segment or archive, empty at the end of the stream"""
+    # Archives are padded with NUL bytes, usually to a multiple of 4 bytes
+    word = stream.read(4)
+    while word == b"\x00\x00\x00\x00":
+        word = stream.read(4)
+    word = word.lstrip(b"\x00")
+    if not word:
+        return b""
+    return word + stream.read(len(CPIO_NEWC_MAGICS[0]) - len(word))
+
+
+def read_initramfs(stream: BinaryIO) -> InitramfsIndex:
+    """
+    Index an initramfs in a single pass over the stream.
+
+    An initramfs is a sequence of cpio archives, each optionally compressed and
+    padded with NUL bytes, typically an uncompressed early cpio (microcode)
+    followed by the compressed main archive.
+
+    Raises:
+        InitramfsError: If the archive is malformed or its compression unsupported.
+    """
+    paths: Set[str] = set()
+    captured: Dict[str, bytes] = {}
+
+    while magic := _next_magic(stream):
+        if magic in CPIO_NEWC_MAGICS:
+            _read_cpio(stream, magic, paths, captured)
+            continue
+
+        decompress = _decompressor(magic)
+        if decompress is None:
+            raise InitramfsError(f"unsupported initramfs segment with magic {magic!r}")
+        if not stream.seekable():
+            raise InitramfsError("compressed segments require a seekable stream")
+        stream.seek(-len(magic), io.SEEK_CUR)
+
+        # The compressed stream is the last segment, it may contain several archives
+        decompressed = decompress(stream)
+        archives = 0
+        try:
+            while magic := _next_magic(decompressed):
+                _read_cpio(decompressed, magic, paths, captured)
+                archives += 1
+        except (EOFError, OSError, lzma.LZMAError, InitramfsError) as e:
+            # Trailing data after the last archive, e.g. padding of the container
+            if not archives:
+                raise InitramfsError(f"cannot decompress initramfs: {e}") from e
+            logger.debug(f"Ignoring data after the last compressed archive: {e}")
+        finally:
+            decompressed.close()
+        break
+
+    dracut_modules: List[str] = []
+    for path in DRACUT_MODULES_FILES:
+        if path in captured:
+            dracut_modules = [
+                line.strip()
+                for line in captured[path].decode(errors="replace").splitlines()
+                if line.strip()
+            ]
+            break
+    return InitramfsIndex(paths, dracut_modules)
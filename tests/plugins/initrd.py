@@ -1,21 +1,82 @@
+import io
 import logging
 import os
-import re
+import shutil
 import subprocess
 import tempfile
-from typing import List, Optional
+import threading
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
 
 import pefile
 import pytest
 
+from .initramfs import InitramfsError, InitramfsIndex, read_initramfs
 from .kernel_versions import KernelVersions
 from .utils import get_cname_from_os_release
 
 logger = logging.getLogger(__name__)
 
+# Indexes by (initrd or EFI file path, size, mtime_ns), shared by all kernel versions
+_index_cache: Dict[Tuple[str, int, int], Optional[InitramfsIndex]] = {}
+_index_cache_lock = threading.Lock()
+
+
+def _cached_index(
+    path: str, read: Callable[[str], Optional[InitramfsIndex]]
+) -> Optional[InitramfsIndex]:
+    """Return the index of a file, read only if the file is new or changed"""
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _index_cache_lock:
+        if key not in _index_cache:
+            _index_cache[key] = read(path)
+        return _index_cache[key]
+
+
+class FileRange(io.RawIOBase):
+    """
+    Read-only view of a byte range of an open file, e.g. a section of a PE file.
+    Reads use pread, the file position of the underlying file is not used.
+    """
+
+    def __init__(self, fd: int, offset: int, length: int):
+        self._fd = fd
+        self._offset = offset
+        self._length = length
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        size = max(0, min(len(buffer), self._length - self._position))
+        if not size:
+            return 0
+        data = os.pread(self._fd, size, self._offset + self._position)
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
 
 class Initrd:
-    """Inspect initrd contents using lsinitrd (dracut)."""
+    """
+    Inspect initrd contents. Initrds are read natively and indexed once, lsinitrd
+    (dracut) is only used for compression formats the reader does not support.
+    """
 
     @staticmethod
     def _execute_lsinitrd(initrd_path: str) -> tuple[list[str], list[str]]:
@@ -74,21 +135,48 @@ class Initrd:
 
         return (contents, dracut_modules)
 
+    @staticmethod
+    def _index_from_lsinitrd(initrd_path: str) -> InitramfsIndex:
+        """Index the paths listed by lsinitrd."""
+        contents, dracut_modules = Initrd._execute_lsinitrd(initrd_path)
+        paths = []
+        # lsinitrd outputs in ls -l format, so entries may include metadata before the path
+        for entry in contents:
+            parts = entry.split()
+            if not parts:
+                continue
+            if "->" in entry:
+                path_part = entry.split("->")[0].strip()
+                paths.append(path_part.split()[-1])
+            else:
+                paths.append(parts[-1])
+        return InitramfsIndex(paths, dracut_modules)
+
+    @staticmethod
+    def _read_index(initrd_path: str) -> InitramfsIndex:
+        """Index an initrd file, natively if its format is supported."""
+        try:
+            with open(initrd_path, "rb") as f:
+                index = read_initramfs(f)
+        except InitramfsError as e:
+            logger.info(f"Falling back to lsinitrd for {initrd_path}: {e}")
+            return Initrd._index_from_lsinitrd(initrd_path)
+
+        logger.info(
+            f"Read initrd {initrd_path}: {len(index)} files and "
+            f"{len(index.dracut_modules)} dracut modules"
+        )
+        return index
+
     def __init__(self, kernel_versions: KernelVersions):
         installed = kernel_versions.get_installed()
         if not installed:
             self._kernel_version = None
-            self._contents: List[str] = []
-            self._dracut_modules: List[str] = []
+            self._index = InitramfsIndex([])
             return
 
         self._kernel_version = installed[0].version
-        self._contents, self._dracut_modules = self._load_initrd_contents(
-            self._kernel_version
-        )
-        # Lazy-built indexes for faster lookups on the default kernel version
-        self._file_index = None
-        self._dracut_module_set = None
+        self._index = self._load_index(self._kernel_version)
 
     def _get_efi_path(self) -> Optional[str]:
         """Get the path to the EFI file based on CNAME from os-release.
@@ -130,171 +218,155 @@ class Initrd:
         logger.warning(f"No .initrd section found in EFI file: {efi_path}")
         return None
 
-    def _get_initrd_data(
-        self, initrd_section: pefile.SectionStructure, efi_path: str
-    ) -> Optional[bytes]:
-        """Extract data from the .initrd section.
+    def _get_initrd_range(self, efi_path: str) -> Optional[Tuple[int, int]]:
+        """Locate the .initrd section in the EFI file.
+
+        Only the PE headers are parsed, the section data is not read.
 
         Args:
-            initrd_section: The .initrd section from the PE file.
-            efi_path: Path to EFI file (for logging).
+            efi_path: Path to EFI file.
 
         Returns:
-            The section data, or None if empty.
+            File offset and size of the section data, or None if there is none.
         """
-        initrd_data = initrd_section.get_data()
-        if not initrd_data or len(initrd_data) == 0:
-            logger.warning(f".initrd section is empty in EFI file: {efi_path}")
+        try:
+            logger.debug(f"Loading EFI file headers: {efi_path}")
+            pe = pefile.PE(efi_path, fast_load=True)
+            try:
+                initrd_section = self._get_initrd_section(pe, efi_path)
+                if not initrd_section:
+                    return None
+                # The raw data is padded to the file alignment, the virtual size
+                # is the size of the initrd itself
+                size = int(initrd_section.SizeOfRawData or 0)
+                if initrd_section.Misc_VirtualSize:
+                    size = min(size, int(initrd_section.Misc_VirtualSize))
+                offset = int(initrd_section.PointerToRawData or 0)
+            finally:
+                pe.close()
+        except pefile.PEFormatError as e:
+            logger.warning(f"Invalid PE format in EFI file {efi_path}: {e}")
+            return None
+        except (OSError, IOError) as e:
+            logger.warning(f"Error reading EFI file {efi_path}: {e}")
             return None
 
-        return initrd_data
+        if size == 0:
+            logger.warning(f".initrd section is empty in EFI file: {efi_path}")
+            return None
+        return offset, size
 
-    def _write_initrd_to_temp_file(self, initrd_data: bytes, efi_path: str) -> str:
-        """Write initrd data to a temporary file.
+    def _write_initrd_to_temp_file(self, initrd: BinaryIO, efi_path: str) -> str:
+        """Write the initrd to a temporary file, for tools that need a path.
 
         Args:
-            initrd_data: The initrd data to write.
+            initrd: Stream of the initrd data.
             efi_path: Path to EFI file (for logging).
 
         Returns:
             Path to the temporary file.
         """
         with tempfile.NamedTemporaryFile(delete=False, suffix=".img") as tmp_file:
-            tmp_file.write(initrd_data)
+            shutil.copyfileobj(initrd, tmp_file)
             tmp_path = tmp_file.name
 
-        logger.info(
-            f"Extracted initrd from EFI file {efi_path} to {tmp_path} "
-            f"({len(initrd_data)} bytes)"
-        )
+        logger.info(f"Extracted initrd from EFI file {efi_path} to {tmp_path}")
         return tmp_path
 
-    def _extract_initrd_from_efi(self) -> Optional[str]:
-        """Extract initrd from EFI file for trustedboot/USI flavors.
-
-        The initrd is embedded in the EFI file as a PE32+ section named '.initrd'.
+    def _read_efi_index(self, efi_path: str) -> Optional[InitramfsIndex]:
+        """Index the initrd embedded in the EFI file, None if it has none.
 
-        Returns:
-            Path to extracted initrd file, or None if extraction fails.
+        The initrd is embedded in the EFI file as a PE32+ section named '.initrd'
+        (trustedboot/USI flavors). It is read in place through a view of the
+        section, only lsinitrd needs it extracted to a temporary file.
         """
-        efi_path = self._get_efi_path()
-        if not efi_path:
+        initrd_range = self._get_initrd_range(efi_path)
+        if not initrd_range:
             return None
+        offset, size = initrd_range
+
+        with open(efi_path, "rb") as f:
+            initrd = io.BufferedReader(FileRange(f.fileno(), offset, size))
+            try:
+                index = read_initramfs(initrd)
+            except InitramfsError as e:
+                logger.info(
+                    f"Falling back to lsinitrd for the initrd of {efi_path}: {e}"
+                )
+                initrd.seek(0)
+                extracted_path = self._write_initrd_to_temp_file(initrd, efi_path)
+                try:
+                    return self._index_from_lsinitrd(extracted_path)
+                finally:
+                    # Clean up extracted temporary file
+                    try:
+                        os.unlink(extracted_path)
+                        logger.debug(
+                            f"Cleaned up temporary initrd file: {extracted_path}"
+                        )
+                    except OSError as e:
+                        logger.warning(
+                            f"Failed to clean up temporary file {extracted_path}: {e}"
+                        )
 
-        try:
-            logger.debug(f"Loading EFI file: {efi_path}")
-            pe = pefile.PE(efi_path, fast_load=True)
-
-            initrd_section = self._get_initrd_section(pe, efi_path)
-            if not initrd_section:
-                return None
-
-            initrd_data = self._get_initrd_data(initrd_section, efi_path)
-            if not initrd_data:
-                return None
-
-            return self._write_initrd_to_temp_file(initrd_data, efi_path)
-
-        except pefile.PEFormatError as e:
-            logger.warning(f"Invalid PE format in EFI file {efi_path}: {e}")
-            return None
-        except (OSError, IOError) as e:
-            logger.warning(f"Error reading EFI file {efi_path}: {e}")
-            return None
-        except Exception as e:
-            logger.warning(
-                f"Unexpected error extracting initrd from EFI file {efi_path}: {e}"
-            )
-            return None
+        logger.info(
+            f"Read initrd of EFI file {efi_path} ({size} bytes at offset {offset}): "
+            f"{len(index)} files and {len(index.dracut_modules)} dracut modules"
+        )
+        return index
 
-    def _load_initrd_contents(self, kernel_version: str) -> tuple[List[str], List[str]]:
-        """Load initrd contents for the given kernel version.
+    def _load_index(self, kernel_version: str) -> InitramfsIndex:
+        """Load the initrd index for the given kernel version.
 
         Tries EFI file first (for trustedboot/USI flavors), then falls back to
-        regular initrd file.
+        regular initrd file. Indexes are cached until the file changes.
 
         Args:
             kernel_version: Kernel version string.
 
         Returns:
-            Tuple of (file contents list, dracut modules list).
+            Index of the files and dracut modules in the initrd.
 
         Raises:
             RuntimeError: If neither EFI initrd nor legacy initrd can be found.
         """
-        initrd_path = None
-        extracted_path = None
-
         # Try EFI file first (for trustedboot/USI)
-        extracted_path = self._extract_initrd_from_efi()
-        if extracted_path:
-            initrd_path = extracted_path
-            logger.debug(f"Using initrd extracted from EFI file: {initrd_path}")
-        else:
-            # Fall back to legacy initrd file
-            legacy_path = f"/boot/initrd.img-{kernel_version}"
-            if os.path.exists(legacy_path):
-                initrd_path = legacy_path
-                logger.debug(f"Using legacy initrd file: {initrd_path}")
-            else:
-                logger.debug(f"Legacy initrd file not found: {legacy_path}")
-
-        if not initrd_path:
-            raise RuntimeError(
-                f"Could not find initrd for kernel {kernel_version}. "
-                "Neither EFI initrd extraction nor legacy initrd file available."
-            )
-
-        try:
-            return Initrd._execute_lsinitrd(initrd_path)
-        finally:
-            # Clean up extracted temporary file
-            if extracted_path and os.path.exists(extracted_path):
-                try:
-                    os.unlink(extracted_path)
-                    logger.debug(f"Cleaned up temporary initrd file: {extracted_path}")
-                except OSError as e:
-                    logger.warning(
-                        f"Failed to clean up temporary file {extracted_path}: {e}"
-                    )
-
-    def _get_contents(self, kernel_version: Optional[str] = None) -> List[str]:
-        """Get all files in the initrd.
-
-        Args:
-            kernel_version: Kernel version string. If None, uses the first installed kernel.
-
-        Returns:
-            List of file paths found in the initrd.
-        """
-        if kernel_version is None:
-            return self._contents
-        else:
-            # Load contents for a different kernel version
-            contents, _ = self._load_initrd_contents(kernel_version)
-            return contents
+        efi_path = self._get_efi_path()
+        if efi_path:
+            index = _cached_index(efi_path, self._read_efi_index)
+            if index is not None:
+                return index
+
+        # Fall back to legacy initrd file
+        legacy_path = f"/boot/initrd.img-{kernel_version}"
+        if os.path.exists(legacy_path):
+            logger.debug(f"Using legacy initrd file: {legacy_path}")
+            return _cached_index(legacy_path, Initrd._read_index)  # type: ignore[return-value]
+        logger.debug(f"Legacy initrd file not found: {legacy_path}")
+
+        raise RuntimeError(
+            f"Could not find initrd for kernel {kernel_version}. "
+            "Neither EFI initrd extraction nor legacy initrd file available."
+        )
 
-    def _get_dracut_modules(self, kernel_version: Optional[str] = None) -> List[str]:
-        """Get all dracut modules in the initrd.
+    def _get_index(self, kernel_version: Optional[str] = None) -> InitramfsIndex:
+        """Get the index of the initrd.
 
         Args:
             kernel_version: Kernel version string. If None, uses the first installed kernel.
-
-        Returns:
-            List of dracut module names found in the initrd.
         """
-        if kernel_version is None:
-            return self._dracut_modules
-        else:
-            # Load contents for a different kernel version
-            _, dracut_modules = self._load_initrd_contents(kernel_version)
-            return dracut_modules
+        if kernel_version is None or kernel_version == self._kernel_version:
+            return self._index
+        return self._load_index(kernel_version)
 
     def contains_module(
         self, module_name: str, kernel_version: Optional[str] = None
     ) -> bool:
         """Check if a kernel module is present in the initrd.
 
+        Matches lib/modules/<kernel_version>/kernel/**/<module_name>.ko, optionally
+        below usr/ and compressed with xz or zstd.
+
         Args:
             module_name: Name of the module to check (e.g., "nvme", "nvme-core").
             kernel_version: Kernel version string. If None, uses the first installed kernel.
@@ -304,21 +376,10 @@ class Initrd:
         """
         if kernel_version is None:
             kernel_version = self._kernel_version
-        contents = self._get_contents(kernel_version)
-        if not contents:
+        if kernel_version is None:
             return False
-
-        pattern = re.compile(
-            # (usr/)?lib/modules/         # Optionally starts with 'usr/', then 'lib/modules/', does not match the start of the line as lsinitrd outputs ls -l format with path at the end
-            # {kernel_version}/           # Kernel version directory (e.g., '6.12.47-cloud-amd64/')
-            # kernel/                     # Must have 'kernel/' next
-            # (?:[^/]+/)*                 # One or more directories, matches nested subdirectories (e.g., drivers/net/)
-            # {module_name}\.ko           # The target module file, as {module_name}.ko (escaped for regex safety)
-            # (\.(xz|zst))?               # Optionally followed by compression extensions '.xz' or '.zst'
-            # $                           # End of string (ensures no suffix)
-            rf"(usr/)?lib/modules/{kernel_version}/kernel/(?:[^/]+/)*{re.escape(module_name)}\.ko(\.(xz|zst))?$"
-        )
-        return any(pattern.search(entry) for entry in contents)
+        index = self._get_index(kernel_version)
+        return index.module_path(kernel_version, module_name) is not None
 
     def contains_dracut_module(
         self, module_name: str, kernel_version: Optional[str] = None
@@ -332,13 +393,7 @@ class Initrd:
         Returns:
             True if the dracut module is found in the initrd.
         """
-        if kernel_version is None:
-            if self._dracut_module_set is None:
-                self._dracut_module_set = set(self._get_dracut_modules())
-            return module_name in self._dracut_module_set
-        else:
-            dracut_modules = self._get_dracut_modules(kernel_version)
-            return module_name in dracut_modules
+        return self._get_index(kernel_version).contains_dracut_module(module_name)
 
     def contains_file(
         self, file_path: str, kernel_version: Optional[str] = None
@@ -346,49 +401,14 @@ class Initrd:
         """Check if a specific file path is present in the initrd.
 
         Args:
-            file_path: Path to check within initrd (e.g., "usr/sbin/fsck").
+            file_path: Path to check within initrd (e.g., "usr/sbin/fsck"). Paths
+                ending with /file_path match as well.
             kernel_version: Kernel version string. If None, uses the first installed kernel.
 
         Returns:
             True if the file is found in the initrd.
         """
-        if kernel_version is None:
-            # Use an index for the default kernel version to speed up repeated lookups
-            if self._file_index is None:
-                self._file_index = set()
-                contents = self._get_contents()
-                # lsinitrd outputs in ls -l format, so entries may include metadata before the path
-                for entry in contents:
-                    parts = entry.split()
-                    if not parts:
-                        continue
-                    if "->" in entry:
-                        path_part = entry.split("->")[0].strip()
-                        actual_path = path_part.split()[-1]
-                    else:
-                        actual_path = parts[-1]
-                    self._file_index.add(actual_path)
-
-            if file_path in self._file_index:
-                return True
-            # Fallback: allow matching on trailing segment as before
-            return any(p.endswith("/" + file_path) for p in self._file_index)
-
-        # For non-default kernel versions, fall back to direct scan
-        contents = self._get_contents(kernel_version)
-        for entry in contents:
-            parts = entry.split()
-            if not parts:
-                continue
-            if file_path in entry:
-                if "->" in entry:
-                    path_part = entry.split("->")[0].strip()
-                    actual_path = path_part.split()[-1]
-                else:
-                    actual_path = parts[-1]
-                if actual_path == file_path or actual_path.endswith("/" + file_path):
-                    return True
-        return False
+        return self._get_index(kernel_version).contains_path(file_path)
 
     def list_modules(self, kernel_version: Optional[str] = None) -> List[str]:
         """List all kernel modules present in the initrd.
@@ -401,22 +421,9 @@ class Initrd:
         """
         if kernel_version is None:
             kernel_version = self._kernel_version
-        contents = self._get_contents(kernel_version)
-        if not contents:
+        if kernel_version is None:
             return []
-
-        pattern = re.compile(
-            # (usr/)?lib/modules/         # Optionally starts with 'usr/', then 'lib/modules/', does not match the start of the line as lsinitrd outputs ls -l format with path at the end
-            # {kernel_version}/            # Kernel version directory (e.g., '6.12.47-cloud-amd64/')
-            # kernel/                     # Must have 'kernel/' next
-            # (?:[^/]+/)*                 # One or more directories, matches nested subdirectories (e.g., drivers/net/)
-            # \.ko                        # The target module file, as .ko (escaped for regex safety)
-            # (\.(xz|zst))?               # Optionally followed by compression extensions '.xz' or '.zst'
-            # $                           # End of string (ensures no suffix)
-            rf"(usr/)?lib/modules/{kernel_version}/kernel/(?:[^/]+/)*\.ko(\.(xz|zst))?$"
-        )
-        modules = [entry for entry in contents if pattern.search(entry)]
-        return modules
+        return self._get_index(kernel_version).modules(kernel_version)
 
 
 @pytest.fixture(scope="session")
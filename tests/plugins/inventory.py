@@ -0,0 +1,362 @@
+import logging
+import os
+import stat
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Union
+
+import pytest
+
+from .find import FIND_RESULT_TYPE_FILE, compile_patterns, wanted_entry_types
+
+logger = logging.getLogger(__name__)
+
+# Roots walked by the session inventory, each one without crossing mount points
+INVENTORY_ROOTS = ["/boot", "/etc", "/opt", "/usr", "/var"]
+
+# The session wide inventory, dropped after every test marked with modify
+_session_inventory: Optional["FilesystemInventory"] = None
+
+
+@dataclass(slots=True)
+class InventoryEntry:
+    """lstat metadata of a path, symlinks additionally carry the stat of their target"""
+
+    path: str
+    mode: int
+    uid: int
+    gid: int
+    size: int
+    dev: int
+    has_xattrs: bool
+    # None for other entries and for dangling symlinks
+    target_mode: Optional[int] = None
+    target_uid: Optional[int] = None
+    target_dev: Optional[int] = None
+
+    @property
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self.mode)
+
+    @property
+    def is_dir(self) -> bool:
+        """True for directories and symlinks to directories, like os.walk"""
+        mode = self.target_mode if self.is_symlink else self.mode
+        return mode is not None and stat.S_ISDIR(mode)
+
+    @property
+    def effective_mode(self) -> Optional[int]:
+        """Mode of the entry, or of the symlink target"""
+        return self.target_mode if self.is_symlink else self.mode
+
+    @property
+    def effective_uid(self) -> Optional[int]:
+        """Owner of the entry, or of the symlink target"""
+        return self.target_uid if self.is_symlink else self.uid
+
+    @property
+    def effective_dev(self) -> Optional[int]:
+        """Device of the entry, or of the symlink target"""
+        return self.target_dev if self.is_symlink else self.dev
+
+
+class FilesystemInventory:
+    """
+    In-memory index of all entries below a set of roots, walked once on first use.
+
+    Directories on other devices than their root are recorded but not descended into.
+    Queries return None if they cannot be answered exactly from the index, e.g. for
+    paths outside of the roots or below such a mount point, callers then walk the
+    filesystem themselves.
+    """
+
+    def __init__(self, roots: Iterable[str] = INVENTORY_ROOTS):
+        self.roots = [os.path.realpath(root) for root in roots]
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, InventoryEntry]] = None
+        self._paths: List[str] = []
+        self._root_devs: Dict[str, int] = {}
+        self._pruned: List[str] = []
+
+    def invalidate(self):
+        """Drop the index, the next query walks the roots again"""
+        with self._lock:
+            self._entries = None
+
+    def rescan(self, paths: Optional[Iterable[str]] = None):
+        """
+        Walk the roots again now.
+
+        Args:
+            paths: Only walk these paths again, e.g. the paths a snapshot is taken of.
+                Paths outside of the roots or below a mount point that is not
+                descended into are skipped. Without an index nothing is walked, the
+                next query builds it.
+        """
+        if paths is None:
+            self.invalidate()
+            self._ensure_scanned()
+            return
+
+        with self._lock:
+            entries = self._entries
+            if entries is None:
+                return
+            for path in paths:
+                entries = self._rescan_path(entries, os.path.realpath(path))
+            self._entries = entries
+
+    def _rescan_path(
+        self, entries: Dict[str, InventoryEntry], path: str
+    ) -> Dict[str, InventoryEntry]:
+        """
+        Return entries with path and everything below it walked again, the paths
+        and pruned mount points are updated in place. Called with the lock held.
+        """
+        root = self._covering_root(path)
+        if root is None or any(
+            path == mount_point or path.startswith(mount_point + "/")
+            for mount_point in self._pruned
+        ):
+            return entries
+
+        # Entries below path are a contiguous range of the sorted paths
+        prefix = path.rstrip("/") + "/"
+        start = bisect_left(self._paths, prefix)
+        end = bisect_left(self._paths, prefix[:-1] + chr(ord("/") + 1))
+        paths = self._paths[:start] + self._paths[end:]
+        # Queries running concurrently keep using the previous dict
+        entries = dict(entries)
+        for stale in self._paths[start:end]:
+            del entries[stale]
+        if entries.pop(path, None) is not None:
+            paths.remove(path)
+        pruned = [p for p in self._pruned if not p.startswith(prefix)]
+
+        walked: Dict[str, InventoryEntry] = {}
+        root_dev = self._root_devs[root]
+        if path == root:
+            self._walk(root, root_dev, walked, pruned)
+        else:
+            entry = self._entry(path)
+            if entry is not None:
+                walked[path] = entry
+                if stat.S_ISDIR(entry.mode):
+                    if entry.dev != root_dev:
+                        pruned.append(path)
+                    else:
+                        self._walk(path, root_dev, walked, pruned)
+        entries.update(walked)
+
+        # Two sorted runs, merged by the sort in linear time
+        self._paths = paths + sorted(walked)
+        self._paths.sort()
+        self._pruned = sorted(pruned)
+        return entries
+
+    def _ensure_scanned(self) -> Dict[str, InventoryEntry]:
+        entries = self._entries
+        if entries is not None:
+            return entries
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            return self._entries  # type: ignore[return-value]
+
+    def _scan(self):
+        entries: Dict[str, InventoryEntry] = {}
+        root_devs: Dict[str, int] = {}
+        pruned: List[str] = []
+
+        for root in self.roots:
+            try:
+                root_dev = os.stat(root).st_dev
+            except OSError:
+                continue
+            root_devs[root] = root_dev
+
+            self._walk(root, root_dev, entries, pruned)
+
+        self._paths = sorted(entries)
+        self._root_devs = root_devs
+        self._pruned = sorted(pruned)
+        self._entries = entries
+        logger.debug(
+            f"Inventory of {', '.join(self.roots)}: {len(entries)} entries, "
+            f"not descended into {len(pruned)} mount points"
+        )
+
+    def _walk(
+        self,
+        top: str,
+        root_dev: int,
+        entries: Dict[str, InventoryEntry],
+        pruned: List[str],
+    ):
+        """Record all entries below top, directories on other devices are not descended into"""
+        pending = [top]
+        while pending:
+            dirpath = pending.pop()
+            try:
+                with os.scandir(dirpath) as it:
+                    dir_entries = list(it)
+            except OSError:
+                continue
+
+            for dir_entry in dir_entries:
+                entry = self._entry(dir_entry.path)
+                if entry is None:
+                    continue
+                entries[entry.path] = entry
+                if stat.S_ISDIR(entry.mode):
+                    if entry.dev != root_dev:
+                        pruned.append(entry.path)
+                    else:
+                        pending.append(entry.path)
+
+    @staticmethod
+    def _entry(path: str) -> Optional[InventoryEntry]:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return None
+
+        entry = InventoryEntry(
+            path=path,
+            mode=st.st_mode,
+            uid=st.st_uid,
+            gid=st.st_gid,
+            size=st.st_size,
+            dev=st.st_dev,
+            has_xattrs=False,
+        )
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                target = os.stat(path)
+                entry.target_mode = target.st_mode
+                entry.target_uid = target.st_uid
+                entry.target_dev = target.st_dev
+            except OSError:
+                pass
+        else:
+            try:
+                entry.has_xattrs = bool(os.listxattr(path, follow_symlinks=False))
+            except OSError:
+                pass
+        return entry
+
+    def _covering_root(self, path: str) -> Optional[str]:
+        for root in self._root_devs:
+            if path == root or path.startswith(root.rstrip("/") + "/"):
+                return root
+        return None
+
+    def get(self, path: str) -> Optional[InventoryEntry]:
+        """Return the entry of a path below the roots"""
+        return self._ensure_scanned().get(os.path.realpath(path))
+
+    def entries(
+        self, root: str, descend_mounts: bool = False
+    ) -> Optional[List[InventoryEntry]]:
+        """
+        Return all entries below root sorted by path, None if root is not covered.
+
+        Args:
+            root: Directory to list, symlinks are resolved
+            descend_mounts: If True, root is only covered if no mount point was
+                skipped below it
+        """
+        entries = self._ensure_scanned()
+        real_root = os.path.realpath(root)
+        base = self._covering_root(real_root)
+        if base is None:
+            return None
+
+        prefix = real_root.rstrip("/") + "/"
+        for mount_point in self._pruned:
+            if real_root == mount_point or real_root.startswith(mount_point + "/"):
+                return None
+            if descend_mounts and mount_point.startswith(prefix):
+                return None
+
+        if real_root != base and real_root not in entries:
+            return None
+
+        start = bisect_left(self._paths, prefix)
+        end = bisect_left(self._paths, prefix[:-1] + chr(ord("/") + 1))
+        return [entries[path] for path in self._paths[start:end]]
+
+    def find(
+        self,
+        root: str,
+        entry_type: str = FIND_RESULT_TYPE_FILE,
+        pattern: Optional[Union[str, List[str]]] = None,
+        same_mnt_only: bool = True,
+        descend_mounts: Optional[bool] = None,
+        may_have_xattrs: bool = False,
+    ) -> Optional[List[str]]:
+        """
+        Answer a Find query from the index, paths are sorted and start with root.
+        Returns None if the query cannot be answered from the index.
+
+        Args:
+            same_mnt_only: Only return entries (or symlink targets) on the device of root
+            descend_mounts: Whether the walk descends into other mounts, by default
+                it does unless same_mnt_only is set, like Find
+            may_have_xattrs: Skip entries recorded without extended attributes,
+                symlinks are kept as the attributes of their targets are not recorded
+        """
+        if descend_mounts is None:
+            descend_mounts = not same_mnt_only
+        entries = self.entries(root, descend_mounts)
+        if entries is None:
+            return None
+
+        real_root = os.path.realpath(root)
+        root_dev = (
+            self._root_devs[real_root]
+            if real_root in self._root_devs
+            else self._entries[real_root].dev  # type: ignore[index]
+        )
+        if isinstance(pattern, str):
+            pattern = [pattern]
+        match = compile_patterns(tuple(pattern)) if pattern else None
+        want_dirs, want_files = wanted_entry_types(entry_type)
+
+        found = []
+        for entry in entries:
+            if not (want_dirs if entry.is_dir else want_files):
+                continue
+            if same_mnt_only and entry.effective_dev != root_dev:
+                continue
+            if may_have_xattrs and not (entry.has_xattrs or entry.is_symlink):
+                continue
+            if match is not None and not match(os.path.basename(entry.path)):
+                continue
+            found.append(root.rstrip("/") + entry.path[len(real_root.rstrip("/")) :])
+        return found
+
+
+def pytest_runtest_teardown(item: pytest.Item):
+    # Tests mutating the system may have changed any file
+    if _session_inventory is not None and item.get_closest_marker("modify"):
+        _session_inventory.invalidate()
+
+
+@pytest.fixture(scope="session")
+def session_inventory() -> FilesystemInventory:
+    global _session_inventory
+    _session_inventory = FilesystemInventory()
+    return _session_inventory
+
+
+@pytest.fixture
+def inventory(request: pytest.FixtureRequest) -> Optional[FilesystemInventory]:
+    """
+    The session inventory, None in tests marked with modify as they may change
+    the filesystem while running.
+    """
+    if request.node.get_closest_marker("modify"):
+        return None
+    return request.getfixturevalue("session_inventory")
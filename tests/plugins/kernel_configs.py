@@ -1,10 +1,47 @@
 import os
-from dataclasses import dataclass
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
 
 import pytest
 
 from .kernel_versions import KernelVersions
 
+KCONFIG_OPTION = re.compile(r"^(?P<name>CONFIG_\w+)=(?P<value>.*)$")
+KCONFIG_NOT_SET = re.compile(r"^# (?P<name>CONFIG_\w+) is not set$")
+
+# Value of options that are not set, as Kconfig itself calls them
+NOT_SET = "n"
+
+# Parsed configs by (config path, size, mtime_ns), shared by all tests of a session
+_config_cache: Dict[Tuple[str, int, int], "KernelConfig"] = {}
+_config_cache_lock = threading.Lock()
+
+
+def _unquote(value: str) -> str:
+    """Value of a string option, Kconfig quotes them and escapes " and \\"""
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def parse_kconfig(content: str) -> Dict[str, str]:
+    """
+    Options of a kernel config: y, m, n for options that are not set, or the
+    value of string, int and hex options (strings without quotes).
+    """
+    options: Dict[str, str] = {}
+    for line in content.splitlines():
+        m = KCONFIG_OPTION.match(line)
+        if m:
+            options[m.group("name")] = _unquote(m.group("value"))
+            continue
+        m = KCONFIG_NOT_SET.match(line)
+        if m:
+            options[m.group("name")] = NOT_SET
+    return options
+
 
 @dataclass
 class KernelConfig:
@@ -13,6 +50,58 @@ class KernelConfig:
     path: str
     version: str
     content: str
+    # CONFIG_* => y/m/n/value, options missing from the file are not set either
+    options: Dict[str, str] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        if not self.options:
+            self.options = parse_kconfig(self.content)
+
+    def get(self, option: str) -> str:
+        """Value of an option, n if it is not set or missing"""
+        return self.options.get(option, NOT_SET)
+
+    def is_enabled(self, option: str) -> bool:
+        """True for options built in (y) or built as module (m)"""
+        return self.get(option) in ("y", "m")
+
+    def mismatches(self, expected: Dict[str, str]) -> Dict[str, str]:
+        """
+        Check several options at once.
+
+        Returns:
+            option => actual value for all options not having the expected value
+        """
+        return {
+            option: self.get(option)
+            for option, value in expected.items()
+            if self.get(option) != value
+        }
+
+    def diff(self, other: "KernelConfig") -> Dict[str, Tuple[str, str]]:
+        """option => (value here, value in other) for all options that differ"""
+        return {
+            option: (self.get(option), other.get(option))
+            for option in sorted(self.options.keys() | other.options.keys())
+            if self.get(option) != other.get(option)
+        }
+
+
+def _read_config(path: str, version: str) -> KernelConfig:
+    """Parsed config, read again only if the file is new or changed"""
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _config_cache_lock:
+        if key not in _config_cache:
+            with open(path) as f:
+                _config_cache[key] = KernelConfig(
+                    path=path, version=version, content=f.read()
+                )
+        config = _config_cache[key]
+    if config.path != path or config.version != version:
+        # Same file under another name, e.g. through a symlink
+        return KernelConfig(path, version, config.content, config.options)
+    return config
 
 
 class KernelConfigs:
@@ -22,38 +111,43 @@ class KernelConfigs:
         self._kernel_versions = kernel_versions
         self._config_dir = "/boot"
 
+    def _config(self, version: str) -> KernelConfig:
+        return _read_config(
+            os.path.join(self._config_dir, f"config-{version}"), version
+        )
+
     def get_installed(self) -> list[KernelConfig]:
         """Return ``KernelConfig`` objects for all installed kernels."""
         configs: list[KernelConfig] = []
         for kernel_version in self._kernel_versions.get_installed():
-            configs.append(
-                KernelConfig(
-                    path=os.path.join(
-                        self._config_dir, f"config-{kernel_version.version}"
-                    ),
-                    version=kernel_version.version,
-                    content=open(
-                        os.path.join(
-                            self._config_dir, f"config-{kernel_version.version}"
-                        )
-                    ).read(),
-                )
-            )
+            configs.append(self._config(kernel_version.version))
         return configs
 
     def get_running(self) -> KernelConfig:
         """Return the ``KernelConfig`` for the currently running kernel."""
         running_kernel = self._kernel_versions.get_running()
-        config_path = os.path.join(self._config_dir, f"config-{running_kernel.version}")
-        config = KernelConfig(
-            path=config_path,
-            version=running_kernel.version,
-            content=open(config_path).read(),
-        )
-        return config
+        return self._config(running_kernel.version)
+
+    def mismatches(self, expected: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+        """
+        Check several options in all installed kernels at once.
+
+        Returns:
+            config path => option => actual value, for configs with mismatches only
+        """
+        result: Dict[str, Dict[str, str]] = {}
+        for config in self.get_installed():
+            mismatches = config.mismatches(expected)
+            if mismatches:
+                result[config.path] = mismatches
+        return result
+
+    def diff(self, version_a: str, version_b: str) -> Dict[str, Tuple[str, str]]:
+        """Options that differ between the configs of two installed kernels"""
+        return self._config(version_a).diff(self._config(version_b))
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def kernel_configs(kernel_versions: KernelVersions) -> KernelConfigs:
     """Fixture providing access to installed and running kernel configs."""
     return KernelConfigs(kernel_versions)
@@ -1,20 +1,46 @@
+import concurrent.futures
+import fnmatch
 import logging
 import os
 import re
+import threading
 import time
-from dataclasses import dataclass
-from graphlib import TopologicalSorter
+from dataclasses import dataclass, field
+from graphlib import CycleError, TopologicalSorter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import pytest
 
 from .find import FIND_RESULT_TYPE_FILE, Find
+from .inventory import FilesystemInventory
 from .kernel_versions import KernelVersions
 from .shell import ShellRunner
 
 dependencies = re.compile("/([^/]*)\\.ko")
 
+module_file_name = re.compile(r"^(?P<name>.+?)\.ko(?:\..+)?$")
+
 logger = logging.getLogger(__name__)
 
+# Modules unloaded at the same time, rmmod mostly waits for the kernel
+UNLOAD_WORKERS = 8
+
+# Module indexes by (modules.dep path, size, mtime_ns), i.e. per kernel version
+# until depmod runs again
+_module_index_cache: Dict[Tuple[str, int, int], "ModuleIndex"] = {}
+_module_index_cache_lock = threading.Lock()
+
+
+def normalize_module_name(name: str) -> str:
+    """The kernel treats - and _ in module names alike, /proc/modules shows _"""
+    return name.replace("-", "_")
+
+
+def _module_name(path: str) -> Optional[str]:
+    """Module file name without .ko and compression suffix, None for other files"""
+    m = module_file_name.match(os.path.basename(path))
+    return m.group("name") if m else None
+
 
 @dataclass
 class LoadedKernelModule:
@@ -26,31 +52,277 @@ class LoadedKernelModule:
         return self.name
 
 
+@dataclass
+class ModuleState:
+    """A line of /proc/modules"""
+
+    name: str
+    size: int
+    use_count: int
+    # Modules using this module, they have to be unloaded first
+    holders: Set[str] = field(default_factory=set)
+    # Live, Loading or Unloading
+    state: str = "Live"
+
+
+class ModuleStates:
+    """
+    Loaded kernel modules, read from /proc/modules once per check. Waits for
+    modules to unload by watching their /sys/module/<name> directories.
+    """
+
+    def __init__(
+        self, proc_modules: str = "/proc/modules", sys_module: str = "/sys/module"
+    ):
+        self._proc_modules = proc_modules
+        self._sys_module = sys_module
+
+    def read(self) -> Dict[str, ModuleState]:
+        """All loaded modules by name, empty if /proc/modules cannot be read"""
+        modules: Dict[str, ModuleState] = {}
+        try:
+            with open(self._proc_modules) as f:
+                for line in f:
+                    # /proc/modules format: name size usecount deps state address
+                    fields = line.split()
+                    if len(fields) < 5:
+                        continue
+                    holders = {holder for holder in fields[3].split(",") if holder}
+                    holders.discard("-")
+                    # The use count is "-" for modules that cannot be unloaded
+                    use_count = int(fields[2]) if fields[2].isdigit() else 0
+                    modules[fields[0]] = ModuleState(
+                        fields[0], int(fields[1]), use_count, holders, fields[4]
+                    )
+        except (OSError, ValueError) as e:
+            logger.debug(f"Cannot read {self._proc_modules}: {e}")
+            return {}
+        return modules
+
+    def is_loaded(self, module: str) -> bool:
+        return normalize_module_name(module) in self.read()
+
+    def wait_unloaded(
+        self,
+        modules: Iterable[str],
+        timeout: float,
+        min_poll_interval: float = 0.01,
+        max_poll_interval: float = 0.5,
+    ) -> Set[str]:
+        """
+        Wait for modules to disappear from /sys/module.
+
+        The interval between checks starts at min_poll_interval and doubles up to
+        max_poll_interval. Modules whose directory is gone are confirmed against
+        /proc/modules, which they leave last.
+
+        Returns:
+            Modules still loaded after the timeout
+        """
+        expected = {normalize_module_name(module) for module in modules}
+        pending = set(expected)
+        deadline = time.monotonic() + timeout
+        interval = min_poll_interval
+
+        while pending:
+            pending = {
+                module
+                for module in pending
+                if os.path.exists(os.path.join(self._sys_module, module))
+            }
+            if not pending:
+                pending = set(self.read()) & expected
+                if not pending:
+                    break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_poll_interval)
+
+        return pending
+
+
+class ModuleIndex:
+    """
+    Modules of a kernel version as recorded by depmod in modules.dep, modules.alias
+    and modules.builtin, indexed by normalized module name.
+    """
+
+    def __init__(
+        self,
+        dependencies: Dict[str, List[str]],
+        aliases: Iterable[Tuple[str, str]] = (),
+        builtin: Iterable[str] = (),
+    ):
+        """
+        Args:
+            dependencies: Module file paths by module file path, as in modules.dep
+            aliases: (alias pattern, module name) pairs, as in modules.alias
+            builtin: Module file paths of builtin modules, as in modules.builtin
+        """
+        # normalized name => file name without .ko
+        self._available: Dict[str, str] = {}
+        self._dependencies: Dict[str, List[str]] = {}
+        for path, paths in dependencies.items():
+            name = _module_name(path)
+            if name is None:
+                continue
+            key = normalize_module_name(name)
+            self._available[key] = name
+            self._dependencies[key] = [
+                normalize_module_name(dependency)
+                for dependency in map(_module_name, paths)
+                if dependency is not None
+            ]
+
+        self._builtin: Set[str] = {
+            normalize_module_name(name)
+            for name in map(_module_name, builtin)
+            if name is not None
+        }
+
+        # Most aliases are globs (e.g. of device ids), few are plain names
+        self._aliases: Dict[str, List[str]] = {}
+        self._alias_patterns: List[Tuple[str, str]] = []
+        for pattern, module in aliases:
+            module = normalize_module_name(module)
+            if any(c in pattern for c in "*?["):
+                self._alias_patterns.append((pattern, module))
+            else:
+                self._aliases.setdefault(normalize_module_name(pattern), []).append(
+                    module
+                )
+
+    @classmethod
+    def from_modules_dir(cls, modules_dir: str) -> "ModuleIndex":
+        """Read the depmod files of a kernel, modules.dep is required"""
+        dependencies: Dict[str, List[str]] = {}
+        with open(os.path.join(modules_dir, "modules.dep")) as f:
+            for line in f:
+                path, sep, paths = line.partition(":")
+                if sep:
+                    dependencies[path.strip()] = paths.split()
+
+        aliases: List[Tuple[str, str]] = []
+        try:
+            with open(os.path.join(modules_dir, "modules.alias")) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 3 and fields[0] == "alias":
+                        aliases.append((fields[1], fields[2]))
+        except FileNotFoundError:
+            pass
+
+        builtin: List[str] = []
+        try:
+            with open(os.path.join(modules_dir, "modules.builtin")) as f:
+                builtin = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            pass
+
+        return cls(dependencies, aliases, builtin)
+
+    def available_modules(self) -> List[str]:
+        """File names (without .ko) of all loadable modules, sorted"""
+        return sorted(self._available.values())
+
+    def is_available(self, module: str) -> bool:
+        """True if the module is a loadable module"""
+        return normalize_module_name(module) in self._available
+
+    def is_builtin(self, module: str) -> bool:
+        """True if the module is built into the kernel"""
+        return normalize_module_name(module) in self._builtin
+
+    def resolve(self, name: str) -> List[str]:
+        """
+        Modules providing a module name or alias, like modprobe resolves its
+        argument. Returns normalized module names, empty if there are none.
+        """
+        key = normalize_module_name(name)
+        if key in self._available or key in self._builtin:
+            return [key]
+        modules = list(self._aliases.get(key, []))
+        for pattern, module in self._alias_patterns:
+            if fnmatch.fnmatchcase(name, pattern) and module not in modules:
+                modules.append(module)
+        return modules
+
+    def dependencies(self, module: str) -> List[str]:
+        """Loadable modules the module directly depends on"""
+        return list(self._dependencies.get(normalize_module_name(module), []))
+
+    def dependency_closure(self, module: str) -> List[str]:
+        """
+        All loadable modules the module depends on, directly or indirectly, in
+        load order (dependencies before dependents), without the module itself.
+        """
+        key = normalize_module_name(module)
+        sorter: TopologicalSorter = TopologicalSorter()
+        pending = [key]
+        seen = {key}
+        while pending:
+            current = pending.pop()
+            current_dependencies = self._dependencies.get(current, [])
+            sorter.add(current, *current_dependencies)
+            for dependency in current_dependencies:
+                if dependency not in seen:
+                    seen.add(dependency)
+                    pending.append(dependency)
+        return [name for name in sorter.static_order() if name != key]
+
+    def dependency_graph(self, modules: Iterable[str]) -> Dict[str, Set[str]]:
+        """
+        Dependencies among the given modules, e.g. to unload them in order: each
+        module maps to the given modules it depends on, directly or indirectly.
+        """
+        keys = {normalize_module_name(module) for module in modules}
+        return {key: set(self.dependency_closure(key)) & keys for key in sorted(keys)}
+
+
+def module_index(modules_dir: str) -> Optional[ModuleIndex]:
+    """
+    Index of the modules in modules_dir, read only if modules.dep is new or
+    changed. None if the kernel has no modules.dep.
+    """
+    path = os.path.join(modules_dir, "modules.dep")
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _module_index_cache_lock:
+        if key not in _module_index_cache:
+            logger.debug(f"Reading module index of {modules_dir}")
+            _module_index_cache[key] = ModuleIndex.from_modules_dir(modules_dir)
+        return _module_index_cache[key]
+
+
 class KernelModule:
     """Manage and inspect kernel modules (loaded/available) for the running kernel."""
 
-    def __init__(self, find: Find, shell: ShellRunner, kernel_versions: KernelVersions):
+    def __init__(
+        self,
+        find: Find,
+        shell: ShellRunner,
+        kernel_versions: KernelVersions,
+        inventory: Optional[FilesystemInventory] = None,
+        states: Optional[ModuleStates] = None,
+    ):
         self._find = find
         self._shell = shell
         self._kernel_versions = kernel_versions
+        self._inventory = inventory
+        self._states = states or ModuleStates()
         self._initially_loaded = set(self.collect_loaded_modules())
         self._loaded: set[str] = set()
         self._dependency_graph: dict[str, set[str]] = {}
 
     def is_module_loaded(self, module: str) -> bool:
         """Return True if ``module`` appears in ``/proc/modules``."""
-        try:
-            with open("/proc/modules", "r") as f:
-                for line in f:
-                    if not line:
-                        continue
-                    # /proc/modules format: name size usecount deps state address
-                    name = line.split()[0]
-                    if name == module:
-                        return True
-        except Exception:
-            pass
-        return False
+        return self._states.is_loaded(module)
 
     def get_module_parameter(self, module: str, parameter: str) -> str | None:
         """Get the value of a module parameter.
@@ -153,12 +425,30 @@ class KernelModule:
 
         return True
 
-    def _update_module_dependencies(self, module: str) -> None:
-        """Update the dependency graph for a module."""
+    def module_index(self) -> Optional[ModuleIndex]:
+        """Index of the modules of the running kernel, None if it has no modules.dep"""
+        try:
+            return module_index(self._kernel_versions.get_running().modules_dir)
+        except OSError as e:
+            logger.warning(f"Cannot read module index: {e}")
+            return None
+
+    def _module_dependencies(self, module: str) -> List[str]:
+        """All modules the module depends on, from the index or modprobe"""
+        index = self.module_index()
+        if index is not None and index.is_available(module):
+            return index.dependency_closure(module)
         dep_result = self._shell(
             f"modprobe --show-depends {module}", capture_output=True
         )
-        for dependency in dependencies.findall(dep_result.stdout):
+        return [
+            normalize_module_name(dependency)
+            for dependency in dependencies.findall(dep_result.stdout)
+        ]
+
+    def _update_module_dependencies(self, module: str) -> None:
+        """Update the dependency graph for a module."""
+        for dependency in self._module_dependencies(module):
             if dependency != module:
                 # Only track dependencies that we also loaded (not initially loaded)
                 if dependency in self._loaded:
@@ -184,19 +474,14 @@ class KernelModule:
         return result.returncode == 0
 
     def _verify_module_unloaded(
-        self, module: str, max_wait: int = 60
-    ) -> tuple[bool, int]:
-        """Verify that a module is actually unloaded, checking every second.
+        self, module: str, max_wait: float = 60
+    ) -> tuple[bool, float]:
+        """Verify that a module is actually unloaded, waiting with backoff.
         Returns (success, waited_seconds) where success is True if module is unloaded.
         """
-        waited = 0
-        while self.is_module_loaded(module) and waited < max_wait:
-            time.sleep(1)
-            waited += 1
-
-        if self.is_module_loaded(module):
-            return False, waited
-        return True, waited
+        start = time.monotonic()
+        still_loaded = self._states.wait_unloaded([module], max_wait)
+        return not still_loaded, time.monotonic() - start
 
     def _unload_and_verify(self, module: str) -> bool:
         """Unload a module and verify it's actually unloaded.
@@ -214,46 +499,72 @@ class KernelModule:
         success, waited = self._verify_module_unloaded(module)
         if success:
             logger.debug(
-                f"Module {module} successfully unloaded after {waited} seconds"
+                f"Module {module} successfully unloaded after {waited:.3f} seconds"
             )
         else:
             logger.warning(
-                f"Module {module} is still loaded after {waited} seconds "
+                f"Module {module} is still loaded after {waited:.3f} seconds "
                 f"despite rmmod returning success. This might indicate the module "
                 f"is still in use by another module or process."
             )
         return success
 
-    def _calculate_unload_order(self) -> list[str]:
-        """Calculate the order to unload modules (dependents before dependencies).
+    def _unload_graph(self, modules: Set[str]) -> Dict[str, Set[str]]:
+        """Map each module to the modules that have to be unloaded before it.
 
         For kernel modules: if module A depends on B (A uses B), we must unload A before B.
-        This is because B cannot be unloaded while A is still using it.
-
-        Uses TopologicalSorter: we add edges as add(module, dependency), which means
-        "module depends on dependency". static_order() returns dependencies before dependents
-        (load order), so we reverse it to get dependents before dependencies (unload order).
+        This is because B cannot be unloaded while A is still using it. Dependencies are
+        known from loading the modules, holders are read from /proc/modules.
         """
-        sorter = TopologicalSorter()
-
-        for module in self._loaded:
-            sorter.add(module)
-
+        graph: Dict[str, Set[str]] = {module: set() for module in modules}
         for module, deps in self._dependency_graph.items():
             for dep in deps:
-                if dep in self._loaded:
-                    sorter.add(module, dep)
-
+                if module in modules and dep in modules:
+                    graph[dep].add(module)
+        for name, state in self._states.read().items():
+            if name in modules:
+                graph[name] |= state.holders & modules
+        return graph
+
+    def _unload_in_order(self, modules: Set[str], error: str) -> bool:
+        """Unload modules, dependents before dependencies.
+
+        Modules nothing else depends on (the leaves) are unloaded concurrently, a
+        module is unloaded as soon as all modules depending on it are gone.
+        Returns True if all succeed.
+        """
+        sorter = TopologicalSorter(self._unload_graph(modules))
         try:
-            order = list(sorter.static_order())
-            return list(reversed(order))
-        except ValueError as e:
-            # Cycle detected
+            sorter.prepare()
+        except CycleError as e:
             logger.warning(
                 f"Cycle detected in dependency graph: {e}. "
                 f"Unloading modules in arbitrary order."
             )
-            return list(self._loaded)
+            return all([self._unload_and_verify(module) for module in modules])
+
+        success = True
+        with concurrent.futures.ThreadPoolExecutor(UNLOAD_WORKERS) as executor:
+            futures: Dict[concurrent.futures.Future, str] = {}
+            while sorter.is_active():
+                for module in sorted(sorter.get_ready()):
+                    futures[executor.submit(self._unload_and_verify, module)] = module
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    module = futures.pop(future)
+                    unload_success = future.result()
+                    if not unload_success and self.is_module_loaded(module):
+                        logger.error(
+                            f"Module {module} {error}. "
+                            f"This will cause sysdiff to detect system changes."
+                        )
+                    success &= unload_success
+                    # Modules still in use by a module that failed to unload
+                    # fail on their own, no need to skip them
+                    sorter.done(module)
+        return success
 
     def unload_modules(self) -> bool:
         """Unload all modules loaded by ``load_module`` in the correct order using ``rmmod``.
@@ -263,56 +574,28 @@ class KernelModule:
         if not self._loaded:
             return True
 
-        unload_order = self._calculate_unload_order()
-        success = True
-
-        for module in unload_order:
+        modules = set()
+        for module in self._loaded:
             if module in self._initially_loaded:
                 logger.warning(
                     f"Skipping unload of {module} - it was already loaded before this test. "
                     f"This should not happen if tracking is correct."
                 )
                 continue
+            modules.add(module)
 
-            if module not in self._loaded:
-                logger.warning(
-                    f"Skipping unload of {module} - not in _loaded. "
-                    f"This should not happen if tracking is correct."
-                )
-                continue
-
-            unload_success = self._unload_and_verify(module)
-            if not unload_success and self.is_module_loaded(module):
-                logger.error(
-                    f"Module {module} failed to unload and is still loaded. "
-                    f"This will cause sysdiff to detect system changes."
-                )
-            success &= unload_success
+        success = self._unload_in_order(modules, "failed to unload and is still loaded")
 
         # Final verification: check if any tracked modules are still loaded
         # This catches cases where modules get reloaded after we unload them
-        still_loaded = []
-        for module in list(
-            self._loaded
-        ):  # Use list() to avoid modification during iteration
-            if self.is_module_loaded(module) and module not in self._initially_loaded:
-                still_loaded.append(module)
-
+        still_loaded = modules & set(self._states.read())
         if still_loaded:
             logger.warning(
-                f"The following modules are still loaded after unload attempt: {still_loaded}. "
+                f"The following modules are still loaded after unload attempt: {sorted(still_loaded)}. "
                 f"Trying to unload them again."
             )
             # Try unloading again - they might have been reloaded by udev or another process
-            for module in still_loaded:
-                logger.debug(f"Retrying unload of {module}")
-                retry_success = self._unload_and_verify(module)
-                if not retry_success:
-                    logger.error(
-                        f"Module {module} failed to unload on retry. "
-                        f"This will cause sysdiff to detect system changes."
-                    )
-                success &= retry_success
+            success &= self._unload_in_order(still_loaded, "failed to unload on retry")
 
         self._loaded.clear()
         self._dependency_graph.clear()
@@ -320,44 +603,60 @@ class KernelModule:
 
     def collect_loaded_modules(self) -> list[str]:
         """Collect all currently loaded kernel modules"""
-        modules: list[str] = []
-        try:
-            with open("/proc/modules", "r") as f:
-                for line in f:
-                    if not line.strip():
-                        continue
-                    modules.append(line.split()[0])
-        except Exception:
-            return []
-        return sorted(modules)
+        return sorted(self._states.read())
 
     def collect_available_modules(self) -> list[str]:
         """Collect all available kernel modules for the currently running kernel."""
+        index = self.module_index()
+        if index is not None:
+            return index.available_modules()
+
         modules: list[str] = []
         try:
             kernel_ver = self._kernel_versions.get_running()
             modules_dir = kernel_ver.modules_dir
-            pattern = re.compile(r"^(?P<name>.+?)\.ko(?:\..+)?$")
-            self._find.same_mnt_only = False
-            self._find.root_paths = [modules_dir]
-            self._find.entry_type = FIND_RESULT_TYPE_FILE
-            for file in self._find:
-                basename = os.path.basename(file)
-                m = pattern.match(basename)
-                if not m:
+            files = None
+            if self._inventory is not None:
+                files = self._inventory.find(
+                    str(modules_dir), FIND_RESULT_TYPE_FILE, same_mnt_only=False
+                )
+            if files is None:
+                self._find.same_mnt_only = False
+                self._find.root_paths = [modules_dir]
+                self._find.entry_type = FIND_RESULT_TYPE_FILE
+                files = self._find
+            for file in files:
+                name = _module_name(file)
+                if name is None:
                     continue
-                modules.append(m.group("name"))
+                modules.append(name)
         except Exception:
             return []
         return sorted(modules)
 
     def is_module_available(self, module: str) -> bool:
         """Check if a module is available as loadable module"""
+        index = self.module_index()
+        if index is not None:
+            return index.is_available(module)
         return module in self.collect_available_modules()
 
+    def is_module_builtin(self, module: str) -> bool:
+        """Check if a module is built into the running kernel"""
+        index = self.module_index()
+        return index is not None and index.is_builtin(module)
+
+    def resolve_module(self, name: str) -> List[str]:
+        """Modules providing a module name or alias, empty if unknown"""
+        index = self.module_index()
+        return index.resolve(name) if index is not None else []
+
 
 @pytest.fixture
 def kernel_module(
-    find: Find, shell: ShellRunner, kernel_versions: KernelVersions
+    find: Find,
+    shell: ShellRunner,
+    kernel_versions: KernelVersions,
+    inventory: Optional[FilesystemInventory],
 ) -> KernelModule:
-    return KernelModule(find, shell, kernel_versions)
+    return KernelModule(find, shell, kernel_versions, inventory)
@@ -1,8 +1,149 @@
-from typing import List
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
 
 import pytest
 
+from .features import features
+from .systemd import CriticalChainLink, Systemd, UnitActivation, UnitTiming
+
 skip_performance_metrics = False
+boot_profile_baseline_path: Optional[Path] = None
+boot_profile_record_path: Optional[Path] = None
+
+# Number of slowest units reported and compared against the baseline
+BOOT_PROFILE_TOP_N = 10
+# A unit regressed if it got slower by more than both tolerances
+BOOT_PROFILE_RELATIVE_TOLERANCE = 0.25
+BOOT_PROFILE_ABSOLUTE_TOLERANCE = 1.0
+
+
+def current_flavor() -> str:
+    """Flavor of the running image, identified by its sorted feature list"""
+    return ",".join(sorted(features))
+
+
+@dataclass
+class BootProfile:
+    """Boot timings of one flavor from systemd-analyze and systemctl"""
+
+    flavor: str
+    # Boot phases in seconds, as reported by Systemd.analyze
+    firmware: float
+    loader: float
+    kernel: float
+    initrd: float
+    userspace: float
+    # All units by startup time, slowest first
+    blame: List[UnitTiming] = field(default_factory=list)
+    # Critical chain of the default target, starting with the target
+    critical_chain: List[CriticalChainLink] = field(default_factory=list)
+    activations: Dict[str, UnitActivation] = field(default_factory=dict)
+
+    @classmethod
+    def collect(cls, systemd: Systemd, flavor: str) -> "BootProfile":
+        firmware, loader, kernel, initrd, userspace = systemd.analyze()
+        return cls(
+            flavor=flavor,
+            firmware=firmware,
+            loader=loader,
+            kernel=kernel,
+            initrd=initrd,
+            userspace=userspace,
+            blame=systemd.blame(),
+            critical_chain=systemd.critical_chain(),
+            activations=systemd.activation_timestamps(),
+        )
+
+    def slowest(self, n: int = BOOT_PROFILE_TOP_N) -> List[UnitTiming]:
+        return sorted(self.blame, key=lambda timing: timing.seconds, reverse=True)[:n]
+
+    def critical_path(self) -> List[str]:
+        """Units of the critical chain taking time to start, in start order"""
+        return [link.unit for link in reversed(self.critical_chain) if link.startup]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BootProfile":
+        return cls(
+            **{
+                key: value
+                for key, value in data.items()
+                if key not in ("blame", "critical_chain", "activations")
+            },
+            blame=[UnitTiming(**timing) for timing in data.get("blame", [])],
+            critical_chain=[
+                CriticalChainLink(**link) for link in data.get("critical_chain", [])
+            ],
+            activations={
+                unit: UnitActivation(**activation)
+                for unit, activation in data.get("activations", {}).items()
+            },
+        )
+
+
+def load_boot_profiles(path: Path) -> Dict[str, BootProfile]:
+    """Read boot profiles by flavor, an empty dict if the file does not exist"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {flavor: BootProfile.from_dict(record) for flavor, record in data.items()}
+
+
+def save_boot_profile(path: Path, profile: BootProfile):
+    """Store a boot profile, replacing the previous record of its flavor"""
+    profiles = load_boot_profiles(path)
+    profiles[profile.flavor] = profile
+    with open(path, "w") as f:
+        json.dump(
+            {flavor: record.to_dict() for flavor, record in sorted(profiles.items())},
+            f,
+            indent=2,
+        )
+
+
+def _regressed(baseline: float, current: float) -> bool:
+    return (
+        current - baseline > BOOT_PROFILE_ABSOLUTE_TOLERANCE
+        and current > baseline * (1 + BOOT_PROFILE_RELATIVE_TOLERANCE)
+    )
+
+
+def boot_profile_regressions(
+    baseline: BootProfile, current: BootProfile, top_n: int = BOOT_PROFILE_TOP_N
+) -> List[str]:
+    """
+    Compare a boot profile with its baseline.
+
+    The boot phases and the slowest units of either profile are compared, units
+    missing from the baseline are compared against a startup time of 0.
+
+    Returns:
+        Descriptions of all phases and units that got slower, empty if none
+    """
+    regressions = []
+    for phase in ("firmware", "loader", "kernel", "initrd", "userspace"):
+        before, after = getattr(baseline, phase), getattr(current, phase)
+        if _regressed(before, after):
+            regressions.append(f"{phase}: {before:.2f}s -> {after:.2f}s")
+
+    baseline_times = {timing.unit: timing.seconds for timing in baseline.blame}
+    current_times = {timing.unit: timing.seconds for timing in current.blame}
+    units = dict.fromkeys(
+        timing.unit for timing in current.slowest(top_n) + baseline.slowest(top_n)
+    )
+    for unit in units:
+        if unit not in current_times:
+            continue
+        before, after = baseline_times.get(unit, 0.0), current_times[unit]
+        if _regressed(before, after):
+            regressions.append(f"{unit}: {before:.2f}s -> {after:.2f}s")
+    return regressions
 
 
 def pytest_addoption(parser: pytest.Parser):
@@ -11,11 +152,27 @@ def pytest_addoption(parser: pytest.Parser):
         action="store_true",
         help="Skip performance metric tests. Useful if running in a VM under emulation.",
     )
+    parser.addoption(
+        "--boot-profile-baseline",
+        action="store",
+        default="",
+        help="JSON file with boot profiles by flavor to compare the boot of this system against.",
+    )
+    parser.addoption(
+        "--boot-profile-record",
+        action="store",
+        default="",
+        help="JSON file to store the boot profile of this system in, under its flavor.",
+    )
 
 
 def pytest_configure(config: pytest.Config):
-    global skip_performance_metrics
+    global skip_performance_metrics, boot_profile_baseline_path, boot_profile_record_path
     skip_performance_metrics = config.getoption("--skip-performance-metrics")
+    baseline = config.getoption("--boot-profile-baseline")
+    boot_profile_baseline_path = Path(baseline) if baseline else None
+    record = config.getoption("--boot-profile-record")
+    boot_profile_record_path = Path(record) if record else None
 
     config.addinivalue_line(
         "markers", "performance_metric: this test is a performance metric"
@@ -28,3 +185,20 @@ def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item
             item.add_marker(
                 pytest.mark.skip(reason="skipping performance metric tests")
             )
+
+
+@pytest.fixture
+def boot_profile(systemd: Systemd) -> BootProfile:
+    """Boot profile of this system, stored if --boot-profile-record is given"""
+    profile = BootProfile.collect(systemd, current_flavor())
+    if boot_profile_record_path is not None:
+        save_boot_profile(boot_profile_record_path, profile)
+    return profile
+
+
+@pytest.fixture
+def boot_profile_baseline() -> Optional[BootProfile]:
+    """Baseline boot profile of the flavor of this system, None if there is none"""
+    if boot_profile_baseline_path is None:
+        return None
+    return load_boot_profiles(boot_profile_baseline_path).get(current_flavor())
@@ -1,29 +1,66 @@
 import os
 import pathlib
+from typing import Optional
 
 import pytest
 
+from .inventory import FilesystemInventory
+
+SETUID_BINARY_DIRS = [
+    "/usr/sbin",
+    "/usr/bin",
+    "/usr/libexec",
+    "/usr/local/sbin",
+    "/usr/local/bin",
+]
+
+
+def is_exposed_setuid(uid: int, mode: int) -> bool:
+    return bool(
+        uid == 0  # file belongs to root
+        and mode & 0o4000  # set‑uid bit present
+        and ((mode >> 3) & 0o111)  # “others” execute bit set
+    )
+
+
+def _exposed_setuid_binaries_from_inventory(
+    inventory: FilesystemInventory,
+) -> Optional[set[str]]:
+    binaries = set()
+    for d in SETUID_BINARY_DIRS:
+        if not os.path.isdir(d):
+            continue
+        entries = inventory.entries(d, descend_mounts=True)
+        if entries is None:
+            return None
+        real_dir = os.path.realpath(d)
+        binaries.update(
+            d + entry.path[len(real_dir) :]
+            for entry in entries
+            if not entry.is_dir
+            and entry.effective_uid is not None
+            and entry.effective_mode is not None
+            and is_exposed_setuid(entry.effective_uid, entry.effective_mode)
+        )
+    return binaries
+
 
 @pytest.fixture
-def exposed_setuid_binaries():
+def exposed_setuid_binaries(inventory: Optional[FilesystemInventory]):
     """
     Returns a set of pathnames of root-owned binaries with setuid bit which are
     also "others"-executable (i.e. binaries that give root privileges to every
     user).
     """
-    dirs = [
-        "/usr/sbin",
-        "/usr/bin",
-        "/usr/libexec",
-        "/usr/local/sbin",
-        "/usr/local/bin",
-    ]
+    if inventory is not None:
+        binaries = _exposed_setuid_binaries_from_inventory(inventory)
+        if binaries is not None:
+            return binaries
+
     return {
         str(p)
-        for d in dirs
+        for d in SETUID_BINARY_DIRS
         for root, _, files in os.walk(d)
         for p in map(lambda n: pathlib.Path(root) / n, files)
-        if p.stat().st_uid == 0  # file belongs to root
-        and (m := p.stat().st_mode) & 0o4000  # set‑uid bit present
-        and ((m >> 3) & 0o111)  # “others” execute bit set
+        if is_exposed_setuid((st := p.stat()).st_uid, st.st_mode)
     }
@@ -1,33 +1,174 @@
+import locale
 import os
 import pwd
+import re
+import selectors
+import shlex
 import subprocess
-from typing import Optional, Tuple
+import sys
+import threading
+import uuid
+from typing import Dict, Optional, Tuple
 
 import pytest
 
 default_user: Optional[Tuple[int, int]] = None
+use_shell_worker: bool = False
 
+# Long-lived shell workers by (uid, gid), shut down at the end of the session
+_workers: Dict[Optional[Tuple[int, int]], "ShellWorker"] = {}
+_workers_lock = threading.Lock()
+
+
+class ShellWorker:
+    """
+    A long-lived /bin/sh running as a fixed user, reading commands from a pipe.
+
+    Every command runs in a subshell with `set -e` like `/bin/sh -e -c`, so changes
+    to the environment, working directory or shell options do not leak into later
+    commands. The end of the output of a command is framed by a random token
+    written to stdout (followed by the exit code) and to stderr.
+    """
 
-class ShellRunner:
     def __init__(self, user: Optional[Tuple[int, int]]):
         self.user = user
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._environment: Dict[str, str] = {}
+        self._cwd = ""
+
+    def _start(self):
+        self.stop()
+        self._environment = dict(os.environ)
+        self._cwd = os.getcwd()
+        self._process = subprocess.Popen(
+            ["/bin/sh", "-s"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            user=self.user[0] if self.user is not None else None,
+            group=self.user[1] if self.user is not None else None,
+        )
+
+    def _is_current(self) -> bool:
+        # Commands have to see the environment and directory of the test process
+        return (
+            self._process is not None
+            and self._process.poll() is None
+            and self._environment == os.environ
+            and self._cwd == os.getcwd()
+        )
+
+    def stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()  # type: ignore[union-attr]
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        process.stdout.close()  # type: ignore[union-attr]
+        process.stderr.close()  # type: ignore[union-attr]
+
+    def run(self, cmd: str) -> Tuple[int, bytes, bytes]:
+        """Run a command, return its exit code, stdout and stderr"""
+        with self._lock:
+            if not self._is_current():
+                self._start()
+            process = self._process
+            assert process is not None
+
+            token = uuid.uuid4().hex.encode()
+            script = (
+                f"( set -e; eval {shlex.quote(cmd)} ) </dev/null; "
+                f"printf '%s%d\\n' {token.decode()} $?; "
+                f"printf '%s\\n' {token.decode()} >&2\n"
+            )
+            try:
+                process.stdin.write(script.encode())  # type: ignore[union-attr]
+                process.stdin.flush()  # type: ignore[union-attr]
+                return self._read_framed(process, token)
+            except (OSError, EOFError) as e:
+                self.stop()
+                raise RuntimeError(f"shell worker died while running {cmd}") from e
+
+    @staticmethod
+    def _read_framed(
+        process: subprocess.Popen, token: bytes
+    ) -> Tuple[int, bytes, bytes]:
+        stdout_end = re.compile(re.escape(token) + rb"(\d+)\n\Z")
+        stderr_end = token + b"\n"
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code: Optional[int] = None
+        stderr_done = False
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ, stdout)  # type: ignore[arg-type]
+            selector.register(process.stderr, selectors.EVENT_READ, stderr)  # type: ignore[arg-type]
+            while exit_code is None or not stderr_done:
+                for key, _ in selector.select():
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        raise EOFError
+                    buffer = key.data
+                    buffer += data
+                    if buffer is stdout:
+                        # The frame is short, only look at the tail of the output
+                        match = stdout_end.search(stdout, max(0, len(stdout) - 64))
+                        if match:
+                            exit_code = int(match.group(1))
+                            del stdout[match.start() :]
+                    elif not stderr_done and stderr.endswith(stderr_end):
+                        stderr_done = True
+                        del stderr[-len(stderr_end) :]
+
+        return exit_code, bytes(stdout), bytes(stderr)
+
+
+def _shell_worker(user: Optional[Tuple[int, int]]) -> ShellWorker:
+    with _workers_lock:
+        if user not in _workers:
+            _workers[user] = ShellWorker(user)
+        return _workers[user]
+
+
+def _decode(data: bytes) -> str:
+    # Like subprocess in text mode
+    text = data.decode(locale.getpreferredencoding(False))
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+class ShellRunner:
+    def __init__(self, user: Optional[Tuple[int, int]], worker: Optional[bool] = None):
+        """
+        Args:
+            user: (uid, gid) to run commands as, None to run them as the current user
+            worker: Run commands in a long-lived shell per user instead of spawning
+                a new shell for each command, by default as set by --shell-worker
+        """
+        self.user = user
+        self.worker = use_shell_worker if worker is None else worker
 
     def __call__(
         self, cmd: str, capture_output: bool = False, ignore_exit_code: bool = False
     ) -> subprocess.CompletedProcess:
-        def _setuid():
-            if self.user != None:
-                os.setgid(self.user[1])
-                os.setuid(self.user[0])
-
-        result = subprocess.run(
-            ["/bin/sh", "-e", "-c", cmd],
-            shell=False,
-            capture_output=capture_output,
-            text=True,
-            check=False,
-            preexec_fn=_setuid,
-        )
+        if self.worker:
+            result = self._run_in_worker(cmd, capture_output)
+        else:
+            # No preexec_fn: the user is switched by subprocess itself, which is
+            # thread-safe and allows the fast spawn path when no switch is needed
+            result = subprocess.run(
+                ["/bin/sh", "-e", "-c", cmd],
+                shell=False,
+                capture_output=capture_output,
+                text=True,
+                check=False,
+                user=self.user[0] if self.user is not None else None,
+                group=self.user[1] if self.user is not None else None,
+            )
 
         if result.returncode != 0 and not ignore_exit_code:
             raise RuntimeError(
@@ -36,6 +177,23 @@ class ShellRunner:
 
         return result
 
+    def _run_in_worker(
+        self, cmd: str, capture_output: bool
+    ) -> subprocess.CompletedProcess:
+        returncode, stdout, stderr = _shell_worker(self.user).run(cmd)
+        args = ["/bin/sh", "-e", "-c", cmd]
+        if capture_output:
+            return subprocess.CompletedProcess(
+                args, returncode, _decode(stdout), _decode(stderr)
+            )
+
+        # The worker always captures, pass the output on like an inherited stream
+        sys.stdout.write(_decode(stdout))
+        sys.stdout.flush()
+        sys.stderr.write(_decode(stderr))
+        sys.stderr.flush()
+        return subprocess.CompletedProcess(args, returncode)
+
 
 def pytest_addoption(parser: pytest.Parser):
     parser.addoption(
@@ -44,10 +202,15 @@ def pytest_addoption(parser: pytest.Parser):
         default="",
         help="User to switch to before executing shell commands",
     )
+    parser.addoption(
+        "--shell-worker",
+        action="store_true",
+        help="Run shell commands in a long-lived shell per user instead of spawning a new shell for every command.",
+    )
 
 
 def pytest_configure(config: pytest.Config):
-    global default_user
+    global default_user, use_shell_worker
 
     default_user_name = config.getoption("--default-user")
     if default_user_name != "":
@@ -55,6 +218,7 @@ def pytest_configure(config: pytest.Config):
         default_user = (passwd_entry.pw_uid, passwd_entry.pw_gid)
     if default_user is None and os.geteuid() == 0:
         default_user = (65534, 65534)
+    use_shell_worker = bool(config.getoption("--shell-worker"))
 
     config.addinivalue_line(
         "markers",
@@ -62,6 +226,13 @@ def pytest_configure(config: pytest.Config):
     )
 
 
+def pytest_unconfigure(config: pytest.Config):
+    with _workers_lock:
+        for worker in _workers.values():
+            worker.stop()
+        _workers.clear()
+
+
 @pytest.fixture
 def shell(request: pytest.FixtureRequest) -> ShellRunner:
     root_marker = request.node.get_closest_marker("root")
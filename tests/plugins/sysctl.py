@@ -1,10 +1,41 @@
 import os
+import re
 from dataclasses import dataclass
+from typing import Iterable, Optional
 
 import pytest
 
 from .shell import ShellRunner
 
+SYSCTL_BASE_PATH = "/proc/sys"
+
+# Values are read with a small fixed buffer, longer values take several reads
+SYSCTL_READ_SIZE = 4096
+
+# Entries that are write-only or have side effects when read, they are never opened
+SYSCTL_DENYLIST = frozenset(
+    {
+        "fs.binfmt_misc.register",
+        "net.ipv4.route.flush",
+        "net.ipv6.route.flush",
+        "vm.compact_memory",
+        "vm.drop_caches",
+        # reading flushes the per-cpu vm statistics
+        "vm.stat_refresh",
+    }
+)
+
+WHITESPACE = re.compile(r"\s+")
+
+# sysctl(8) separates key components with dots and shows dots inside a
+# component (e.g. the VLAN interface eth0.100) as slashes, a path is the swap
+KEY_TO_PATH = str.maketrans("./", "/.")
+
+use_sysctl_snapshot = False
+
+# The session wide snapshot, invalidated after every test marked with modify
+_session_snapshot: Optional["Sysctl"] = None
+
 
 @dataclass
 class SysctlParam:
@@ -18,15 +49,36 @@ class SysctlParam:
 
 
 class Sysctl:
-    """Collects kernel parameters from /proc/sys/"""
+    """Collects kernel parameters from /proc/sys/
 
-    def __init__(self, shell: ShellRunner):
+    In snapshot mode all parameters are read once on first access and lookups are
+    answered from memory until ``invalidate`` is called.
+    """
+
+    def __init__(self, shell: Optional[ShellRunner], snapshot: bool = False):
         self.shell = shell
+        self.snapshot = snapshot
+        self._parameters: Optional[dict[str, str]] = None
+
+    def invalidate(self):
+        """Drop the snapshot, the next lookup reads /proc/sys again"""
+        self._parameters = None
+
+    def _snapshot_parameters(self) -> dict[str, str]:
+        if self._parameters is None:
+            self._parameters = self.collect_sysctl_parameters()
+        return self._parameters
 
     def _read_sysctl_parameter(self, key: str) -> str:
-        """Read a single sysctl parameter from /proc/sys"""
-        # Convert sysctl key to file path: replace '.' with '/'
-        file_path = f"/proc/sys/{key.replace('.', '/')}"
+        """Read a single sysctl parameter from /proc/sys or the snapshot"""
+        if self.snapshot:
+            try:
+                return self._snapshot_parameters()[key]
+            except KeyError:
+                raise KeyError(f"Sysctl parameter '{key}' not found")
+
+        # Convert sysctl key to file path, the inverse of the key built on collection
+        file_path = f"{SYSCTL_BASE_PATH}/{key.translate(KEY_TO_PATH)}"
 
         try:
             with open(file_path, "r") as f:
@@ -38,42 +90,81 @@ class Sysctl:
             # Be robust: skip any unexpected errors
             raise KeyError(f"Sysctl parameter '{key}' not found")
 
-    def collect_sysctl_parameters(self) -> dict[str, str]:
-        """Collect all readable sysctl parameters by parsing /proc/sys recursively."""
+    @staticmethod
+    def _read_sysctl_file(path: str) -> str | None:
+        """Read a file below /proc/sys with a fixed size buffer, None if unreadable"""
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return None
+
+        chunks = []
+        try:
+            while chunk := os.read(fd, SYSCTL_READ_SIZE):
+                chunks.append(chunk)
+            return b"".join(chunks).decode().strip()
+        except (OSError, UnicodeDecodeError):
+            # Skip unreadable or transient entries
+            return None
+        finally:
+            os.close(fd)
+
+    def collect_sysctl_parameters(self, ignore: Iterable[str] = ()) -> dict[str, str]:
+        """
+        Collect all readable sysctl parameters in a single pass over /proc/sys.
+
+        Keys are built while descending with os.scandir, every file is opened once.
+        Dots inside a path component are written as slashes like sysctl(8) does,
+        e.g. net/ipv4/conf/eth0.100/forwarding is net.ipv4.conf.eth0/100.forwarding.
+        Entries in ``SYSCTL_DENYLIST`` and in ``ignore`` are skipped without opening them.
+
+        Args:
+            ignore: Parameter names to skip, e.g. sysdiff's IGNORED_SYSCTL_PARAMS
+        """
         sysctl_params: dict[str, str] = {}
 
-        base_path = "/proc/sys"
-        if not os.path.isdir(base_path):
+        if not os.path.isdir(SYSCTL_BASE_PATH):
             return {}
 
-        for root, _dirs, files in os.walk(base_path):
-            for filename in files:
-                file_path = os.path.join(root, filename)
-                # Build sysctl key: strip base_path and replace '/' with '.'
-                rel_path = file_path[len(base_path) + 1 :]
-                key = rel_path.replace("/", ".")
+        skipped = SYSCTL_DENYLIST.union(ignore)
+        pending = [(SYSCTL_BASE_PATH, "")]
+        while pending:
+            dir_path, key_prefix = pending.pop()
+            try:
+                entries = list(os.scandir(dir_path))
+            except OSError:
+                continue
+
+            for entry in entries:
+                key = key_prefix + entry.name.replace(".", "/")
                 try:
-                    value = self._read_sysctl_parameter(key)
-                    sysctl_params[key] = value
-                except KeyError:
-                    # Skip unreadable or transient entries
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    pending.append((entry.path, key + "."))
+                    continue
+                if key in skipped:
                     continue
+                value = self._read_sysctl_file(entry.path)
+                if value is not None:
+                    sysctl_params[key] = value
 
         return dict(sorted(sysctl_params.items()))
 
     def __getitem__(self, key: str):
         """Enable dictionary-style access to sysctl parameters"""
-        import re
-
         value = self._read_sysctl_parameter(key)
         # Normalize whitespace: convert tabs and multiple spaces to single space
-        value = re.sub(r"\s+", " ", value)
+        value = WHITESPACE.sub(" ", value)
         return int(value) if value.isdigit() else value
 
     def __contains__(self, key: object) -> bool:
         """Support `"name" in sysctl` membership test."""
         if not isinstance(key, str):
             return False
+        if self.snapshot:
+            return key in self._snapshot_parameters()
         try:
             self._read_sysctl_parameter(key)
             return True
@@ -81,6 +172,35 @@ class Sysctl:
             return False
 
 
+def pytest_addoption(parser: pytest.Parser):
+    parser.addoption(
+        "--sysctl-snapshot",
+        action="store_true",
+        help="Read all sysctl parameters once per session and answer lookups from memory. The snapshot is re-read after tests marked with modify.",
+    )
+
+
+def pytest_configure(config: pytest.Config):
+    global use_sysctl_snapshot
+    use_sysctl_snapshot = bool(config.getoption("--sysctl-snapshot"))
+
+
+def pytest_runtest_teardown(item: pytest.Item):
+    # Any test mutating the system may have changed kernel parameters
+    if _session_snapshot is not None and item.get_closest_marker("modify"):
+        _session_snapshot.invalidate()
+
+
+@pytest.fixture(scope="session")
+def sysctl_snapshot() -> Sysctl:
+    global _session_snapshot
+    _session_snapshot = Sysctl(None, snapshot=True)
+    return _session_snapshot
+
+
 @pytest.fixture
-def sysctl(shell: ShellRunner) -> Sysctl:
+def sysctl(request: pytest.FixtureRequest, shell: ShellRunner) -> Sysctl:
+    # Tests marked with modify read live values, they may change parameters themselves
+    if use_sysctl_snapshot and not request.node.get_closest_marker("modify"):
+        return request.getfixturevalue("sysctl_snapshot")
     return Sysctl(shell)
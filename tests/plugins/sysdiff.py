@@ -9,26 +9,32 @@ Provides snapshot and comparison capabilities for:
 - loaded kernel modules
 """
 
-import difflib
 import gzip
 import hashlib
+import io
 import json
 import logging
 import os
 import re
 import shutil
+import tarfile
+import tempfile
 import time
-from dataclasses import asdict, dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
 from datetime import datetime
 from fnmatch import fnmatch
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
 import pytest
 from debian import deb822
 
+from .checksum import StatKey, digest_fileobj
 from .dpkg import Dpkg
-from .find import Find
+from .find import FIND_RESULT_TYPE_FILE, Find
+from .inventory import FilesystemInventory
 from .kernel_module import KernelModule, LoadedKernelModule
 from .kernel_versions import KernelVersions
 from .shell import ShellRunner
@@ -39,6 +45,25 @@ logger = logging.getLogger(__name__)
 
 STATE_DIR = "/tmp/sysdiff"
 
+# Snapshots are stored as uncompressed tar archives with a manifest and one
+# gzip compressed member per section, so sections can be read independently.
+# Since format version 2 the members can be kept in a content-addressed object
+# store next to the snapshots and are only referenced by the manifest.
+# Snapshots written before the archive format are single .json.gz documents.
+SNAPSHOT_FORMAT_VERSION = 2
+SUPPORTED_SNAPSHOT_FORMAT_VERSIONS = (1, 2)
+SNAPSHOT_SUFFIX = ".sysdiff.tar"
+LEGACY_SNAPSHOT_SUFFIX = ".json.gz"
+SNAPSHOT_MANIFEST = "manifest.json"
+OBJECTS_DIR = "objects"
+SNAPSHOT_SECTIONS = (
+    "packages",
+    "systemd_units",
+    "files",
+    "sysctl_params",
+    "kernel_modules",
+)
+
 DEFAULT_PATHS = [
     "/etc",
     "/boot",
@@ -86,6 +111,10 @@ WAIT_FOR_SETTLED_UNITS = {
     "libvirtd-admin.socket": "listening",
 }
 
+CHANGE_ADDED = "added"
+CHANGE_REMOVED = "removed"
+CHANGE_MODIFIED = "modified"
+
 IGNORED_KERNEL_MODULES = []
 IGNORED_SYSCTL_PARAMS = {
     # File system dynamic parameters
@@ -136,10 +165,55 @@ class FileEntry:
 
     path: str
     sha256: str
+    # stat metadata used to reuse the hash in incremental snapshots,
+    # missing in snapshots created before incremental mode existed
+    dev: Optional[int] = None
+    inode: Optional[int] = None
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+    ctime_ns: Optional[int] = None
 
     def __str__(self) -> str:
         return f"{self.sha256}  {self.path}"
 
+    def stat_key(self) -> Optional[StatKey]:
+        """Return the (dev, inode, size, mtime_ns, ctime_ns) key, if recorded"""
+        if (
+            self.dev is None
+            or self.inode is None
+            or self.size is None
+            or self.mtime_ns is None
+            or self.ctime_ns is None
+        ):
+            return None
+        return self.dev, self.inode, self.size, self.mtime_ns, self.ctime_ns
+
+
+@dataclass
+class HashingStats:
+    """Throughput statistics of a file hashing run"""
+
+    files: int
+    bytes: int
+    elapsed: float
+    workers: int
+    cached: int = 0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} files ({self.bytes / (1024 * 1024):.1f} MB) in {self.elapsed:.2f}s "
+            f"with {self.workers} workers ({self.cached} reused from cache): "
+            f"{self.files_per_second:.0f} files/s, {self.mb_per_second:.1f} MB/s"
+        )
+
 
 @dataclass
 class SnapshotMetadata:
@@ -148,6 +222,9 @@ class SnapshotMetadata:
     created_at: str
     paths: List[str]
     ignore_file: bool
+    base_snapshot: Optional[str] = None
+    # wall clock seconds spent per section collector
+    collector_timings: Dict[str, float] = field(default_factory=dict)
 
 
 @dataclass
@@ -162,24 +239,182 @@ class Snapshot:
     sysctl_params: List[SysctlParam]
     kernel_modules: List[LoadedKernelModule]  # loaded kernel modules
 
+    def package_versions(self) -> List[tuple[str, str]]:
+        """Return (Package, Version) pairs of all packages"""
+        return [
+            (pkg.get("Package", ""), pkg.get("Version", "")) for pkg in self.packages
+        ]
+
+
+class LazySnapshot(Snapshot):
+    """Snapshot whose sections are read from a SnapshotArchive on first access"""
+
+    def __init__(
+        self, name: str, metadata: SnapshotMetadata, archive: "SnapshotArchive"
+    ):
+        self.name = name
+        self.metadata = metadata
+        self._archive = archive
+
+    def __getattr__(self, attr: str):
+        # Only called for attributes that are not set yet, i.e. sections not loaded so far
+        if attr not in SNAPSHOT_SECTIONS:
+            raise AttributeError(attr)
+        value = self._archive.read_section(attr)
+        setattr(self, attr, value)
+        return value
+
+    def package_versions(self) -> List[tuple[str, str]]:
+        """Return (Package, Version) pairs without parsing the package paragraphs"""
+        if "packages" in self.__dict__:
+            return super().package_versions()
+        return self._archive.read_package_versions()
+
+
+@dataclass
+class Change:
+    """A single added, removed or modified entry of a snapshot section"""
+
+    key: str
+    kind: str
+    old: Optional[str] = None
+    new: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.kind == CHANGE_ADDED:
+            return f"added {self.key}: {self.new}"
+        if self.kind == CHANGE_REMOVED:
+            return f"removed {self.key}: {self.old}"
+        return f"modified {self.key}: {self.old} -> {self.new}"
+
 
 @dataclass
 class DiffResult:
     """Result of comparing two snapshots"""
 
-    package_changes: List[str]
-    systemd_changes: List[str]
-    file_changes: List[str]
-    sysctl_changes: List[str]
-    kernel_module_changes: List[str]
+    package_changes: List[Change]
+    systemd_changes: List[Change]
+    file_changes: List[Change]
+    sysctl_changes: List[Change]
+    kernel_module_changes: List[Change]
     has_changes: bool
 
 
+class IgnoreMatcher:
+    """
+    Precompiled matcher for ignore patterns.
+
+    Patterns keep their ``re.search`` semantics, but are split into:
+    - anchored literal prefixes (e.g. ``^/etc/ssh/``), stored in a character trie
+    - literal strings and invalid regexes, matched as substrings by one alternation
+    - all other regexes, matched by one alternation (regexes with groups are kept
+      separate, as combining them would renumber back references)
+
+    Prefixes and literals match every path below a directory once they match the
+    directory itself, which allows pruning whole subtrees while walking.
+    """
+
+    _REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+    _TRIE_END = ""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._prefix_trie: dict = {}
+        literals: List[str] = []
+        regexes: List[str] = []
+        self._separate_regexes: List[re.Pattern] = []
+
+        for pattern in patterns:
+            if pattern.startswith("^") and self._is_literal(pattern[1:]):
+                self._add_prefix(pattern[1:])
+                continue
+            try:
+                compiled = re.compile(pattern)
+            except re.error:
+                # If pattern is invalid regex, treat as literal string
+                literals.append(pattern)
+                continue
+            if self._is_literal(pattern):
+                literals.append(pattern)
+            elif compiled.groups:
+                self._separate_regexes.append(compiled)
+            else:
+                regexes.append(pattern)
+
+        self._literals = (
+            re.compile("|".join(re.escape(literal) for literal in literals))
+            if literals
+            else None
+        )
+        self._regex = None
+        if regexes:
+            try:
+                self._regex = re.compile("|".join(f"(?:{p})" for p in regexes))
+            except re.error:
+                # e.g. global inline flags, which are only allowed at the start
+                self._separate_regexes.extend(re.compile(p) for p in regexes)
+
+    @classmethod
+    def _is_literal(cls, pattern: str) -> bool:
+        return bool(pattern) and not any(c in cls._REGEX_SPECIAL for c in pattern)
+
+    def _add_prefix(self, prefix: str):
+        node = self._prefix_trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._TRIE_END] = True
+
+    def _matches_prefix(self, path: str) -> bool:
+        node = self._prefix_trie
+        for char in path:
+            if self._TRIE_END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self._TRIE_END in node
+
+    def matches(self, path: str) -> bool:
+        """Check if a path matches any ignore pattern"""
+        if self._prefix_trie and self._matches_prefix(path):
+            return True
+        if self._literals is not None and self._literals.search(path):
+            return True
+        if self._regex is not None and self._regex.search(path):
+            return True
+        return any(regex.search(path) for regex in self._separate_regexes)
+
+    def prunes(self, dirpath: str) -> bool:
+        """Check if every path below a directory is ignored"""
+        # All descendants start with "<dirpath>/", so a prefix or substring
+        # matching it matches every descendant as well
+        probe = dirpath.rstrip("/") + "/"
+        if self._prefix_trie and self._matches_prefix(probe):
+            return True
+        return self._literals is not None and bool(self._literals.search(probe))
+
+
+@lru_cache(maxsize=16)
+def compile_ignore_patterns(patterns: tuple[str, ...]) -> IgnoreMatcher:
+    """Return a cached IgnoreMatcher for the given patterns"""
+    return IgnoreMatcher(patterns)
+
+
 class FileCollector:
     """Collects file hashes and handles filtering"""
 
-    def __init__(self, shell: ShellRunner):
+    def __init__(
+        self,
+        shell: ShellRunner,
+        workers: Optional[int] = None,
+        inventory: Optional[FilesystemInventory] = None,
+    ):
         self.shell = shell
+        # Hashing is I/O bound and hashlib releases the GIL on large buffers,
+        # so a thread pool sized to the available cores scales well
+        self.workers = workers or os.process_cpu_count() or 1
+        self.stats: Optional[HashingStats] = None
+        # Directory listings are taken from the inventory where it covers a path
+        self.inventory = inventory
 
     def normalize_paths(self, paths: List[str]) -> List[str]:
         """Deduplicate and keep only existing directories/files"""
@@ -216,18 +451,14 @@ class FileCollector:
 
     def should_ignore_file(self, filepath: str, ignore_patterns: List[str]) -> bool:
         """Check if file should be ignored based on patterns"""
-        for pattern in ignore_patterns:
-            try:
-                if re.search(pattern, filepath):
-                    return True
-            except re.error:
-                # If pattern is invalid regex, treat as literal string
-                if pattern in filepath:
-                    return True
-        return False
+        return compile_ignore_patterns(tuple(ignore_patterns)).matches(filepath)
+
+    def _walk_files_recursive(self, root: str, matcher: Optional[IgnoreMatcher] = None):
+        """
+        Yield all files under root, recursively, without crossing filesystem boundaries.
 
-    def _walk_files_recursive(self, root: str):
-        """Yield all files under root, recursively, without crossing filesystem boundaries."""
+        Directories whose whole subtree is ignored by ``matcher`` are not descended into.
+        """
         if os.path.isfile(root):
             yield root
             return
@@ -235,6 +466,9 @@ class FileCollector:
         if not os.path.isdir(root):
             return
 
+        if matcher is not None and matcher.prunes(root):
+            return
+
         try:
             root_dev = os.stat(root).st_dev
         except (OSError, IOError) as e:
@@ -254,14 +488,35 @@ class FileCollector:
                 dirnames[:] = []  # Skip inaccessible directories
                 continue
 
+            if matcher is not None:
+                dirnames[:] = [
+                    dirname
+                    for dirname in dirnames
+                    if not matcher.prunes(os.path.join(dirpath, dirname))
+                ]
+
             for filename in filenames:
                 filepath = os.path.join(dirpath, filename)
                 yield filepath
 
-    def _calculate_file_hash(
+    def _list_files(self, root: str, matcher: IgnoreMatcher) -> List[str]:
+        """List the files under root like _walk_files_recursive, from the inventory if possible"""
+        if (
+            self.inventory is not None
+            and os.path.isdir(root)
+            and not matcher.prunes(root)
+        ):
+            files = self.inventory.find(
+                root, FIND_RESULT_TYPE_FILE, same_mnt_only=False, descend_mounts=False
+            )
+            if files is not None:
+                return files
+        return list(self._walk_files_recursive(root, matcher))
+
+    def _hash_file(
         self, filepath: str, verbose: bool = False
-    ) -> Optional[str]:
-        """Calculate SHA256 hash for a single file"""
+    ) -> Optional[tuple[str, int]]:
+        """Calculate SHA256 hash and size for a single file"""
 
         # Check if file exists before trying to read it
         try:
@@ -275,89 +530,430 @@ class FileCollector:
 
         try:
             with open(filepath, "rb") as fileobj:
-                sha256 = hashlib.sha256()
-                # Read file in chunks for memory efficiency
-                while True:
-                    chunk = fileobj.read(8192)
-                    if not chunk:
-                        break
-                    sha256.update(chunk)
-                return sha256.hexdigest()
+                digests, size = digest_fileobj(fileobj, ("sha256",))
+                return digests["sha256"], size
         except FileNotFoundError:
             # This shouldn't happen after the exists check, but handle it gracefully
             if verbose:
                 logger.warning(f"Warning: File disappeared: {filepath}")
             return None
-        except (OSError, IOError, PermissionError) as e:
+        except (OSError, IOError, PermissionError, ValueError) as e:
             # Less common errors - always warn
             logger.warning(f"Warning: Cannot read {filepath}: {e}")
             return None
 
-    def collect_file_hashes(
+    def _calculate_file_hash(
+        self, filepath: str, verbose: bool = False
+    ) -> Optional[str]:
+        """Calculate SHA256 hash for a single file"""
+        result = self._hash_file(filepath, verbose)
+        return result[0] if result is not None else None
+
+    def _collect_file_entry(
+        self,
+        filepath: str,
+        verbose: bool = False,
+        cache: Optional[Dict[str, FileEntry]] = None,
+    ) -> Optional[tuple[FileEntry, int, bool]]:
+        """
+        Create the FileEntry for a single file.
+
+        Returns the entry, the number of bytes read and whether the hash was reused.
+
+        The hash of a cached entry is reused without reading the file if its
+        (dev, inode, size, mtime_ns, ctime_ns) key matches the current stat result.
+        """
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            if verbose:
+                logger.warning(f"Warning: File not found: {filepath}")
+            return None
+        except (OSError, IOError):
+            return None
+
+        stat_fields = {
+            "dev": st.st_dev,
+            "inode": st.st_ino,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "ctime_ns": st.st_ctime_ns,
+        }
+
+        cached = cache.get(filepath) if cache else None
+        if cached is not None and cached.stat_key() == tuple(stat_fields.values()):
+            return (
+                FileEntry(path=filepath, sha256=cached.sha256, **stat_fields),
+                0,
+                True,
+            )
+
+        result = self._hash_file(filepath, verbose)
+        if result is None:
+            return None
+        hash_value, size = result
+        return FileEntry(path=filepath, sha256=hash_value, **stat_fields), size, False
+
+    def collect_file_entries(
         self,
         paths: List[str],
         ignore_patterns: Optional[List[str]] = None,
         verbose: bool = False,
-    ) -> Dict[str, str]:
+        cache: Optional[Dict[str, FileEntry]] = None,
+    ) -> List[FileEntry]:
         """
-        Collect SHA256 hashes for files in given paths, recursively.
+        Collect FileEntry objects (SHA256 hash and stat metadata) for files in given paths, recursively.
+
+        Files are hashed concurrently on a thread pool of ``self.workers`` threads,
+        the throughput of the run is stored in ``self.stats``.
 
         Args:
             paths: List of file/directory paths to scan
             ignore_patterns: List of regex patterns for files to ignore
             verbose: If True, show warnings for missing files (broken symlinks)
+            cache: Entries of a previous snapshot by path, files with unchanged
+                stat metadata reuse the cached hash instead of being re-read
 
         Returns:
-            Dictionary mapping file paths to their SHA256 hashes
+            List of FileEntry objects sorted by path
         """
 
         if ignore_patterns is None:
             ignore_patterns = []
 
-        file_hashes: Dict[str, str] = {}
+        file_entries: List[FileEntry] = []
 
         if not paths:
-            return file_hashes
+            return file_entries
 
         try:
+            matcher = compile_ignore_patterns(tuple(ignore_patterns))
             all_files = []
             for path in paths:
                 try:
-                    files_in_path = list(self._walk_files_recursive(path))
+                    files_in_path = self._list_files(path, matcher)
                     all_files.extend(files_in_path)
                 except Exception as e:
                     logger.warning(f"Warning: Error scanning {path}: {e}")
                     continue
 
-            filtered_files = [
-                f for f in all_files if not self.should_ignore_file(f, ignore_patterns)
-            ]
+            filtered_files = [f for f in all_files if not matcher.matches(f)]
 
             filtered_files.sort()
 
-            for filepath in filtered_files:
-                hash_value = self._calculate_file_hash(filepath, verbose)
-                if hash_value is not None:
-                    file_hashes[filepath] = hash_value
+            start_time = time.perf_counter()
+            total_bytes = 0
+            cached_files = 0
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # map() yields in submission order, so the result stays sorted by path
+                results = executor.map(
+                    lambda f: self._collect_file_entry(f, verbose, cache),
+                    filtered_files,
+                )
+                for result in results:
+                    if result is None:
+                        continue
+                    file_entry, size, reused = result
+                    file_entries.append(file_entry)
+                    total_bytes += size
+                    cached_files += reused
+
+            self.stats = HashingStats(
+                files=len(file_entries),
+                bytes=total_bytes,
+                elapsed=time.perf_counter() - start_time,
+                workers=self.workers,
+                cached=cached_files,
+            )
+            logger.info(f"Hashed {self.stats}")
 
         except Exception as e:
             logger.error(f"Error collecting file hashes: {e}")
 
-        return file_hashes
+        return file_entries
+
+    def collect_file_hashes(
+        self,
+        paths: List[str],
+        ignore_patterns: Optional[List[str]] = None,
+        verbose: bool = False,
+    ) -> Dict[str, str]:
+        """
+        Collect SHA256 hashes for files in given paths, recursively.
+
+        Args:
+            paths: List of file/directory paths to scan
+            ignore_patterns: List of regex patterns for files to ignore
+            verbose: If True, show warnings for missing files (broken symlinks)
+
+        Returns:
+            Dictionary mapping file paths to their SHA256 hashes
+        """
+        return {
+            file_entry.path: file_entry.sha256
+            for file_entry in self.collect_file_entries(paths, ignore_patterns, verbose)
+        }
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits for stored snapshots, None means unlimited"""
+
+    max_count: Optional[int] = None
+    max_age: Optional[float] = None  # seconds
+    max_bytes: Optional[int] = None  # snapshots and the objects they reference
+
+
+class ObjectStore:
+    """Content-addressed store for snapshot section members, keyed by SHA256"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _object_path(self, digest: str) -> Path:
+        return self.path / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        """Store data unless an identical object exists and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(digest)
+        if object_path.exists():
+            return digest
+
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=object_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, object_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Read an object"""
+        try:
+            return self._object_path(digest).read_bytes()
+        except FileNotFoundError:
+            raise ValueError(f"Object {digest} missing in {self.path}")
+
+    def sizes(self) -> Dict[str, int]:
+        """Return the size of every stored object by digest"""
+        if not self.path.is_dir():
+            return {}
+        return {
+            object_path.name: object_path.stat().st_size
+            for fanout in self.path.iterdir()
+            if fanout.is_dir()
+            for object_path in fanout.iterdir()
+            if not object_path.name.endswith(".tmp")
+        }
+
+    def collect_garbage(self, referenced: set[str]) -> int:
+        """Remove objects that are not referenced and return the number of freed bytes"""
+        freed = 0
+        for digest, size in self.sizes().items():
+            if digest not in referenced:
+                self._object_path(digest).unlink()
+                freed += size
+
+        if self.path.is_dir():
+            for fanout in self.path.iterdir():
+                if fanout.is_dir() and not any(fanout.iterdir()):
+                    fanout.rmdir()
+            if not any(self.path.iterdir()):
+                self.path.rmdir()
+        return freed
+
+
+class SnapshotArchive:
+    """
+    Reads and writes the section-indexed snapshot format.
+
+    The archive is an uncompressed tar file containing:
+    - manifest.json: format version, snapshot name, metadata and section index
+    - packages.deb822.gz: package paragraphs in dpkg status format
+    - packages.index.json.gz: Package and Version columns for diffing
+    - <section>.json.gz: columnar JSON (one list per field) for all other sections
+
+    Members are compressed individually, so reading a section only
+    decompresses and parses that section. If an ObjectStore is given, members
+    are written to the store instead and the manifest maps member names to
+    object digests, so sections identical to a previous snapshot are stored once.
+    """
+
+    _COLUMNAR_SECTIONS = {
+        "systemd_units": SystemdUnit,
+        "files": FileEntry,
+        "sysctl_params": SysctlParam,
+        "kernel_modules": LoadedKernelModule,
+    }
+
+    def __init__(self, path: Path, store: Optional[ObjectStore] = None):
+        self.path = path
+        self._store = store
+        self._manifest: Optional[dict] = None
+
+    @property
+    def manifest(self) -> dict:
+        manifest = self._manifest
+        if manifest is None:
+            manifest = json.loads(self._read_member(SNAPSHOT_MANIFEST))
+            version = manifest.get("format_version")
+            if version not in SUPPORTED_SNAPSHOT_FORMAT_VERSIONS:
+                raise ValueError(
+                    f"Unsupported snapshot format version {version} in {self.path}"
+                )
+            self._manifest = manifest
+        return manifest
+
+    def _read_member(self, member: str) -> bytes:
+        with tarfile.open(self.path, "r:") as tar:
+            fileobj = tar.extractfile(member)
+            if fileobj is None:
+                raise ValueError(f"Member {member} missing in snapshot {self.path}")
+            return fileobj.read()
+
+    def _read_section_member(self, section: str, member: str) -> bytes:
+        members = self.manifest["sections"][section]["members"]
+        if member not in members:
+            raise ValueError(f"Member {member} missing in snapshot {self.path}")
+
+        digest = self.objects.get(member)
+        if digest is None:
+            return gzip.decompress(self._read_member(member))
+        if self._store is None:
+            raise ValueError(f"Snapshot {self.path} requires an object store")
+        return gzip.decompress(self._store.get(digest))
+
+    @property
+    def objects(self) -> Dict[str, str]:
+        """Digests of members kept in the object store by member name"""
+        return self.manifest.get("objects", {})
+
+    def read_section(self, section: str) -> list:
+        """Read a single section of the snapshot"""
+        if section == "packages":
+            text = self._read_section_member(section, "packages.deb822.gz").decode()
+            return list(
+                deb822.Deb822.iter_paragraphs(
+                    text.splitlines(keepends=True), use_apt_pkg=False
+                )
+            )
+
+        entry_type = self._COLUMNAR_SECTIONS[section]
+        columns = json.loads(self._read_section_member(section, f"{section}.json.gz"))
+        names = list(columns)
+        return [
+            entry_type(**dict(zip(names, values))) for values in zip(*columns.values())
+        ]
+
+    def read_package_versions(self) -> List[tuple[str, str]]:
+        """Read (Package, Version) pairs from the package index"""
+        columns = json.loads(
+            self._read_section_member("packages", "packages.index.json.gz")
+        )
+        return list(zip(columns["Package"], columns["Version"]))
+
+    def load(self) -> LazySnapshot:
+        """Return a snapshot whose sections are loaded on first access"""
+        manifest = self.manifest
+        return LazySnapshot(
+            manifest["name"], SnapshotMetadata(**manifest["metadata"]), self
+        )
+
+    def write(self, snapshot: Snapshot):
+        """Write the snapshot, replacing the archive atomically"""
+        members: Dict[str, bytes] = {}
+        sections: Dict[str, dict] = {}
+
+        packages = snapshot.packages
+        members["packages.deb822.gz"] = gzip.compress(
+            "\n".join(pkg.dump() for pkg in packages).encode(), mtime=0
+        )
+        members["packages.index.json.gz"] = self._compress_json(
+            {
+                "Package": [pkg.get("Package", "") for pkg in packages],
+                "Version": [pkg.get("Version", "") for pkg in packages],
+            }
+        )
+        sections["packages"] = {
+            "members": ["packages.deb822.gz", "packages.index.json.gz"],
+            "count": len(packages),
+        }
+
+        for section, entry_type in self._COLUMNAR_SECTIONS.items():
+            entries = getattr(snapshot, section)
+            member = f"{section}.json.gz"
+            members[member] = self._compress_json(
+                {
+                    entry_field.name: [
+                        getattr(entry, entry_field.name) for entry in entries
+                    ]
+                    for entry_field in fields(entry_type)
+                }
+            )
+            sections[section] = {"members": [member], "count": len(entries)}
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "name": snapshot.name,
+            "metadata": asdict(snapshot.metadata),
+            "sections": sections,
+        }
+        if self._store is not None:
+            manifest["objects"] = {
+                member: self._store.put(data) for member, data in members.items()
+            }
+            members = {}
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, tarfile.open(fileobj=f, mode="w:") as tar:
+                self._add_member(tar, SNAPSHOT_MANIFEST, json.dumps(manifest).encode())
+                for member, data in members.items():
+                    self._add_member(tar, member, data)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._manifest = manifest
+
+    @staticmethod
+    def _compress_json(data) -> bytes:
+        # mtime=0 keeps the output deterministic, so identical sections deduplicate
+        return gzip.compress(json.dumps(data, separators=(",", ":")).encode(), mtime=0)
+
+    @staticmethod
+    def _add_member(tar: tarfile.TarFile, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(data))
 
 
 class SnapshotManager:
     """Manages snapshot creation, storage, and retrieval"""
 
-    def __init__(self, state_dir: Path | None = None):
+    def __init__(
+        self,
+        state_dir: Path | None = None,
+        retention: RetentionPolicy | None = None,
+        inventory: FilesystemInventory | None = None,
+    ):
         self.state_dir = state_dir or Path(STATE_DIR)
         self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.store = ObjectStore(self.state_dir / OBJECTS_DIR)
+        self.retention = retention
+        # Rescanned for every snapshot, the walk is shared with other plugins
+        self.inventory = inventory
 
     def _wait_for_units_settled(
         self,
         systemd: Systemd,
         max_wait_seconds: int = 120,
-        poll_interval: float = 0.5,
+        max_poll_interval: float = 1.0,
     ) -> None:
         """
         Wait for configured units to reach their expected sub-states.
@@ -368,34 +964,17 @@ class SnapshotManager:
         Args:
             systemd: Systemd instance for checking unit states
             max_wait_seconds: Maximum time to wait for units to settle
-            poll_interval: Time between polls in seconds
+            max_poll_interval: Upper bound of the growing time between polls in seconds
         """
         if not WAIT_FOR_SETTLED_UNITS:
             return
 
         start_time = time.time()
-        units_to_check = set(WAIT_FOR_SETTLED_UNITS.keys())
-
-        while units_to_check and (time.time() - start_time) < max_wait_seconds:
-            current_units = systemd.list_units()
-            unit_states = {unit.unit: unit.sub for unit in current_units}
-
-            settled_units = set()
-            for unit_name in units_to_check:
-                expected_sub = WAIT_FOR_SETTLED_UNITS[unit_name]
-                current_sub = unit_states.get(unit_name)
-
-                logger.debug(
-                    f"Debug: Unit {unit_name} current state: {current_sub}, expected: {expected_sub}"
-                )
-
-                if current_sub == expected_sub:
-                    settled_units.add(unit_name)
-
-            units_to_check -= settled_units
-
-            if units_to_check:
-                time.sleep(poll_interval)
+        units_to_check = systemd.wait_for_sub_states(
+            WAIT_FOR_SETTLED_UNITS,
+            timeout=max_wait_seconds,
+            max_poll_interval=max_poll_interval,
+        )
 
         # Log if any units didn't settle (but don't fail the snapshot)
         if units_to_check:
@@ -411,8 +990,21 @@ class SnapshotManager:
         paths: List[str] | None = None,
         ignore_file: Path | None = None,
         verbose: bool = False,
+        base_snapshot: str | None = None,
+        full_verify: bool = False,
     ) -> Snapshot:
-        """Create a new system snapshot"""
+        """
+        Create a new system snapshot
+
+        Args:
+            name: Name suffix of the snapshot
+            paths: Paths to collect file hashes for
+            ignore_file: File containing ignore patterns
+            verbose: If True, show warnings for missing files (broken symlinks)
+            base_snapshot: Name of a previous snapshot whose file hashes are reused
+                for files with unchanged (dev, inode, size, mtime_ns, ctime_ns)
+            full_verify: If True, re-hash every file even if a base snapshot is given
+        """
         if paths is None:
             paths = DEFAULT_PATHS
 
@@ -430,96 +1022,164 @@ class SnapshotManager:
         else:
             snapshot_name = f"{timestamp}-{user}-{name}"
 
-        snapshot_file = self.state_dir / f"{snapshot_name}.json.gz"
-        if snapshot_file.exists():
+        existing_file = self.snapshot_file(snapshot_name)
+        if existing_file is not None:
             raise ValueError(
-                f"Snapshot '{snapshot_name}' already exists at {snapshot_file}"
+                f"Snapshot '{snapshot_name}' already exists at {existing_file}"
             )
+        snapshot_file = self.state_dir / f"{snapshot_name}{SNAPSHOT_SUFFIX}"
 
         shell = ShellRunner(None)
         dpkg = Dpkg(shell)
         systemd = Systemd(shell)
-        file_collector = FileCollector(shell)
+        file_collector = FileCollector(shell, inventory=self.inventory)
         sysctl_collector = Sysctl(shell)
         kernel_versions = KernelVersions()
-        kernel_module = KernelModule(Find(), shell, kernel_versions)
-        packages = dpkg.collect_installed_packages().packages
+        kernel_module = KernelModule(Find(), shell, kernel_versions, self.inventory)
 
-        # Make sure no systemd services and sockets are still transitioning
-        systemd_wait = systemd.wait_is_system_running()
-        logger.debug(
-            f"Systemd settle returned state {systemd_wait.state} and took {systemd_wait.elapsed_time:.1f}s to complete"
+        ignore_patterns = DEFAULT_IGNORE_PATTERNS + file_collector.load_ignore_patterns(
+            ignore_file
         )
-        self._wait_for_units_settled(systemd)
+        normalized_paths = file_collector.normalize_paths(paths)
+        use_file_cache = base_snapshot is not None and not full_verify
 
-        systemd_units = systemd.list_units()
+        def collect_packages() -> List[deb822.Deb822]:
+            return dpkg.collect_installed_packages().packages
 
-        sysctl_params_dict = sysctl_collector.collect_sysctl_parameters()
-        sysctl_params = [
-            SysctlParam(name=param, value=val)
-            for param, val in sysctl_params_dict.items()
-        ]
+        def collect_systemd_units() -> List[SystemdUnit]:
+            return systemd.list_units()
 
-        kernel_modules_list = kernel_module.collect_loaded_modules()
-        kernel_modules = [
-            LoadedKernelModule(name=module) for module in kernel_modules_list
-        ]
+        def collect_sysctl_params() -> List[SysctlParam]:
+            return [
+                SysctlParam(name=param, value=val)
+                for param, val in sysctl_collector.collect_sysctl_parameters(
+                    IGNORED_SYSCTL_PARAMS
+                ).items()
+            ]
 
-        ignore_patterns = DEFAULT_IGNORE_PATTERNS + file_collector.load_ignore_patterns(
-            ignore_file
+        def collect_kernel_modules() -> List[LoadedKernelModule]:
+            return [
+                LoadedKernelModule(name=module)
+                for module in kernel_module.collect_loaded_modules()
+            ]
+
+        def collect_files() -> List[FileEntry]:
+            file_cache = None
+            if use_file_cache:
+                file_cache = {
+                    file_entry.path: file_entry
+                    for file_entry in self.load_snapshot(str(base_snapshot)).files
+                }
+            if self.inventory is not None:
+                # Only the snapshotted paths, the index of the other roots stays valid
+                self.inventory.rescan(normalized_paths)
+            return file_collector.collect_file_entries(
+                normalized_paths, ignore_patterns, verbose, file_cache
+            )
+
+        # Make sure no systemd services and sockets are still transitioning
+        # before any section is collected, not just the systemd units
+        systemd_wait = systemd.wait_is_system_running()
+        logger.debug(
+            f"Systemd settle returned state {systemd_wait.state} and took {systemd_wait.elapsed_time:.1f}s to complete"
         )
-        normalized_paths = file_collector.normalize_paths(paths)
+        self._wait_for_units_settled(systemd)
 
-        files_dict = file_collector.collect_file_hashes(
-            normalized_paths, ignore_patterns, verbose
+        sections, timings = self._run_collectors(
+            {
+                "packages": collect_packages,
+                "systemd_units": collect_systemd_units,
+                "sysctl_params": collect_sysctl_params,
+                "kernel_modules": collect_kernel_modules,
+                "files": collect_files,
+            }
         )
-        files = [
-            FileEntry(path=path, sha256=hash_val)
-            for path, hash_val in files_dict.items()
-        ]
 
         metadata = SnapshotMetadata(
             created_at=datetime.now().isoformat(),
             paths=normalized_paths,
             ignore_file=bool(ignore_file and ignore_file.exists()),
+            base_snapshot=base_snapshot if use_file_cache else None,
+            collector_timings=timings,
         )
 
         snapshot = Snapshot(
             snapshot_name,
             metadata,
-            packages,
-            systemd_units,
-            files,
-            sysctl_params,
-            kernel_modules,
+            sections["packages"],
+            sections["systemd_units"],
+            sections["files"],
+            sections["sysctl_params"],
+            sections["kernel_modules"],
         )
         self._save_snapshot(snapshot, snapshot_file)
+        if self.retention is not None:
+            self.apply_retention()
 
         return snapshot
 
-    def _save_snapshot(self, snapshot: Snapshot, snapshot_file: Path):
-        """Save snapshot to disk as compressed JSON"""
-        self.state_dir.mkdir(parents=True, exist_ok=True)
+    def _run_collectors(
+        self, collectors: Dict[str, Callable[[], list]]
+    ) -> tuple[Dict[str, list], Dict[str, float]]:
+        """
+        Run independent section collectors concurrently.
 
-        snapshot_data = {
-            "name": snapshot.name,
-            "metadata": asdict(snapshot.metadata),
-            "packages": [dict(pkg) for pkg in snapshot.packages],
-            "systemd_units": [asdict(unit) for unit in snapshot.systemd_units],
-            "files": [asdict(file_entry) for file_entry in snapshot.files],
-            "sysctl_params": [asdict(param) for param in snapshot.sysctl_params],
-            "kernel_modules": [asdict(module) for module in snapshot.kernel_modules],
-        }
+        Collectors mostly wait on subprocesses (systemctl) or file I/O, so running
+        them on threads makes snapshot latency the maximum instead of the sum
+        of the collector durations. Exceptions of a collector are re-raised.
 
-        with gzip.open(snapshot_file, "wt", encoding="utf-8") as f:
-            json.dump(snapshot_data, f, separators=(",", ":"), sort_keys=True)
+        Returns:
+            Tuple of (section -> collected entries, section -> duration in seconds)
+        """
+
+        def timed(collector: Callable[[], list]) -> tuple[list, float]:
+            start_time = time.perf_counter()
+            result = collector()
+            return result, time.perf_counter() - start_time
+
+        results: Dict[str, list] = {}
+        timings: Dict[str, float] = {}
+        with ThreadPoolExecutor(max_workers=len(collectors)) as executor:
+            futures = {
+                section: executor.submit(timed, collector)
+                for section, collector in collectors.items()
+            }
+            for section, future in futures.items():
+                results[section], timings[section] = future.result()
+                logger.debug(f"Collected {section} in {timings[section]:.2f}s")
+
+        return results, timings
+
+    def snapshot_file(self, name: str) -> Optional[Path]:
+        """Return the file a snapshot is stored in, or None if it does not exist"""
+        for suffix in (SNAPSHOT_SUFFIX, LEGACY_SNAPSHOT_SUFFIX):
+            snapshot_file = self.state_dir / f"{name}{suffix}"
+            if snapshot_file.exists():
+                return snapshot_file
+        return None
+
+    def _save_snapshot(self, snapshot: Snapshot, snapshot_file: Path):
+        """Save snapshot to disk as section-indexed archive"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        SnapshotArchive(snapshot_file, self.store).write(snapshot)
 
     def load_snapshot(self, name: str) -> Snapshot:
-        """Load snapshot from disk"""
-        snapshot_file = self.state_dir / f"{name}.json.gz"
-        if not snapshot_file.exists():
+        """
+        Load snapshot from disk
+
+        Snapshots in the archive format are loaded lazily, sections are only
+        read when they are accessed. Legacy .json.gz snapshots are loaded completely.
+        """
+        snapshot_file = self.snapshot_file(name)
+        if snapshot_file is None:
             raise ValueError(f"Snapshot '{name}' not found")
 
+        if snapshot_file.name.endswith(SNAPSHOT_SUFFIX):
+            return SnapshotArchive(snapshot_file, self.store).load()
+        return self._load_legacy_snapshot(name, snapshot_file)
+
+    def _load_legacy_snapshot(self, name: str, snapshot_file: Path) -> Snapshot:
+        """Load snapshot stored as a single compressed JSON document"""
         with gzip.open(snapshot_file, "rt", encoding="utf-8") as f:
             snapshot_data = json.load(f)
 
@@ -547,6 +1207,83 @@ class SnapshotManager:
             kernel_modules,
         )
 
+    def _referenced_objects(self, names: Iterable[str]) -> set[str]:
+        """Return the digests of all objects referenced by the given snapshots"""
+        referenced: set[str] = set()
+        for name in names:
+            snapshot_file = self.snapshot_file(name)
+            if snapshot_file is not None and snapshot_file.name.endswith(
+                SNAPSHOT_SUFFIX
+            ):
+                referenced.update(SnapshotArchive(snapshot_file).objects.values())
+        return referenced
+
+    def collect_garbage(self) -> int:
+        """Remove objects no snapshot refers to and return the number of freed bytes"""
+        return self.store.collect_garbage(
+            self._referenced_objects(self.list_snapshots())
+        )
+
+    def disk_usage(self, names: Optional[List[str]] = None) -> int:
+        """Return the bytes used by the given (default: all) snapshots including their objects"""
+        if names is None:
+            names = self.list_snapshots()
+        object_sizes = self.store.sizes()
+        snapshot_files = [self.snapshot_file(name) for name in names]
+        return sum(f.stat().st_size for f in snapshot_files if f is not None) + sum(
+            object_sizes.get(digest, 0) for digest in self._referenced_objects(names)
+        )
+
+    def apply_retention(self, policy: RetentionPolicy | None = None) -> List[str]:
+        """
+        Delete the oldest snapshots exceeding the retention policy and collect garbage.
+
+        Snapshots older than max_age are deleted first, then the oldest snapshots
+        until at most max_count remain and they use at most max_bytes.
+
+        Args:
+            policy: Policy to apply, defaults to the manager's retention policy
+
+        Returns:
+            Names of the deleted snapshots
+        """
+        policy = policy or self.retention
+        if policy is None:
+            return []
+
+        # oldest first
+        snapshots = []
+        for name in self.list_snapshots():
+            snapshot_file = self.snapshot_file(name)
+            if snapshot_file is not None:
+                snapshots.append((snapshot_file.stat().st_mtime, name))
+        remaining = [name for _, name in sorted(snapshots)]
+        mtimes = {name: mtime for mtime, name in snapshots}
+
+        removed = []
+        if policy.max_age is not None:
+            now = time.time()
+            removed += [n for n in remaining if now - mtimes[n] > policy.max_age]
+            remaining = [n for n in remaining if n not in removed]
+        if policy.max_count is not None:
+            excess = max(len(remaining) - policy.max_count, 0)
+            removed += remaining[:excess]
+            remaining = remaining[excess:]
+        if policy.max_bytes is not None:
+            while remaining and self.disk_usage(remaining) > policy.max_bytes:
+                removed.append(remaining.pop(0))
+
+        for name in removed:
+            snapshot_file = self.snapshot_file(name)
+            if snapshot_file is not None:
+                snapshot_file.unlink()
+        freed = self.collect_garbage()
+        if removed:
+            logger.info(
+                f"Retention removed {len(removed)} snapshot(s) and {freed} bytes of objects"
+            )
+        return removed
+
     def list_snapshots(self) -> List[str]:
         """List all available snapshots"""
         if not self.state_dir.exists():
@@ -554,9 +1291,11 @@ class SnapshotManager:
 
         snapshots = []
         for item in self.state_dir.iterdir():
-            if item.is_file() and item.name.endswith(".json.gz"):
-                snapshot_name = item.name[:-8]  # Remove '.json.gz'
-                snapshots.append(snapshot_name)
+            if not item.is_file():
+                continue
+            for suffix in (SNAPSHOT_SUFFIX, LEGACY_SNAPSHOT_SUFFIX):
+                if item.name.endswith(suffix):
+                    snapshots.append(item.name[: -len(suffix)])
 
         return sorted(snapshots)
 
@@ -570,58 +1309,127 @@ class DiffEngine:
         self._ignored_sysctl_params = set(IGNORED_SYSCTL_PARAMS)
 
     def compare_snapshots(
-        self, snapshot_a: Snapshot, snapshot_b: Snapshot
+        self,
+        snapshot_a: Snapshot,
+        snapshot_b: Snapshot,
+        sections: Optional[Iterable[str]] = None,
     ) -> DiffResult:
-        """Compare two snapshots and return differences"""
+        """
+        Compare two snapshots and return differences
+
+        Args:
+            snapshot_a: Snapshot to compare from
+            snapshot_b: Snapshot to compare to
+            sections: Sections to compare (see SNAPSHOT_SECTIONS), defaults to all.
+                Sections that are not compared are not loaded and report no changes.
+        """
+        selected = set(SNAPSHOT_SECTIONS if sections is None else sections)
+        unknown = selected - set(SNAPSHOT_SECTIONS)
+        if unknown:
+            raise ValueError(f"Unknown snapshot sections: {', '.join(sorted(unknown))}")
+
         changes = [
-            self._compare_packages(snapshot_a.packages, snapshot_b.packages),
-            self._compare_systemd_units(
-                snapshot_a.systemd_units, snapshot_b.systemd_units
+            (
+                self._compare_package_versions(
+                    snapshot_a.package_versions(), snapshot_b.package_versions()
+                )
+                if "packages" in selected
+                else []
             ),
-            self._compare_files(snapshot_a.files, snapshot_b.files),
-            self._compare_sysctl_params(
-                snapshot_a.sysctl_params, snapshot_b.sysctl_params
+            (
+                self._compare_systemd_units(
+                    snapshot_a.systemd_units, snapshot_b.systemd_units
+                )
+                if "systemd_units" in selected
+                else []
             ),
-            self._compare_kernel_modules(
-                snapshot_a.kernel_modules, snapshot_b.kernel_modules
+            (
+                self._compare_files(snapshot_a.files, snapshot_b.files)
+                if "files" in selected
+                else []
+            ),
+            (
+                self._compare_sysctl_params(
+                    snapshot_a.sysctl_params, snapshot_b.sysctl_params
+                )
+                if "sysctl_params" in selected
+                else []
+            ),
+            (
+                self._compare_kernel_modules(
+                    snapshot_a.kernel_modules, snapshot_b.kernel_modules
+                )
+                if "kernel_modules" in selected
+                else []
             ),
         ]
 
         return DiffResult(*changes, has_changes=any(changes))
 
-    def _generate_diff(
-        self, lines_a: List[str], lines_b: List[str], fromfile: str, tofile: str
-    ) -> List[str]:
-        """Generate diff for two line lists"""
-        return list(
-            difflib.unified_diff(
-                lines_a, lines_b, fromfile=fromfile, tofile=tofile, lineterm=""
-            )
-        )
+    @staticmethod
+    def _index(entries: Iterable[tuple[str, str]]) -> Dict[str, str]:
+        """
+        Build a key -> value dict from (key, value) pairs.
+
+        Repeated keys (e.g. a package installed for several architectures)
+        are merged into a sorted, comma separated value.
+        """
+        index: Dict[str, str] = {}
+        for key, value in entries:
+            previous = index.get(key)
+            if previous is not None and previous != value:
+                value = ", ".join(sorted(set(previous.split(", ")) | {value}))
+            index[key] = value
+        return index
+
+    def _diff_keyed(
+        self, entries_a: Iterable[tuple[str, str]], entries_b: Iterable[tuple[str, str]]
+    ) -> List[Change]:
+        """
+        Classify (key, value) entries as added, removed or modified.
+
+        Runs in linear time in the number of entries, only the changes are sorted.
+        """
+        index_a = self._index(entries_a)
+        index_b = self._index(entries_b)
+
+        changes: List[Change] = []
+        for key, old in index_a.items():
+            new = index_b.get(key)
+            if new is None:
+                changes.append(Change(key, CHANGE_REMOVED, old=old))
+            elif new != old:
+                changes.append(Change(key, CHANGE_MODIFIED, old=old, new=new))
+        for key, new in index_b.items():
+            if key not in index_a:
+                changes.append(Change(key, CHANGE_ADDED, new=new))
+
+        changes.sort(key=lambda change: change.key)
+        return changes
 
     def _compare_packages(
         self, packages_a: List[deb822.Deb822], packages_b: List[deb822.Deb822]
-    ) -> List[str]:
-        """Compare package lists and return diff lines"""
-        lines_a = [
-            f"{pkg.get('Package', '')}\t{pkg.get('Version', '')}" for pkg in packages_a
-        ]
-        lines_b = [
-            f"{pkg.get('Package', '')}\t{pkg.get('Version', '')}" for pkg in packages_b
-        ]
-
-        return self._generate_diff(
-            lines_a, lines_b, "packages@snapshot_a", "packages@snapshot_b"
+    ) -> List[Change]:
+        """Compare package lists by package name"""
+        return self._compare_package_versions(
+            [(pkg.get("Package", ""), pkg.get("Version", "")) for pkg in packages_a],
+            [(pkg.get("Package", ""), pkg.get("Version", "")) for pkg in packages_b],
         )
 
+    def _compare_package_versions(
+        self, versions_a: List[tuple[str, str]], versions_b: List[tuple[str, str]]
+    ) -> List[Change]:
+        """Compare (Package, Version) pairs by package name"""
+        return self._diff_keyed(versions_a, versions_b)
+
     def _compare_systemd_units(
         self, units_a: List[SystemdUnit], units_b: List[SystemdUnit]
-    ) -> List[str]:
-        """Compare systemd unit lists and return diff lines"""
+    ) -> List[Change]:
+        """Compare systemd unit states by unit name"""
 
-        def format_unit(unit: SystemdUnit) -> str:
-            """Format unit for comparison"""
-            return f"{unit.unit}\t{unit.load}\t{unit.active}\t{unit.sub}"
+        def unit_state(unit: SystemdUnit) -> str:
+            """Format unit state for comparison"""
+            return f"{unit.load}\t{unit.active}\t{unit.sub}"
 
         def is_ignored(unit_name: str) -> bool:
             return any(
@@ -629,86 +1437,118 @@ class DiffEngine:
                 for pattern in self._ignored_systemd_patterns
             )
 
-        filtered_units_a = [format_unit(u) for u in units_a if not is_ignored(u.unit)]
-        filtered_units_b = [format_unit(u) for u in units_b if not is_ignored(u.unit)]
-
-        return self._generate_diff(
-            filtered_units_a,
-            filtered_units_b,
-            "systemd_units@snapshot_a",
-            "systemd_units@snapshot_b",
+        return self._diff_keyed(
+            ((u.unit, unit_state(u)) for u in units_a if not is_ignored(u.unit)),
+            ((u.unit, unit_state(u)) for u in units_b if not is_ignored(u.unit)),
         )
 
     def _compare_files(
         self, files_a: List[FileEntry], files_b: List[FileEntry]
-    ) -> List[str]:
-        """Compare file lists and return diff lines"""
-        lines_a = [
-            str(file_entry) for file_entry in sorted(files_a, key=lambda f: f.path)
-        ]
-        lines_b = [
-            str(file_entry) for file_entry in sorted(files_b, key=lambda f: f.path)
-        ]
-
-        return self._generate_diff(
-            lines_a, lines_b, "files@snapshot_a", "files@snapshot_b"
+    ) -> List[Change]:
+        """Compare file hashes by path"""
+        return self._diff_keyed(
+            ((f.path, f.sha256) for f in files_a),
+            ((f.path, f.sha256) for f in files_b),
         )
 
     def _compare_sysctl_params(
         self, params_a: List[SysctlParam], params_b: List[SysctlParam]
-    ) -> List[str]:
-        """Compare sysctl parameter lists and return diff lines"""
-        filtered_params_a = [
-            param for param in params_a if param.name not in self._ignored_sysctl_params
-        ]
-        filtered_params_b = [
-            param for param in params_b if param.name not in self._ignored_sysctl_params
-        ]
-
-        lines_a = [str(param) for param in filtered_params_a]
-        lines_b = [str(param) for param in filtered_params_b]
-
-        return self._generate_diff(
-            lines_a, lines_b, "sysctl@snapshot_a", "sysctl@snapshot_b"
+    ) -> List[Change]:
+        """Compare sysctl parameter values by parameter name"""
+        return self._diff_keyed(
+            (
+                (p.name, p.value)
+                for p in params_a
+                if p.name not in self._ignored_sysctl_params
+            ),
+            (
+                (p.name, p.value)
+                for p in params_b
+                if p.name not in self._ignored_sysctl_params
+            ),
         )
 
     def _compare_kernel_modules(
         self, modules_a: List[LoadedKernelModule], modules_b: List[LoadedKernelModule]
+    ) -> List[Change]:
+        """Compare loaded kernel modules by module name"""
+        return self._diff_keyed(
+            (
+                (m.name, m.name)
+                for m in modules_a
+                if m.name not in self._ignored_kernel_modules
+            ),
+            (
+                (m.name, m.name)
+                for m in modules_b
+                if m.name not in self._ignored_kernel_modules
+            ),
+        )
+
+    @staticmethod
+    def render_changes(
+        changes: List[Change], section: str, fromfile: str, tofile: str
     ) -> List[str]:
-        """Compare kernel module lists and return diff lines"""
-        filtered_modules_a = [
-            m for m in modules_a if m.name not in self._ignored_kernel_modules
-        ]
-        filtered_modules_b = [
-            m for m in modules_b if m.name not in self._ignored_kernel_modules
-        ]
+        """
+        Render change records of a section as unified-diff style lines for display.
 
-        lines_a = sorted([str(module) for module in filtered_modules_a])
-        lines_b = sorted([str(module) for module in filtered_modules_b])
+        Removed and previous values are prefixed with '-', added and new values with '+'.
+        """
+        formats = {
+            "packages": "{key}\t{value}",
+            "systemd_units": "{key}\t{value}",
+            "files": "{value}  {key}",
+            "sysctl_params": "{key}={value}",
+            "kernel_modules": "{key}",
+        }
+        line_format = formats[section]
 
-        return self._generate_diff(
-            lines_a, lines_b, "kernel_modules@snapshot_a", "kernel_modules@snapshot_b"
-        )
+        lines = [f"--- {fromfile}", f"+++ {tofile}"]
+        for change in changes:
+            if change.old is not None:
+                lines.append("-" + line_format.format(key=change.key, value=change.old))
+            if change.new is not None:
+                lines.append("+" + line_format.format(key=change.key, value=change.new))
+        return lines
 
     def generate_diff(
         self, diff_result: DiffResult, snapshot_a_name: str, snapshot_b_name: str
     ) -> str:
         """Generate diff output compatible with shell script"""
         change_types = [
-            ("Package changes", diff_result.package_changes),
-            ("Systemd unit state changes", diff_result.systemd_changes),
-            ("File content changes (sha256, path)", diff_result.file_changes),
-            ("Sysctl parameter changes", diff_result.sysctl_changes),
-            ("Kernel module changes", diff_result.kernel_module_changes),
+            ("Package changes", "packages", diff_result.package_changes),
+            (
+                "Systemd unit state changes",
+                "systemd_units",
+                diff_result.systemd_changes,
+            ),
+            (
+                "File content changes (sha256, path)",
+                "files",
+                diff_result.file_changes,
+            ),
+            ("Sysctl parameter changes", "sysctl_params", diff_result.sysctl_changes),
+            (
+                "Kernel module changes",
+                "kernel_modules",
+                diff_result.kernel_module_changes,
+            ),
         ]
 
         output = []
-        for change_type, changes in change_types:
+        for change_type, section, changes in change_types:
             if changes:
                 output.append(
                     f"=== {change_type} ({snapshot_a_name} -> {snapshot_b_name}) ==="
                 )
-                output.extend(changes)
+                output.extend(
+                    self.render_changes(
+                        changes,
+                        section,
+                        f"{section}@snapshot_a",
+                        f"{section}@snapshot_b",
+                    )
+                )
                 output.append("")
 
         if diff_result.has_changes:
@@ -722,9 +1562,11 @@ class DiffEngine:
 class Sysdiff:
     """Main sysdiff class for tests integration"""
 
-    def __init__(self, shell: ShellRunner):
+    def __init__(
+        self, shell: ShellRunner, inventory: Optional[FilesystemInventory] = None
+    ):
         self.shell = shell
-        self.manager = SnapshotManager()
+        self.manager = SnapshotManager(inventory=inventory)
         self.diff_engine = DiffEngine()
 
     def create_snapshot(
@@ -733,32 +1575,39 @@ class Sysdiff:
         paths: List[str] | None = None,
         ignore_file: Path | None = None,
         verbose: bool = False,
+        base_snapshot: str | None = None,
+        full_verify: bool = False,
     ) -> Snapshot:
         """Create a snapshot using the shell context"""
-        return self.manager.create_snapshot(name, paths, ignore_file, verbose)
+        return self.manager.create_snapshot(
+            name, paths, ignore_file, verbose, base_snapshot, full_verify
+        )
 
     def load_snapshot(self, name: str) -> Snapshot:
         """Load a snapshot"""
         return self.manager.load_snapshot(name)
 
-    def compare_snapshots(self, name_a: str, name_b: str) -> DiffResult:
-        """Compare two snapshots"""
+    def compare_snapshots(
+        self, name_a: str, name_b: str, sections: Optional[Iterable[str]] = None
+    ) -> DiffResult:
+        """Compare two snapshots, optionally only the given sections"""
         snapshot_a = self.manager.load_snapshot(name_a)
         snapshot_b = self.manager.load_snapshot(name_b)
-        return self.diff_engine.compare_snapshots(snapshot_a, snapshot_b)
+        return self.diff_engine.compare_snapshots(snapshot_a, snapshot_b, sections)
 
     def cleanup_snapshots(self, names: List[str]):
         """Cleanup snapshots"""
         for name in names:
-            snapshot_file = self.manager.state_dir / f"{name}.json.gz"
-            if snapshot_file.exists():
+            snapshot_file = self.manager.snapshot_file(name)
+            if snapshot_file is not None:
                 snapshot_file.unlink()
+        self.manager.collect_garbage()
         # if the state_dir is empty, delete it
         if not os.listdir(self.manager.state_dir):
             shutil.rmtree(self.manager.state_dir)
 
 
 @pytest.fixture
-def sysdiff(shell: ShellRunner):
+def sysdiff(shell: ShellRunner, inventory: Optional[FilesystemInventory]):
     """Function-scoped sysdiff fixture for individual tests."""
-    return Sysdiff(shell)
+    return Sysdiff(shell, inventory)
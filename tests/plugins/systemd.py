@@ -1,8 +1,10 @@
 import json
+import logging
 import re
+import threading
 import time
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import pytest
 
@@ -10,6 +12,8 @@ from .modify import allow_system_modifications
 from .parse import Parse
 from .shell import ShellRunner
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class SystemdUnit:
@@ -19,6 +23,29 @@ class SystemdUnit:
     sub: str
 
 
+# Suffixes systemctl recognizes, names without one refer to a service
+UNIT_TYPES = (
+    ".service",
+    ".socket",
+    ".target",
+    ".device",
+    ".mount",
+    ".automount",
+    ".swap",
+    ".timer",
+    ".path",
+    ".slice",
+    ".scope",
+)
+
+# The session wide unit state cache, dropped after every test marked with modify
+_session_unit_states: Optional["UnitStateCache"] = None
+
+# Units found in an unexpected state during the current test, their status is
+# only fetched if the test fails
+_unexpected_units: List[Tuple[ShellRunner, str]] = []
+
+
 @dataclass
 class SystemRunningState:
     state: str
@@ -26,11 +53,46 @@ class SystemRunningState:
     elapsed_time: float
 
 
+@dataclass
+class UnitTiming:
+    """Time a unit took to start, as reported by `systemd-analyze blame`"""
+
+    unit: str
+    seconds: float
+
+
+@dataclass
+class CriticalChainLink:
+    """Unit on the critical chain, as reported by `systemd-analyze critical-chain`"""
+
+    unit: str
+    # Seconds after userspace start when the unit became active
+    active_at: float
+    # Seconds the unit took to start, None for units that start instantly
+    startup: Optional[float] = None
+
+
+@dataclass
+class UnitActivation:
+    """Activation timestamps of a unit in seconds since boot (monotonic clock)"""
+
+    unit: str
+    # None if the unit never left the inactive or entered the active state
+    inactive_exit: Optional[float]
+    active_enter: Optional[float]
+
+    @property
+    def activation_time(self) -> Optional[float]:
+        if self.inactive_exit is None or self.active_enter is None:
+            return None
+        return self.active_enter - self.inactive_exit
+
+
 def _seconds(token: str) -> float:
     """Convert a systemd time token into seconds.
 
     Accepts single-part values like "3.007s" or "120ms" and multi-part
-    values like "8min 11.844s". Parts are space-separated and summed.
+    values like "8min 11.844s" or "1h 2min". Parts are space-separated and summed.
     """
     total = 0.0
 
@@ -42,17 +104,21 @@ def _seconds(token: str) -> float:
         part = part.strip()
         if not part:
             continue
-        m = re.match(r"^([\d.]+)(ms|s|min)$", part)
+        m = re.match(r"^([\d.]+)(us|µs|ms|s|min|h)$", part)
         if not m:
             raise ValueError(f"Unknown time unit in '{part}'")
         val = float(m.group(1))
         unit = m.group(2)
-        if unit == "ms":
+        if unit in ("us", "µs"):
+            total += val / 1000000.0
+        elif unit == "ms":
             total += val / 1000.0
         elif unit == "s":
             total += val
         elif unit == "min":
             total += val * 60.0
+        elif unit == "h":
+            total += val * 3600.0
     return total
 
 
@@ -98,10 +164,150 @@ def _parse_unit_files(systemctl_stdout: str) -> list[SystemdUnit]:
     return units
 
 
+def _parse_blame(blame_stdout: str) -> list[UnitTiming]:
+    """Parse `systemd-analyze blame` lines like "1min 2.5s foo.service" """
+    timings = []
+    for line in blame_stdout.splitlines():
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        try:
+            seconds = _seconds(" ".join(parts[:-1]))
+        except ValueError:
+            continue
+        timings.append(UnitTiming(parts[-1], seconds))
+    return timings
+
+
+CRITICAL_CHAIN_LINE = re.compile(
+    r"^[\s│├└─]*(?P<unit>\S+) @(?P<active_at>[\d.a-zµ ]+?)(?: \+(?P<startup>[\d.a-zµ ]+))?$"
+)
+
+
+def _parse_critical_chain(critical_chain_stdout: str) -> list[CriticalChainLink]:
+    """
+    Parse the tree printed by `systemd-analyze critical-chain`, starting with the
+    target unit. Units without timing information are skipped.
+    """
+    links = []
+    for line in critical_chain_stdout.splitlines():
+        m = CRITICAL_CHAIN_LINE.match(line.rstrip())
+        if not m:
+            continue
+        try:
+            links.append(
+                CriticalChainLink(
+                    unit=m.group("unit"),
+                    active_at=_seconds(m.group("active_at")),
+                    startup=(
+                        _seconds(m.group("startup")) if m.group("startup") else None
+                    ),
+                )
+            )
+        except ValueError:
+            continue
+    return links
+
+
+def _parse_activations(show_stdout: str) -> dict[str, UnitActivation]:
+    """Parse Id and *TimestampMonotonic properties printed by `systemctl show`"""
+
+    def seconds(value: Optional[str]) -> Optional[float]:
+        # Microseconds, 0 if the transition never happened
+        return int(value) / 1000000.0 if value and value != "0" else None
+
+    activations = {}
+    for block in show_stdout.strip().split("\n\n"):
+        properties = dict(
+            line.split("=", 1) for line in block.splitlines() if "=" in line
+        )
+        if "Id" not in properties:
+            continue
+        activations[properties["Id"]] = UnitActivation(
+            unit=properties["Id"],
+            inactive_exit=seconds(properties.get("InactiveExitTimestampMonotonic")),
+            active_enter=seconds(properties.get("ActiveEnterTimestampMonotonic")),
+        )
+    return activations
+
+
+def unit_name(name: str) -> str:
+    """Return the full unit name like systemctl, e.g. ssh => ssh.service"""
+    return name if name.endswith(UNIT_TYPES) else f"{name}.service"
+
+
+class UnitStateCache:
+    """
+    Active and unit file states of all units, read with one `systemctl list-units`
+    and one `systemctl list-unit-files` call on first use.
+
+    Units not listed (aliases, template instances without a loaded unit) are not
+    answered from the cache, callers then ask systemctl directly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active_states: Optional[Dict[str, str]] = None
+        self._unit_file_states: Dict[str, str] = {}
+
+    def invalidate(self):
+        """Drop all states, they are read again on the next lookup"""
+        with self._lock:
+            self._active_states = None
+
+    def _ensure_filled(self, shell: ShellRunner) -> Dict[str, str]:
+        active_states = self._active_states
+        if active_states is not None:
+            return active_states
+        with self._lock:
+            if self._active_states is None:
+                systemctl = "systemctl --plain --no-legend --no-pager --output=json"
+                units = shell(
+                    f"{systemctl} list-units --all",
+                    capture_output=True,
+                    ignore_exit_code=True,
+                )
+                unit_files = shell(
+                    f"{systemctl} list-unit-files",
+                    capture_output=True,
+                    ignore_exit_code=True,
+                )
+                self._unit_file_states = (
+                    {u.unit: u.load for u in _parse_unit_files(unit_files.stdout)}
+                    if unit_files.returncode == 0
+                    else {}
+                )
+                self._active_states = (
+                    {u.unit: u.active for u in _parse_units(units.stdout)}
+                    if units.returncode == 0
+                    else {}
+                )
+            return self._active_states
+
+    def active_state(self, shell: ShellRunner, name: str) -> Optional[str]:
+        """State as printed by `systemctl is-active`, None if the unit is not listed"""
+        return self._ensure_filled(shell).get(unit_name(name))
+
+    def unit_file_state(self, shell: ShellRunner, name: str) -> Optional[str]:
+        """State as printed by `systemctl is-enabled`, None if the unit is not listed"""
+        self._ensure_filled(shell)
+        state = self._unit_file_states.get(unit_name(name))
+        # is-enabled reports the state of the unit an alias points to
+        return None if state == "alias" else state
+
+
 class Systemd:
-    def __init__(self, shell: ShellRunner):
+    def __init__(
+        self, shell: ShellRunner, unit_states: Optional[UnitStateCache] = None
+    ):
+        """
+        Args:
+            shell: Runs systemctl
+            unit_states: Answer unit state queries from this cache where possible
+        """
         self._shell = shell
         self._systemctl = "systemctl --plain --no-legend --no-pager --output=json"
+        self._unit_states = unit_states
 
     def analyze(self) -> Tuple[float, ...]:
         result = self._shell(
@@ -126,39 +332,71 @@ class Systemd:
 
         return tuple(_seconds(v) for v in m.groups())
 
-    def is_active(self, unit_name: str) -> bool:
+    def blame(self) -> list[UnitTiming]:
+        """Startup times of all units, slowest first"""
         result = self._shell(
-            f"{self._systemctl} is-active {unit_name}",
+            "systemd-analyze blame --no-pager",
             capture_output=True,
             ignore_exit_code=True,
         )
-        active = result.stdout.strip() == "active"
-        if not active:
-            result_status = self._shell(
-                f"{self._systemctl} status {unit_name}",
-                capture_output=True,
-                ignore_exit_code=True,
-            )
-            print(result_status.stdout)
+        if result.returncode != 0:
+            raise ValueError(f"systemd-analyze blame failed: {result.stderr}")
+        return _parse_blame(result.stdout)
 
-        return active
+    def critical_chain(self, unit_name: str = "") -> list[CriticalChainLink]:
+        """Units on the critical chain of unit_name (the default target if empty)"""
+        result = self._shell(
+            f"systemd-analyze critical-chain --no-pager {unit_name}",
+            capture_output=True,
+            ignore_exit_code=True,
+        )
+        if result.returncode != 0:
+            raise ValueError(f"systemd-analyze critical-chain failed: {result.stderr}")
+        return _parse_critical_chain(result.stdout)
 
-    def is_inactive(self, unit_name: str) -> bool:
+    def activation_timestamps(self) -> dict[str, UnitActivation]:
+        """Activation timestamps of all loaded units"""
         result = self._shell(
-            f"{self._systemctl} is-active {unit_name}",
+            "systemctl show --property=Id,InactiveExitTimestampMonotonic,"
+            "ActiveEnterTimestampMonotonic '*'",
             capture_output=True,
             ignore_exit_code=True,
         )
-        inactive = result.stdout.strip() == "inactive"
-        if not inactive:
-            result_status = self._shell(
-                f"{self._systemctl} status {unit_name}",
+        return _parse_activations(result.stdout)
+
+    def _has_state(
+        self, unit_name: str, command: str, expected: Callable[[str], bool]
+    ) -> bool:
+        """
+        Check the state printed by `systemctl <command> <unit_name>`. The cache
+        answers expected states, anything else is confirmed by systemctl.
+        """
+        state = None
+        if self._unit_states is not None:
+            if command == "is-active":
+                state = self._unit_states.active_state(self._shell, unit_name)
+            else:
+                state = self._unit_states.unit_file_state(self._shell, unit_name)
+        if state is None or not expected(state):
+            result = self._shell(
+                f"{self._systemctl} {command} {unit_name}",
                 capture_output=True,
                 ignore_exit_code=True,
             )
-            print(result_status.stdout)
+            state = result.stdout.strip()
+
+        if expected(state):
+            return True
+        _unexpected_units.append((self._shell, unit_name))
+        return False
+
+    def is_active(self, unit_name: str) -> bool:
+        return self._has_state(unit_name, "is-active", lambda state: state == "active")
 
-        return inactive
+    def is_inactive(self, unit_name: str) -> bool:
+        return self._has_state(
+            unit_name, "is-active", lambda state: state == "inactive"
+        )
 
     def is_enabled(self, unit_name: str) -> bool:
         """Check if a system-level systemd unit is enabled.
@@ -166,71 +404,39 @@ class Systemd:
         Note: This also returns True for 'static' units (units without [Install] section
         that are enabled by default or pulled in by other units).
         """
-        result = self._shell(
-            f"{self._systemctl} is-enabled {unit_name}",
-            capture_output=True,
-            ignore_exit_code=True,
+        return self._has_state(
+            unit_name, "is-enabled", lambda state: state in ("enabled", "static")
         )
-        state = result.stdout.strip()
-        enabled = state in ("enabled", "static")
-        if not enabled:
-            result_status = self._shell(
-                f"{self._systemctl} status {unit_name}",
-                capture_output=True,
-                ignore_exit_code=True,
-            )
-            print(result_status.stdout)
-
-        return enabled
 
     def is_disabled(self, unit_name: str) -> bool:
-        result = self._shell(
-            f"{self._systemctl} is-enabled {unit_name}",
-            capture_output=True,
-            ignore_exit_code=True,
+        return self._has_state(
+            unit_name, "is-enabled", lambda state: state == "disabled"
         )
-        disabled = result.stdout.strip() == "disabled"
-        if not disabled:
-            result_status = self._shell(
-                f"{self._systemctl} status {unit_name}",
-                capture_output=True,
-                ignore_exit_code=True,
-            )
-            print(result_status.stdout)
-
-        return disabled
 
     def is_masked(self, unit_name: str) -> bool:
-        result = self._shell(
-            f"{self._systemctl} is-enabled {unit_name}",
-            capture_output=True,
-            ignore_exit_code=True,
-        )
-        state = result.stdout.strip()
-        masked = state in ("masked")
-        if not masked:
-            result_status = self._shell(
-                f"{self._systemctl} status {unit_name}",
-                capture_output=True,
-                ignore_exit_code=True,
-            )
-            print(result_status.stdout)
-
-        return masked
+        return self._has_state(unit_name, "is-enabled", lambda state: state == "masked")
 
     def start_unit(self, unit_name: str):
         if not allow_system_modifications():
             pytest.skip(
                 "starting units is only supported when system state modifications are allowed"
             )
-        self._shell(f"{self._systemctl} start {unit_name}")
+        try:
+            self._shell(f"{self._systemctl} start {unit_name}")
+        finally:
+            if self._unit_states is not None:
+                self._unit_states.invalidate()
 
     def stop_unit(self, unit_name: str):
         if not allow_system_modifications():
             pytest.skip(
                 "stopping units is only supported when system state modifications are allowed"
             )
-        self._shell(f"{self._systemctl} stop {unit_name}")
+        try:
+            self._shell(f"{self._systemctl} stop {unit_name}")
+        finally:
+            if self._unit_states is not None:
+                self._unit_states.invalidate()
 
     def list_units(self) -> list[SystemdUnit]:
         result = self._shell(
@@ -258,6 +464,66 @@ class Systemd:
         )
         return _parse_unit_files(result.stdout)
 
+    def get_sub_states(self, unit_names: Iterable[str]) -> Dict[str, str]:
+        """Return the sub-state of each unit with a single `systemctl show` call"""
+        unit_names = list(unit_names)
+        if not unit_names:
+            return {}
+        result = self._shell(
+            f"systemctl show --property=SubState {' '.join(unit_names)}",
+            capture_output=True,
+            ignore_exit_code=True,
+        )
+        if result.returncode != 0:
+            return {}
+        # One block per unit in the order of the arguments, also for unknown units
+        blocks = result.stdout.strip().split("\n\n")
+        return {
+            name: block.strip().removeprefix("SubState=")
+            for name, block in zip(unit_names, blocks)
+        }
+
+    def wait_for_sub_states(
+        self,
+        expected: Dict[str, str],
+        timeout: float,
+        min_poll_interval: float = 0.05,
+        max_poll_interval: float = 1.0,
+    ) -> Set[str]:
+        """
+        Wait for units to reach their expected sub-states.
+
+        Only units not settled yet are queried. The interval between queries starts
+        at min_poll_interval and doubles up to max_poll_interval, so units settling
+        quickly are noticed quickly while long waits cause few queries.
+
+        Args:
+            expected: unit name => expected sub-state
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            Units that did not reach their expected sub-state in time
+        """
+        pending = dict(expected)
+        deadline = time.monotonic() + timeout
+        interval = min_poll_interval
+
+        while pending:
+            for unit_name, sub_state in self.get_sub_states(pending).items():
+                logger.debug(
+                    f"Unit {unit_name} current state: {sub_state}, expected: {pending[unit_name]}"
+                )
+                if sub_state == pending[unit_name]:
+                    del pending[unit_name]
+
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_poll_interval)
+
+        return set(pending)
+
     def wait_is_system_running(self) -> SystemRunningState:
         start_time = time.time()
         result = self._shell(
@@ -266,6 +532,9 @@ class Systemd:
             ignore_exit_code=True,
         )
         elapsed = time.time() - start_time
+        # Units may have finished starting while waiting
+        if self._unit_states is not None:
+            self._unit_states.invalidate()
         return SystemRunningState(result.stdout.strip(), result.returncode, elapsed)
 
     def get_unit_properties(self, service_name) -> dict:
@@ -282,6 +551,43 @@ class Systemd:
         return Parse.from_str(result.stdout).parse("keyval", forbid_duplicates=False)
 
 
+def pytest_runtest_setup(item: pytest.Item):
+    _unexpected_units.clear()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo):
+    outcome = yield
+    report: pytest.TestReport = outcome.get_result()
+    if not report.failed:
+        return
+    # Show the status of units that were not in the expected state
+    for shell, unit_name in dict.fromkeys(_unexpected_units):
+        result = shell(
+            f"systemctl --no-pager status {unit_name}",
+            capture_output=True,
+            ignore_exit_code=True,
+        )
+        report.sections.append((f"systemctl status {unit_name}", result.stdout))
+    _unexpected_units.clear()
+
+
+def pytest_runtest_teardown(item: pytest.Item):
+    # Tests mutating the system may have started, stopped or (un)masked units
+    if _session_unit_states is not None and item.get_closest_marker("modify"):
+        _session_unit_states.invalidate()
+
+
+@pytest.fixture(scope="session")
+def systemd_unit_states() -> UnitStateCache:
+    global _session_unit_states
+    _session_unit_states = UnitStateCache()
+    return _session_unit_states
+
+
 @pytest.fixture
-def systemd(shell: ShellRunner):
-    return Systemd(shell)
+def systemd(request: pytest.FixtureRequest, shell: ShellRunner):
+    # Tests marked with modify query systemctl directly, they may change units themselves
+    if request.node.get_closest_marker("modify"):
+        return Systemd(shell)
+    return Systemd(shell, request.getfixturevalue("systemd_unit_states"))
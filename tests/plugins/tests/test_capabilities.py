@@ -0,0 +1,65 @@
+"""Tests for capabilities.py plugin."""
+
+import os
+
+import pytest
+from plugins.capabilities import Capabilities, has_capability_xattr
+from plugins.find import FIND_RESULT_TYPE_FILE
+from plugins.inventory import FilesystemInventory
+from pyprctl import FileCaps
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def file_tree(tmp_path):
+    """Plain files, a file with a user xattr and one with file capabilities"""
+    for name in ["plain", "tagged", "capable"]:
+        (tmp_path / name).write_text(name)
+    os.setxattr(tmp_path / "tagged", "user.test", b"1")
+    (tmp_path / "capable-link").symlink_to("capable")
+    return tmp_path
+
+
+@pytest.fixture
+def capable_file(file_tree):
+    if os.getuid() != 0:
+        pytest.skip("setting file capabilities requires root")
+    path = str(file_tree / "capable")
+    FileCaps.from_text("cap_net_raw=ep").set_for_file(path)
+    return path
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestCapabilities:
+    """Test probing and decoding file capabilities."""
+
+    def test_probe_skips_files_without_xattr(self, file_tree):
+        """Test that files without the capability xattr are not decoded."""
+        assert not has_capability_xattr(str(file_tree / "plain"))
+        assert not has_capability_xattr(str(file_tree / "tagged"))
+        assert Capabilities._probe([str(file_tree / "plain")]) == []
+
+    def test_probe(self, file_tree, capable_file):
+        """Test that capabilities are reported getcap style, also via symlinks."""
+        link = str(file_tree / "capable-link")
+
+        assert has_capability_xattr(capable_file)
+        assert Capabilities._probe([str(file_tree / "plain"), capable_file, link]) == [
+            f"{capable_file} cap_net_raw=ep",
+            f"{link} cap_net_raw=ep",
+        ]
+
+    def test_inventory_xattr_filter(self, file_tree, capable_file):
+        """Test that the inventory leaves out files recorded without xattrs."""
+        inventory = FilesystemInventory([str(file_tree)])
+
+        assert inventory.find(
+            str(file_tree), FIND_RESULT_TYPE_FILE, may_have_xattrs=True
+        ) == [capable_file, str(file_tree / "capable-link"), str(file_tree / "tagged")]
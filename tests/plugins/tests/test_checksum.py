@@ -0,0 +1,120 @@
+"""Tests for checksum.py plugin."""
+
+import hashlib
+
+import pytest
+from plugins import checksum
+
+ALGORITHMS = ("md5", "sha256", "sha512")
+
+
+def expected_digests(content: bytes) -> dict:
+    return {name: hashlib.new(name, content).hexdigest() for name in ALGORITHMS}
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def content() -> bytes:
+    return bytes(range(256)) * 9000
+
+
+@pytest.fixture
+def data_file(tmp_path, content):
+    path = tmp_path / "data.bin"
+    path.write_bytes(content)
+    return path
+
+
+@pytest.fixture
+def counted_reads(monkeypatch):
+    """Count the files hashed through digest_fileobj"""
+    reads = []
+    digest_fileobj = checksum.digest_fileobj
+
+    def counting_digest_fileobj(fileobj, algorithms=("sha256",)):
+        reads.append(tuple(algorithms))
+        return digest_fileobj(fileobj, algorithms)
+
+    monkeypatch.setattr(checksum, "digest_fileobj", counting_digest_fileobj)
+    return reads
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestFileDigests:
+    """Test hashing files with several algorithms in one pass."""
+
+    def test_multiple_digests(self, data_file, content, monkeypatch):
+        """Test that chunked reads produce the digests of the whole content."""
+        monkeypatch.setattr(checksum, "CHECKSUM_CHUNK_SIZE", 1000)
+
+        assert checksum.file_digests(data_file, ALGORITHMS) == expected_digests(content)
+
+    def test_mmap_digests(self, data_file, content, monkeypatch):
+        """Test that files above the mmap threshold produce the same digests."""
+        monkeypatch.setattr(checksum, "CHECKSUM_MMAP_THRESHOLD", 1024)
+
+        with open(data_file, "rb") as fileobj:
+            digests, size = checksum.digest_fileobj(fileobj, ALGORITHMS)
+
+        assert digests == expected_digests(content)
+        assert size == len(content)
+
+    def test_empty_file(self, tmp_path):
+        """Test that empty files are hashed."""
+        path = tmp_path / "empty"
+        path.touch()
+
+        assert checksum.file_digest(path, "SHA256") == hashlib.sha256(b"").hexdigest()
+
+    def test_missing_file(self, tmp_path):
+        """Test that unreadable files raise OSError."""
+        with pytest.raises(FileNotFoundError):
+            checksum.file_digests(tmp_path / "missing")
+
+
+class TestChecksumCache:
+    """Test memoizing digests per file version."""
+
+    def test_unchanged_file_is_read_once(self, data_file, content, counted_reads):
+        """Test that cached digests are returned without reading the file."""
+        cache = checksum.ChecksumCache()
+
+        assert checksum.file_digests(data_file, ("md5",), cache) == {
+            "md5": hashlib.md5(content).hexdigest()
+        }
+        assert (
+            checksum.file_digest(data_file, "md5", cache)
+            == hashlib.md5(content).hexdigest()
+        )
+        assert counted_reads == [("md5",)]
+
+    def test_only_missing_digests_are_computed(self, data_file, content, counted_reads):
+        """Test that additional algorithms are computed without the cached ones."""
+        cache = checksum.ChecksumCache()
+        checksum.file_digest(data_file, "md5", cache)
+
+        assert checksum.file_digests(data_file, ALGORITHMS, cache) == expected_digests(
+            content
+        )
+        assert counted_reads == [("md5",), ("sha256", "sha512")]
+
+    def test_modified_file_is_read_again(self, data_file, counted_reads):
+        """Test that a modified file is hashed again."""
+        cache = checksum.ChecksumCache()
+        checksum.file_digest(data_file, "sha256", cache)
+
+        data_file.write_bytes(b"modified")
+
+        assert checksum.file_digest(data_file, "sha256", cache) == (
+            hashlib.sha256(b"modified").hexdigest()
+        )
+        assert len(counted_reads) == 2
+        assert len(cache) == 2
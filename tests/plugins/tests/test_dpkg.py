@@ -0,0 +1,120 @@
+"""Tests for dpkg.py plugin."""
+
+import os
+
+import pytest
+from plugins import dpkg as dpkg_plugin
+from plugins.dpkg import Dpkg, PackageDatabase
+
+STATUS = """\
+Package: zlib1g
+Status: install ok installed
+Architecture: amd64
+Version: 1:1.3.dfsg-3
+Description: compression library - runtime
+ zlib is a library implementing the deflate compression method.
+
+Package: libc6
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 2.40-1
+
+Package: bash
+Status: install ok installed
+Architecture: amd64
+Version: 5.2.37-1
+
+Package: libc6
+Status: install ok installed
+Architecture: arm64
+Multi-Arch: same
+Version: 2.41-6
+"""
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def status_file(tmp_path):
+    path = tmp_path / "status"
+    path.write_text(STATUS)
+    return path
+
+
+@pytest.fixture
+def database(status_file):
+    return PackageDatabase(str(status_file))
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestPackageDatabase:
+    """Test the indexed dpkg status database."""
+
+    def test_indexes_installed_packages(self, database):
+        """Test that only installed packages are indexed."""
+        assert database.names() == ["bash", "libc6", "zlib1g"]
+        assert "bash" in database
+        assert "missing" not in database
+        assert database.get("missing") is None
+        assert database.get("libc6")["Architecture"] == "arm64"
+
+    def test_parses_paragraphs_lazily(self, database):
+        """Test that only requested paragraphs are parsed and parsed once."""
+        assert "zlib1g" in database
+        assert database._parsed == {}
+
+        package = database.get("zlib1g")
+        assert package["Version"] == "1:1.3.dfsg-3"
+        assert package["Description"].startswith("compression library")
+        assert len(database._parsed) == 1
+        assert database.get("zlib1g") is package
+
+    def test_matches_full_parse(self, database):
+        """Test that installed_packages equals parsing the whole status file."""
+        packages = database.installed_packages()
+
+        assert [p["Package"] for p in packages] == ["bash", "libc6", "zlib1g"]
+        assert [dict(p) for p in packages] == [
+            dict(database.get(name)) for name in database.names()
+        ]
+        assert packages.get_package("libc6")["Version"] == "2.41-6"
+
+    def test_invalidates_on_modification(self, database, status_file):
+        """Test that a rewritten status file is indexed again."""
+        assert "curl" not in database
+        old_package = database.get("bash")
+
+        status_file.write_text(
+            STATUS + "\nPackage: curl\nStatus: install ok installed\nVersion: 8.14\n"
+        )
+        st = status_file.stat()
+        os.utime(status_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        assert "curl" in database
+        assert database.get("curl")["Version"] == "8.14"
+        assert database.get("bash") is not old_package
+
+    def test_missing_status_file(self, tmp_path):
+        """Test that a missing status file has no packages."""
+        database = PackageDatabase(str(tmp_path / "missing"))
+
+        assert len(database) == 0
+        assert len(database.installed_packages()) == 0
+
+    def test_shared_by_dpkg(self, status_file, monkeypatch):
+        """Test that Dpkg instances answer from the shared database."""
+        monkeypatch.setattr(dpkg_plugin, "DPKG_STATUS_PATH", str(status_file))
+
+        assert Dpkg().package_is_installed("bash")
+        assert not Dpkg().package_is_installed("libc6-dev")
+        assert Dpkg().get_package("zlib1g") is Dpkg().get_package("zlib1g")
+        assert dpkg_plugin.package_database() is dpkg_plugin.package_database(
+            str(status_file)
+        )
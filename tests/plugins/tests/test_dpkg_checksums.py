@@ -0,0 +1,186 @@
+"""Tests for dpkg_checksums.py plugin."""
+
+import hashlib
+import io
+import subprocess
+import tarfile
+
+import pytest
+from plugins import dpkg as dpkg_plugin
+from plugins.dpkg_checksums import DpkgChecksums, read_deb_md5sums
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+
+def tar_bytes(files: dict, compression: str) -> bytes:
+    buffer = io.BytesIO()
+    if compression == "xz":
+        tar = tarfile.open(fileobj=buffer, mode="w:xz")
+    else:
+        tar = tarfile.open(fileobj=buffer, mode="w:gz")
+    with tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def ar_member(name: str, content: bytes) -> bytes:
+    header = f"{name + '/':<16}{0:<12}{0:<6}{0:<6}{100644:<8}{len(content):<10}`\n"
+    return header.encode() + content + (b"\n" if len(content) % 2 else b"")
+
+
+def build_deb(path, md5sums: dict, compression: str = "xz"):
+    """Write a minimal .deb with the given md5sums control file"""
+    md5sums_file = "".join(f"{md5}  {p.lstrip('/')}\n" for p, md5 in md5sums.items())
+    control = tar_bytes(
+        {"./control": b"Package: test\n", "./md5sums": md5sums_file.encode()},
+        compression,
+    )
+    data = tar_bytes({"./usr/bin/tool": b"x" * 4097}, compression)
+    ext = {"xz": ".xz", "gz": ".gz"}[compression]
+    path.write_bytes(
+        b"!<arch>\n"
+        + ar_member("debian-binary", b"2.0\n")
+        + ar_member(f"control.tar{ext}", control)
+        + ar_member(f"data.tar{ext}", data)
+    )
+
+
+def md5(content: bytes) -> str:
+    return hashlib.md5(content, usedforsecurity=False).hexdigest()
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def installed(tmp_path, monkeypatch):
+    """Files of two installed packages, their status file and cached .deb files"""
+    root = tmp_path / "root"
+    root.mkdir()
+    files = {
+        "tool": root / "tool",
+        "tool.conf": root / "tool.conf",
+        "lib.so": root / "lib.so",
+        "gone": root / "gone",
+    }
+    for name, path in files.items():
+        path.write_bytes(name.encode())
+
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    build_deb(
+        cache / "tool_1%3a2.0-1_amd64.deb",
+        {
+            str(files["tool"]): md5(b"tool"),
+            str(files["tool.conf"]): md5(b"original"),
+            str(files["gone"]): md5(b"gone"),
+        },
+    )
+    build_deb(
+        cache / "libfoo_1.0_all.deb", {str(files["lib.so"]): md5(b"lib.so")}, "gz"
+    )
+    files["gone"].unlink()
+
+    status = tmp_path / "status"
+    status.write_text(
+        "Package: tool\nStatus: install ok installed\nArchitecture: amd64\nVersion: 1:2.0-1\n\n"
+        "Package: libfoo\nStatus: install ok installed\nArchitecture: all\nVersion: 1.0\n"
+    )
+    monkeypatch.setattr(dpkg_plugin, "DPKG_STATUS_PATH", str(status))
+    return files, cache
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestDebReader:
+    """Test reading md5sums from .deb archives in-process."""
+
+    @pytest.mark.parametrize("compression", ["xz", "gz"])
+    def test_read_md5sums(self, tmp_path, compression):
+        """Test that md5sums are read from the control archive."""
+        deb = tmp_path / "test.deb"
+        build_deb(deb, {"/usr/bin/tool": "0" * 32, "/usr/share/a b": "1" * 32})
+
+        assert read_deb_md5sums(str(deb)) == {
+            "/usr/bin/tool": "0" * 32,
+            "/usr/share/a b": "1" * 32,
+        }
+
+    def test_rejects_other_files(self, tmp_path):
+        """Test that non-deb files are rejected."""
+        path = tmp_path / "test.deb"
+        path.write_bytes(b"not an archive")
+
+        with pytest.raises(ValueError):
+            read_deb_md5sums(str(path))
+
+    def test_fallback_failure(self, tmp_path):
+        """Test that a failing dpkg-deb fallback is an error, not an empty package."""
+        deb = tmp_path / "test.deb"
+        deb.write_bytes(
+            b"!<arch>\n" + ar_member("control.tar.zst", b"not a tar archive")
+        )
+
+        def shell(cmd, capture_output=False, ignore_exit_code=False):
+            return subprocess.CompletedProcess(cmd, 2, "", "unknown compression\n")
+
+        with pytest.raises(RuntimeError, match="test.deb: unknown compression"):
+            DpkgChecksums(shell)._read_md5sums(deb)
+
+
+class TestVerifyPackages:
+    """Test verifying many packages against cached .deb files."""
+
+    def test_report(self, installed):
+        """Test that the report covers all files of all packages."""
+        files, cache = installed
+        checksums = DpkgChecksums(None, cache_dirs=[cache], workers=4)
+
+        report = checksums.verify_packages(["tool", "libfoo"])
+
+        assert set(report) == {str(path) for path in files.values()}
+        assert report[str(files["tool"])].matches
+        assert report[str(files["lib.so"])].package == "libfoo"
+        assert report[str(files["lib.so"])].matches
+        modified = report[str(files["tool.conf"])]
+        assert not modified.matches
+        assert (modified.package, modified.expected, modified.actual) == (
+            "tool",
+            md5(b"original"),
+            md5(b"tool.conf"),
+        )
+        assert report[str(files["gone"])].actual is None
+
+    def test_for_package_uses_cache(self, installed):
+        """Test that cached .deb files are used without downloading."""
+        files, cache = installed
+        checksums = DpkgChecksums(None, cache_dirs=[cache])
+
+        ideal_checksums = checksums.for_package("tool")
+
+        assert checksums.is_matching_with_installed(ideal_checksums, str(files["tool"]))
+        assert not checksums.is_matching_with_installed(
+            ideal_checksums, str(files["tool.conf"])
+        )
+        assert checksums.for_package("libfoo", "1.0") == {
+            str(files["lib.so"]): md5(b"lib.so")
+        }
+        with pytest.raises(FileNotFoundError):
+            checksums.is_matching_with_installed(ideal_checksums, str(files["gone"]))
+
+    def test_not_installed(self, installed):
+        """Test that packages which are not installed are rejected."""
+        _, cache = installed
+
+        with pytest.raises(ValueError):
+            DpkgChecksums(None, cache_dirs=[cache]).verify_packages(["missing"])
@@ -1,12 +1,13 @@
 """Comprehensive tests for file.py plugin."""
 
 import grp
+import hashlib
 import os
 import pwd
 from pathlib import Path
 
 import pytest
-from plugins.file import File
+from plugins.file import File, FileInfo
 
 # ============================================================================
 # Fixtures
@@ -684,3 +685,104 @@ class TestFileIsOwnedBy:
 
         with pytest.raises(PermissionError):
             file.is_owned_by(test_file, "user", "group")
+
+
+class TestFileChecksum:
+    """Tests for File.checksum() and File.checksums() methods."""
+
+    def test_checksum(self, file: File, tmp_path):
+        """Test checksum() returns the md5 by default and other algorithms on request."""
+        test_file = tmp_path / "test.txt"
+        test_file.write_bytes(b"content")
+
+        assert file.checksum(test_file) == hashlib.md5(b"content").hexdigest()
+        assert (
+            file.checksum(test_file, "sha512") == hashlib.sha512(b"content").hexdigest()
+        )
+
+    def test_checksums_follow_modifications(self, file: File, tmp_path):
+        """Test checksums() returns fresh digests after the file changed."""
+        test_file = tmp_path / "test.txt"
+        test_file.write_bytes(b"before")
+        before = file.checksums(test_file, ("md5", "sha256"))
+
+        test_file.write_bytes(b"after!")
+
+        assert before == {
+            "md5": hashlib.md5(b"before").hexdigest(),
+            "sha256": hashlib.sha256(b"before").hexdigest(),
+        }
+        assert file.checksums(test_file, ("md5", "sha256")) == {
+            "md5": hashlib.md5(b"after!").hexdigest(),
+            "sha256": hashlib.sha256(b"after!").hexdigest(),
+        }
+
+    def test_checksum_raises_file_not_found_error(self, file: File, tmp_path):
+        """Test checksum() raises FileNotFoundError for non-existing path."""
+        with pytest.raises(FileNotFoundError):
+            file.checksum(tmp_path / "nonexistent.txt")
+
+
+class TestFileDescribe:
+    """Tests for File.describe() method."""
+
+    def test_describe(self, tmp_path):
+        """Test describe() reports type, mode, owner, size and link target."""
+        file = File()
+        regular = tmp_path / "test.txt"
+        regular.write_text("content")
+        regular.chmod(0o640)
+        directory = tmp_path / "dir"
+        directory.mkdir()
+        directory.chmod(0o1777)
+        link = tmp_path / "link"
+        link.symlink_to("test.txt")
+        missing = tmp_path / "nonexistent.txt"
+
+        infos = file.describe([regular, directory, link, missing])
+
+        user = pwd.getpwuid(os.getuid()).pw_name
+        group = grp.getgrgid(os.getgid()).gr_name
+        assert infos[str(regular)] == FileInfo(
+            str(regular), "file", "0640", user, group, len("content")
+        )
+        directory_info = infos[str(directory)]
+        assert directory_info is not None
+        assert directory_info.type == "directory"
+        assert directory_info.mode == "1777"
+        link_info = infos[str(link)]
+        assert link_info is not None
+        assert link_info.type == "symlink"
+        assert link_info.target == "test.txt"
+        assert infos[missing.as_posix()] is None
+
+    def test_describe_caches_stat_results(self, tmp_path, monkeypatch):
+        """Test describe() lstats and resolves names once until the cache is cleared."""
+        file = File()
+        test_file = tmp_path / "test.txt"
+        test_file.write_text("content")
+        lookups = []
+        getpwuid = pwd.getpwuid
+        monkeypatch.setattr(
+            pwd, "getpwuid", lambda uid: lookups.append(uid) or getpwuid(uid)
+        )
+
+        file.describe([test_file, tmp_path])
+        test_file.chmod(0o600)
+        info = file.describe([test_file])[str(test_file)]
+        assert info is not None
+        assert info.mode != "0600"
+        assert len(lookups) == 1
+
+        file.clear_cache()
+        info = file.describe([test_file])[str(test_file)]
+        assert info is not None
+        assert info.mode == "0600"
+
+    @pytest.mark.skipif(os.getuid() == 0, reason="Root can access any file")
+    def test_describe_raises_permission_error(self, file: File, restricted_directory):
+        """Test describe() raises PermissionError when access is denied."""
+        restricted_dir, test_file = restricted_directory
+
+        with pytest.raises(PermissionError):
+            file.describe([test_file])
@@ -0,0 +1,177 @@
+"""Tests for find.py plugin."""
+
+import fnmatch
+import os
+
+import pytest
+from plugins import find as find_plugin
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+
+def walk_find(root_path, entry_type, pattern=None, same_mnt_only=False):
+    """Reference implementation on top of os.walk"""
+    root_dev = os.stat(root_path).st_dev
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        names = []
+        if entry_type in (
+            find_plugin.FIND_RESULT_TYPE_DIR,
+            find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR,
+        ):
+            names += dirnames
+        if entry_type in (
+            find_plugin.FIND_RESULT_TYPE_FILE,
+            find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR,
+        ):
+            names += filenames
+        for name in names:
+            if pattern and not fnmatch.fnmatch(name, pattern):
+                continue
+            full_path = os.path.join(dirpath, name)
+            if same_mnt_only:
+                try:
+                    if os.stat(full_path).st_dev != root_dev:
+                        continue
+                except FileNotFoundError:
+                    continue
+            yield full_path
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def file_tree(tmp_path):
+    """A directory tree with nested directories, symlinks and a dead symlink"""
+    for directory in ["a/b/c", "a/d", "e"]:
+        (tmp_path / directory).mkdir(parents=True)
+    for path in ["top.conf", "a/one.conf", "a/b/two.txt", "a/b/c/three.conf", "e/x"]:
+        (tmp_path / path).write_text(path)
+    (tmp_path / "link-to-dir").symlink_to("a")
+    (tmp_path / "a/link-to-file").symlink_to("one.conf")
+    (tmp_path / "a/dead-link").symlink_to("missing")
+    (tmp_path / "e/mounts").symlink_to("/proc/self/mounts")
+    return tmp_path
+
+
+@pytest.fixture
+def find(file_tree) -> find_plugin.Find:
+    find = find_plugin.Find()
+    find.root_paths = str(file_tree)
+    return find
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestFind:
+    """Test the scandir based walker against os.walk."""
+
+    @pytest.mark.parametrize(
+        "entry_type",
+        [
+            find_plugin.FIND_RESULT_TYPE_FILE,
+            find_plugin.FIND_RESULT_TYPE_DIR,
+            find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR,
+        ],
+    )
+    @pytest.mark.parametrize("same_mnt_only", [False, True])
+    def test_matches_os_walk(self, find, file_tree, entry_type, same_mnt_only):
+        """Test that results and their order equal the os.walk implementation."""
+        find.entry_type = entry_type
+        find.same_mnt_only = same_mnt_only
+
+        expected = list(
+            walk_find(str(file_tree), entry_type, same_mnt_only=same_mnt_only)
+        )
+        assert list(find) == expected
+
+    def test_symlinks(self, find, file_tree):
+        """Test that symlinks are reported but not followed."""
+        find.entry_type = find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR
+        found = set(find)
+
+        assert str(file_tree / "link-to-dir") in found
+        assert str(file_tree / "a/dead-link") in found
+        assert str(file_tree / "link-to-dir/one.conf") not in found
+
+    def test_same_mount_skips_other_devices(self, find, file_tree):
+        """Test that dead symlinks and symlinks to other mounts are skipped."""
+        find.same_mnt_only = True
+        found = set(find)
+
+        assert str(file_tree / "a/link-to-file") in found
+        assert str(file_tree / "a/dead-link") not in found
+        assert str(file_tree / "e/mounts") not in found
+
+    @pytest.mark.skipif(
+        not os.path.ismount("/dev/pts"), reason="requires /dev/pts to be a mount"
+    )
+    def test_same_mount_prunes_mount_points(self):
+        """Test that mount points below the root are not descended into."""
+        find = find_plugin.Find()
+        find.root_paths = "/dev"
+        find.entry_type = find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR
+        find.same_mnt_only = True
+        found = list(find)
+
+        assert "/dev/pts" not in found
+        assert not [path for path in found if path.startswith("/dev/pts/")]
+        assert found == list(
+            walk_find(
+                "/dev", find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR, same_mnt_only=True
+            )
+        )
+
+    @pytest.mark.skipif(
+        not os.path.ismount("/dev/pts"), reason="requires /dev/pts to be a mount"
+    )
+    def test_same_mount_prunes_other_devices_without_mount(self, monkeypatch):
+        """Test that devices without a mountinfo entry (btrfs subvolumes) are pruned."""
+        monkeypatch.setattr(find_plugin, "read_mount_points", lambda: frozenset())
+        find = find_plugin.Find()
+        find.root_paths = "/dev"
+        find.entry_type = find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR
+        find.same_mnt_only = True
+
+        assert list(find) == list(
+            walk_find(
+                "/dev", find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR, same_mnt_only=True
+            )
+        )
+
+    def test_patterns(self, find, file_tree):
+        """Test that single and multiple fnmatch patterns are applied to names."""
+        find.pattern = "*.conf"
+        assert sorted(find) == sorted(
+            walk_find(str(file_tree), find_plugin.FIND_RESULT_TYPE_FILE, "*.conf")
+        )
+
+        find.pattern = ["*.txt", "x"]
+        assert sorted(find) == [
+            str(file_tree / "a/b/two.txt"),
+            str(file_tree / "e/x"),
+        ]
+
+    def test_lazy_iteration(self, find, file_tree):
+        """Test that iteration is lazy and unaffected by later changes to settings."""
+        iterator = iter(find)
+        first = next(iterator)
+        find.entry_type = find_plugin.FIND_RESULT_TYPE_DIR
+
+        assert [first, *iterator] == list(walk_find(str(file_tree), "files"))
+
+    def test_multiple_roots(self, find, file_tree):
+        """Test that all root paths are searched."""
+        find.root_paths = [str(file_tree / "a/b"), str(file_tree / "e")]
+
+        assert list(find) == [
+            *walk_find(str(file_tree / "a/b"), find_plugin.FIND_RESULT_TYPE_FILE),
+            *walk_find(str(file_tree / "e"), find_plugin.FIND_RESULT_TYPE_FILE),
+        ]
@@ -0,0 +1,248 @@
+"""Tests for initramfs.py plugin."""
+
+import gzip
+import io
+import lzma
+import os
+import shutil
+import stat
+import struct
+import subprocess
+
+import pytest
+from plugins.initramfs import InitramfsError, read_initramfs
+from plugins.initrd import FileRange, Initrd, _cached_index
+
+KERNEL = "6.12.47-cloud-amd64"
+
+
+def cpio(entries) -> bytes:
+    """Build a newc cpio archive from (name, mode, data) entries"""
+    archive = bytearray()
+    for ino, (name, mode, data) in enumerate([*entries, ("TRAILER!!!", 0, b"")]):
+        encoded = name.encode() + b"\x00"
+        fields = [ino, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(encoded), 0]
+        archive += b"070701" + b"".join(b"%08x" % field for field in fields)
+        archive += encoded
+        archive += b"\x00" * (-len(archive) % 4)
+        archive += data + b"\x00" * (-len(data) % 4)
+    # Archives are padded to full blocks
+    return bytes(archive + b"\x00" * (-len(archive) % 512))
+
+
+def file(name, data=b"") -> tuple:
+    return (name, stat.S_IFREG | 0o644, data)
+
+
+def directory(name) -> tuple:
+    return (name, stat.S_IFDIR | 0o755, b"")
+
+
+def pe_file(sections) -> bytes:
+    """Build a minimal PE32+ file from (name, data) sections, like a UKI"""
+    file_alignment = 0x200
+    headers_size = 0x400
+    optional_header = struct.pack("<HBBIIIII", 0x20B, 0, 0, 0, 0, 0, 0, 0x1000)
+    optional_header += struct.pack(
+        "<QIIHHHHHHIIIIHHQQQQII",
+        *(0, 0x1000, file_alignment, 0, 0, 0, 0, 0, 0, 0, 0, headers_size),
+        *(0, 10, 0, 0, 0, 0, 0, 0, 0),
+    )
+    section_table = b""
+    body = b""
+    virtual_address = 0x1000
+    for name, data in sections:
+        raw_size = len(data) + (-len(data) % file_alignment)
+        section_table += struct.pack(
+            "<8sIIIIIIHHI",
+            *(name, len(data), virtual_address, raw_size),
+            *(headers_size + len(body), 0, 0, 0, 0, 0x40000040),
+        )
+        body += data.ljust(raw_size, b"\x00")
+        virtual_address += raw_size + (-raw_size % 0x1000)
+    coff_header = struct.pack(
+        "<HHIIIHH", 0x8664, len(sections), 0, 0, 0, len(optional_header), 0x22
+    )
+    headers = b"MZ".ljust(0x3C, b"\x00") + struct.pack("<I", 0x40)
+    headers += b"PE\x00\x00" + coff_header + optional_header + section_table
+    return headers.ljust(headers_size, b"\x00") + body
+
+
+class NoKernelVersions:
+    def get_installed(self):
+        return []
+
+
+MAIN_ARCHIVE = cpio(
+    [
+        directory("."),
+        directory("usr"),
+        file("usr/sbin/fsck"),
+        file(f"usr/lib/modules/{KERNEL}/kernel/drivers/nvme/host/nvme-core.ko.xz"),
+        file(f"usr/lib/modules/{KERNEL}/kernel/drivers/net/virtio_net.ko"),
+        file(f"usr/lib/modules/{KERNEL}/modules.dep"),
+        file("etc/systemd/system/emergency.service"),
+        file("usr/lib/dracut/modules.txt", b"systemd\nignition\n\ngardenlinux-live\n"),
+    ]
+)
+EARLY_ARCHIVE = cpio(
+    [directory("kernel"), file("kernel/x86/microcode/GenuineIntel.bin", b"\x01" * 7)]
+)
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture(params=["none", "gzip", "xz", "zstd"])
+def compress(request):
+    if request.param == "none":
+        return lambda data: data
+    if request.param == "gzip":
+        return gzip.compress
+    if request.param == "xz":
+        return lambda data: lzma.compress(data, format=lzma.FORMAT_XZ)
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+
+        return zstd.compress
+    except ImportError:
+        if not shutil.which("zstd"):
+            pytest.skip("requires compression.zstd or the zstd command")
+        return lambda data: subprocess.run(
+            ["zstd", "--stdout", "--quiet"], input=data, capture_output=True
+        ).stdout
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestReadInitramfs:
+    """Test indexing initramfs images natively."""
+
+    def test_early_and_compressed_archive(self, compress):
+        """Test that an early cpio and the (compressed) main archive are read."""
+        index = read_initramfs(io.BytesIO(EARLY_ARCHIVE + compress(MAIN_ARCHIVE)))
+
+        assert "kernel/x86/microcode/GenuineIntel.bin" in index.paths
+        assert "usr/sbin/fsck" in index.paths
+        assert "." not in index.paths
+        assert index.dracut_modules == ["systemd", "ignition", "gardenlinux-live"]
+
+    def test_lookups(self):
+        """Test path, suffix, kernel module and dracut module lookups."""
+        index = read_initramfs(io.BytesIO(MAIN_ARCHIVE))
+
+        assert index.contains_path("usr/sbin/fsck")
+        assert index.contains_path("sbin/fsck")
+        assert not index.contains_path("bin/fsck")
+        nvme_core = index.module_path(KERNEL, "nvme-core")
+        assert nvme_core is not None
+        assert nvme_core.endswith("nvme-core.ko.xz")
+        assert index.module_path(KERNEL, "virtio_net")
+        assert index.module_path(KERNEL, "nvme") is None
+        assert index.module_path("6.1.0", "virtio_net") is None
+        assert index.modules(KERNEL) == [
+            f"usr/lib/modules/{KERNEL}/kernel/drivers/net/virtio_net.ko",
+            f"usr/lib/modules/{KERNEL}/kernel/drivers/nvme/host/nvme-core.ko.xz",
+        ]
+        assert index.contains_dracut_module("ignition")
+        assert not index.contains_dracut_module("")
+
+    def test_trailing_padding(self):
+        """Test that padding after the compressed archive is ignored."""
+        data = gzip.compress(MAIN_ARCHIVE) + b"\x00" * 1000
+
+        assert "usr/sbin/fsck" in read_initramfs(io.BytesIO(data)).paths
+
+    def test_unsupported(self):
+        """Test that unknown formats and truncated archives raise InitramfsError."""
+        with pytest.raises(InitramfsError, match="unsupported"):
+            read_initramfs(io.BytesIO(b"\x02\x21\x4c\x18" + b"\x01" * 100))
+        with pytest.raises(InitramfsError):
+            read_initramfs(io.BytesIO(MAIN_ARCHIVE[:300]))
+
+
+class TestInitrdIndexCache:
+    """Test that initrds are only read again if they changed."""
+
+    def test_cached_until_changed(self, tmp_path):
+        """Test that the index is keyed on path, size and mtime."""
+        path = tmp_path / "initrd.img"
+        path.write_bytes(gzip.compress(MAIN_ARCHIVE))
+        reads = []
+
+        def read(initrd_path):
+            reads.append(initrd_path)
+            return Initrd._read_index(initrd_path)
+
+        first = _cached_index(str(path), read)
+        assert _cached_index(str(path), read) is first
+        assert len(reads) == 1
+
+        path.write_bytes(EARLY_ARCHIVE + gzip.compress(MAIN_ARCHIVE))
+        os.utime(path, ns=(0, 0))
+        second = _cached_index(str(path), read)
+        assert len(reads) == 2
+        assert second is not None
+        assert second.contains_path("kernel/x86/microcode/GenuineIntel.bin")
+
+
+class TestEfiInitrd:
+    """Test reading the initrd section of EFI files in place."""
+
+    def test_file_range(self, tmp_path):
+        """Test that reads and seeks stay within the range."""
+        path = tmp_path / "file"
+        path.write_bytes(b"0123456789")
+
+        with open(path, "rb") as f:
+            view = FileRange(f.fileno(), 2, 5)
+            assert view.read() == b"23456"
+            assert view.read() == b""
+            view.seek(-2, io.SEEK_END)
+            assert view.read(10) == b"56"
+            view.seek(1)
+            assert view.read(2) == b"34"
+            assert view.tell() == 3
+
+    def test_read_efi_index(self, tmp_path):
+        """Test that the .initrd section is read without extracting it."""
+        path = tmp_path / "gardenlinux.efi"
+        initrd = EARLY_ARCHIVE + gzip.compress(MAIN_ARCHIVE)
+        path.write_bytes(pe_file([(b".linux", b"\x01" * 700), (b".initrd", initrd)]))
+
+        index = Initrd(NoKernelVersions())._read_efi_index(str(path))  # type: ignore[arg-type]
+        assert index is not None
+        assert index.contains_path("kernel/x86/microcode/GenuineIntel.bin")
+        assert index.dracut_modules == ["systemd", "ignition", "gardenlinux-live"]
+
+    def test_lsinitrd_fallback(self, tmp_path, monkeypatch):
+        """Test that only unsupported initrds are extracted for lsinitrd."""
+        path = tmp_path / "gardenlinux.efi"
+        initrd = b"\x02\x21\x4c\x18" + b"\x01" * 100
+        path.write_bytes(pe_file([(b".initrd", initrd)]))
+        extracted = []
+
+        def index_from_lsinitrd(initrd_path):
+            with open(initrd_path, "rb") as f:
+                extracted.append(f.read())
+            return "lsinitrd index"
+
+        monkeypatch.setattr(
+            Initrd, "_index_from_lsinitrd", staticmethod(index_from_lsinitrd)
+        )
+        efi_index = Initrd(NoKernelVersions())._read_efi_index(str(path))  # type: ignore[arg-type]
+
+        assert efi_index == "lsinitrd index"
+        assert extracted == [initrd]
+
+    def test_no_initrd_section(self, tmp_path):
+        """Test that EFI files without an initrd have no index."""
+        path = tmp_path / "gardenlinux.efi"
+        path.write_bytes(pe_file([(b".linux", b"\x01" * 10)]))
+
+        assert Initrd(NoKernelVersions())._read_efi_index(str(path)) is None  # type: ignore[arg-type]
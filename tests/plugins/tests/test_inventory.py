@@ -0,0 +1,182 @@
+"""Tests for inventory.py plugin."""
+
+import os
+
+import pytest
+from plugins import find as find_plugin
+from plugins.inventory import FilesystemInventory
+from plugins.setuid_binaries import _exposed_setuid_binaries_from_inventory
+from plugins.utils import tree
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def file_tree(tmp_path):
+    """A directory tree with symlinks, a dead symlink and a setuid binary"""
+    root = tmp_path / "root"
+    for directory in ["bin", "lib/modules/6.1/kernel", "etc/ssh"]:
+        (root / directory).mkdir(parents=True)
+    for path in ["bin/tool", "lib/modules/6.1/kernel/a.ko", "etc/ssh/sshd_config"]:
+        (root / path).write_text(path)
+    (root / "lib/modules/6.1/kernel/b.ko.xz").write_text("b")
+    (root / "bin/su").write_text("su")
+    (root / "bin/su").chmod(0o4755)
+    (root / "bin/su-link").symlink_to("su")
+    (root / "bin/dead").symlink_to("missing")
+    (root / "etc/ssh-link").symlink_to("ssh")
+    (tmp_path / "alias").symlink_to(root / "lib")
+    return root
+
+
+@pytest.fixture
+def inventory(file_tree) -> FilesystemInventory:
+    return FilesystemInventory([str(file_tree)])
+
+
+def walk_find(
+    root, entry_type=find_plugin.FIND_RESULT_TYPE_FILE, pattern=None, same_mnt_only=True
+):
+    find = find_plugin.Find()
+    find.root_paths = root
+    find.entry_type = entry_type
+    find.pattern = pattern
+    find.same_mnt_only = same_mnt_only
+    return sorted(find)
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestFilesystemInventory:
+    """Test answering filesystem queries from the inventory."""
+
+    @pytest.mark.parametrize(
+        "entry_type",
+        [
+            find_plugin.FIND_RESULT_TYPE_FILE,
+            find_plugin.FIND_RESULT_TYPE_DIR,
+            find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR,
+        ],
+    )
+    @pytest.mark.parametrize("same_mnt_only", [False, True])
+    def test_find_matches_find(self, inventory, file_tree, entry_type, same_mnt_only):
+        """Test that queries return what a Find walk returns, sorted."""
+        for root in [file_tree, file_tree / "lib", file_tree / "etc/ssh"]:
+            assert inventory.find(
+                str(root), entry_type, same_mnt_only=same_mnt_only
+            ) == walk_find(str(root), entry_type, same_mnt_only=same_mnt_only)
+
+    def test_find_pattern(self, inventory, file_tree):
+        """Test that fnmatch patterns are applied to names."""
+        modules_dir = str(file_tree / "lib/modules/6.1")
+
+        assert inventory.find(modules_dir, pattern=["*.ko", "*.ko.*"]) == [
+            f"{modules_dir}/kernel/a.ko",
+            f"{modules_dir}/kernel/b.ko.xz",
+        ]
+
+    def test_symlinked_root(self, inventory, file_tree):
+        """Test that paths below a symlinked root keep the symlink as prefix."""
+        alias = str(file_tree.parent / "alias")
+
+        assert inventory.find(alias) == walk_find(alias)
+        assert inventory.find(alias)[0].startswith(alias + "/")
+
+    def test_uncovered_paths(self, inventory, file_tree):
+        """Test that paths outside of the roots are not answered."""
+        assert inventory.find(str(file_tree.parent)) is None
+        assert inventory.find(str(file_tree / "missing")) is None
+        assert inventory.entries("/usr") is None
+
+    def test_entries(self, inventory, file_tree):
+        """Test that entries carry lstat and symlink target metadata."""
+        entries = {entry.path: entry for entry in inventory.entries(str(file_tree))}
+
+        su = entries[str(file_tree / "bin/su")]
+        assert su.mode & 0o4000 and not su.is_symlink and not su.is_dir
+        link = entries[str(file_tree / "bin/su-link")]
+        assert link.is_symlink and link.effective_mode == su.mode
+        assert entries[str(file_tree / "bin/dead")].effective_mode is None
+        assert entries[str(file_tree / "etc/ssh-link")].is_dir
+        assert inventory.get(str(file_tree / "bin/tool")).size == len("bin/tool")
+
+    def test_invalidate(self, inventory, file_tree):
+        """Test that the index is only walked again after invalidate."""
+        assert str(file_tree / "bin/new") not in inventory.find(str(file_tree))
+
+        (file_tree / "bin/new").write_text("new")
+        assert str(file_tree / "bin/new") not in inventory.find(str(file_tree))
+
+        inventory.invalidate()
+        assert str(file_tree / "bin/new") in inventory.find(str(file_tree))
+
+    def test_rescan_paths(self, inventory, file_tree, monkeypatch):
+        """Test that only the given paths are walked again."""
+        assert inventory.find(str(file_tree)) is not None
+        walked = []
+        monkeypatch.setattr(
+            inventory, "_scan", lambda: pytest.fail("all roots walked again")
+        )
+        entry = inventory._entry
+        monkeypatch.setattr(
+            inventory, "_entry", lambda path: walked.append(path) or entry(path)
+        )
+
+        (file_tree / "bin/new").write_text("new")
+        (file_tree / "bin/tool").unlink()
+        (file_tree / "bin/sub").mkdir()
+        (file_tree / "bin/sub/file").write_text("file")
+        (file_tree / "etc/new").write_text("new")
+        inventory.rescan([str(file_tree / "bin"), str(file_tree.parent / "outside")])
+
+        found = inventory.find(str(file_tree))
+        assert str(file_tree / "bin/new") in found
+        assert str(file_tree / "bin/sub/file") in found
+        assert str(file_tree / "bin/tool") not in found
+        assert str(file_tree / "etc/new") not in found
+        assert found == sorted(found)
+        assert all(path.startswith(str(file_tree / "bin")) for path in walked)
+
+        inventory.rescan([str(file_tree / "etc")])
+        assert inventory.find(
+            str(file_tree), find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR
+        ) == walk_find(str(file_tree), find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR)
+
+    @pytest.mark.skipif(
+        not os.path.ismount("/dev/pts"), reason="requires /dev/pts to be a mount"
+    )
+    def test_mount_points(self):
+        """Test that mount points below a root are not descended into."""
+        inventory = FilesystemInventory(["/dev"])
+
+        assert inventory.entries("/dev/pts") is None
+        assert inventory.find(
+            "/dev", find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR
+        ) == walk_find("/dev", find_plugin.FIND_RESULT_TYPE_FILE_AND_DIR)
+        assert inventory.find("/dev", same_mnt_only=False) is None
+
+
+class TestInventoryConsumers:
+    """Test plugins answering their queries from the inventory."""
+
+    @pytest.mark.skipif(os.getuid() != 0, reason="setuid files owned by root")
+    def test_exposed_setuid_binaries(self, inventory, file_tree, monkeypatch):
+        """Test that setuid root binaries and symlinks to them are found."""
+        monkeypatch.setattr(
+            "plugins.setuid_binaries.SETUID_BINARY_DIRS", [str(file_tree / "bin")]
+        )
+
+        assert _exposed_setuid_binaries_from_inventory(inventory) == {
+            str(file_tree / "bin/su"),
+            str(file_tree / "bin/su-link"),
+        }
+
+    def test_tree(self, inventory, file_tree):
+        """Test that tree returns the same subpaths with and without inventory."""
+        for path in [str(file_tree), str(file_tree / "etc")]:
+            assert tree(path, inventory) == tree(path)
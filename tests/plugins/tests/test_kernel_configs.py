@@ -0,0 +1,119 @@
+"""Tests for kernel_configs.py plugin."""
+
+import os
+
+import pytest
+from plugins.kernel_configs import KernelConfig, KernelConfigs, parse_kconfig
+from plugins.kernel_versions import KernelVersion
+
+CONFIG_A = """\
+#
+# Automatically generated file; DO NOT EDIT.
+# Linux/x86 6.12.47 Kernel Configuration
+#
+CONFIG_CC_VERSION_TEXT="gcc (Debian 14.2.0-19) 14.2.0"
+CONFIG_CRYPTO_FIPS=y
+CONFIG_CRYPTO_FIPS_NAME="SAP SE Garden Linux \\"nightly\\" Kernel Cryptographic Module"
+CONFIG_CRYPTO_BENCHMARK=m
+# CONFIG_MAGIC_SYSRQ is not set
+CONFIG_NR_CPUS=512
+CONFIG_PHYSICAL_START=0x1000000
+"""
+
+CONFIG_B = """\
+CONFIG_CRYPTO_FIPS=y
+CONFIG_CRYPTO_BENCHMARK=y
+CONFIG_MAGIC_SYSRQ=y
+CONFIG_NR_CPUS=512
+CONFIG_BTRFS_FS=m
+"""
+
+
+class FakeKernelVersions:
+    def __init__(self, versions):
+        self.versions = versions
+
+    def get_installed(self):
+        return [KernelVersion(version, "") for version in self.versions]
+
+    def get_running(self):
+        return self.get_installed()[0]
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def kernel_configs(tmp_path) -> KernelConfigs:
+    (tmp_path / "config-6.12.47-a").write_text(CONFIG_A)
+    (tmp_path / "config-6.12.47-b").write_text(CONFIG_B)
+    configs = KernelConfigs(FakeKernelVersions(["6.12.47-a", "6.12.47-b"]))  # type: ignore[arg-type]
+    configs._config_dir = str(tmp_path)
+    return configs
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestKernelConfig:
+    """Test the parsed kernel config model."""
+
+    def test_parse(self):
+        """Test that all option types and unset options are parsed."""
+        assert parse_kconfig(CONFIG_A) == {
+            "CONFIG_CC_VERSION_TEXT": "gcc (Debian 14.2.0-19) 14.2.0",
+            "CONFIG_CRYPTO_FIPS": "y",
+            "CONFIG_CRYPTO_FIPS_NAME": 'SAP SE Garden Linux "nightly" Kernel Cryptographic Module',
+            "CONFIG_CRYPTO_BENCHMARK": "m",
+            "CONFIG_MAGIC_SYSRQ": "n",
+            "CONFIG_NR_CPUS": "512",
+            "CONFIG_PHYSICAL_START": "0x1000000",
+        }
+
+    def test_queries(self):
+        """Test that missing options are not set and several are checked at once."""
+        config = KernelConfig("config", "6.12.47", CONFIG_A)
+
+        assert config.get("CONFIG_BTRFS_FS") == "n"
+        assert "CONFIG_BTRFS_FS" not in config.options
+        assert config.is_enabled("CONFIG_CRYPTO_BENCHMARK")
+        assert not config.is_enabled("CONFIG_MAGIC_SYSRQ")
+        assert config.mismatches(
+            {"CONFIG_CRYPTO_FIPS": "y", "CONFIG_MAGIC_SYSRQ": "y", "CONFIG_KVM": "m"}
+        ) == {"CONFIG_MAGIC_SYSRQ": "n", "CONFIG_KVM": "n"}
+
+
+class TestKernelConfigs:
+    """Test querying the configs of installed kernels."""
+
+    def test_mismatches(self, kernel_configs, tmp_path):
+        """Test that mismatches are reported by config file."""
+        assert kernel_configs.mismatches(
+            {"CONFIG_CRYPTO_FIPS": "y", "CONFIG_CRYPTO_BENCHMARK": "m"}
+        ) == {str(tmp_path / "config-6.12.47-b"): {"CONFIG_CRYPTO_BENCHMARK": "y"}}
+
+    def test_diff(self, kernel_configs):
+        """Test that options differing between two kernels are reported."""
+        diff = kernel_configs.diff("6.12.47-a", "6.12.47-b")
+
+        assert diff["CONFIG_BTRFS_FS"] == ("n", "m")
+        assert diff["CONFIG_MAGIC_SYSRQ"] == ("n", "y")
+        assert diff["CONFIG_CRYPTO_BENCHMARK"] == ("m", "y")
+        assert "CONFIG_NR_CPUS" not in diff
+        assert "CONFIG_CRYPTO_FIPS" not in diff
+
+    def test_cached_until_changed(self, kernel_configs, tmp_path):
+        """Test that configs are parsed once until the file changes."""
+        first = kernel_configs.get_running()
+        assert kernel_configs.get_installed()[0] is first
+
+        path = tmp_path / "config-6.12.47-a"
+        path.write_text(
+            CONFIG_A.replace("CONFIG_CRYPTO_FIPS=y", "CONFIG_CRYPTO_FIPS=n")
+        )
+        os.utime(path, ns=(0, 0))
+        assert kernel_configs.get_running().get("CONFIG_CRYPTO_FIPS") == "n"
@@ -0,0 +1,273 @@
+"""Tests for kernel_module.py plugin."""
+
+import os
+import subprocess
+import threading
+
+import pytest
+from plugins import kernel_module as kernel_module_plugin
+from plugins.kernel_versions import KernelVersion
+
+KERNEL = "6.12.47-cloud-amd64"
+
+MODULES_DEP = """\
+kernel/drivers/nvme/host/nvme.ko.xz: kernel/drivers/nvme/host/nvme-core.ko.xz kernel/drivers/base/firmware_loader/firmware_class.ko.xz
+kernel/drivers/nvme/host/nvme-core.ko.xz: kernel/drivers/base/firmware_loader/firmware_class.ko.xz
+kernel/drivers/base/firmware_loader/firmware_class.ko.xz:
+kernel/crypto/tcrypt.ko.xz:
+"""
+
+MODULES_ALIAS = """\
+# Aliases extracted from modules themselves.
+alias pci:v*d*sv*sd*bc01sc08i02* nvme
+alias nvme-fabrics nvme_core
+alias devname:nvme-fabrics nvme_core
+"""
+
+MODULES_BUILTIN = """\
+kernel/fs/ext4/ext4.ko
+kernel/crypto/sha256_generic.ko
+"""
+
+
+class FakeKernelVersions:
+    def __init__(self, modules_dir):
+        self.modules_dir = str(modules_dir)
+
+    def get_running(self):
+        return KernelVersion(KERNEL, self.modules_dir)
+
+
+PROC_MODULES = """\
+nvme 61440 0 - Live 0x0000000000000000
+nvme_core 217088 1 nvme, Live 0x0000000000000000
+firmware_class 49152 2 nvme,nvme_core, Live 0x0000000000000000
+tcrypt 110592 0 - Live 0x0000000000000000
+ext4 1032192 1 - Live 0x0000000000000000
+"""
+
+
+class FakeKernel:
+    """/proc/modules and /sys/module in a directory, rmmod removes modules"""
+
+    def __init__(self, path):
+        self.proc_modules = path / "modules"
+        self.sys_module = path / "sys"
+        self.holders = {}
+        for line in PROC_MODULES.splitlines():
+            name, _, _, holders, _, _ = line.split()
+            self.holders[name] = [h for h in holders.split(",") if h not in ("", "-")]
+            (self.sys_module / name).mkdir(parents=True)
+        self._write()
+        self.lock = threading.Lock()
+        self.commands = []
+        self.active = 0
+        self.max_active = 0
+
+    def _write(self):
+        self.proc_modules.write_text(
+            "".join(
+                f"{name} 4096 {len(holders)} {''.join(f'{h},' for h in holders) or '-'} "
+                "Live 0x0000000000000000\n"
+                for name, holders in self.holders.items()
+            )
+        )
+
+    def __call__(self, cmd, capture_output=False, ignore_exit_code=False):
+        command, module = cmd.split()
+        assert command == "rmmod", f"unexpected command {cmd}"
+        with self.lock:
+            self.commands.append(cmd)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # Give concurrent unloads a chance to overlap
+        threading.Event().wait(0.05)
+        with self.lock:
+            self.active -= 1
+            if self.holders[module]:
+                return subprocess.CompletedProcess(cmd, 1, "", "in use")
+            del self.holders[module]
+            for holders in self.holders.values():
+                if module in holders:
+                    holders.remove(module)
+            self._write()
+            (self.sys_module / module).rmdir()
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def modules_dir(tmp_path):
+    (tmp_path / "modules.dep").write_text(MODULES_DEP)
+    (tmp_path / "modules.alias").write_text(MODULES_ALIAS)
+    (tmp_path / "modules.builtin").write_text(MODULES_BUILTIN)
+    return tmp_path
+
+
+@pytest.fixture
+def index(modules_dir) -> kernel_module_plugin.ModuleIndex:
+    return kernel_module_plugin.ModuleIndex.from_modules_dir(str(modules_dir))
+
+
+@pytest.fixture
+def kernel(tmp_path) -> FakeKernel:
+    (tmp_path / "kernel").mkdir()
+    return FakeKernel(tmp_path / "kernel")
+
+
+@pytest.fixture
+def kernel_module(modules_dir, kernel) -> kernel_module_plugin.KernelModule:
+    states = kernel_module_plugin.ModuleStates(
+        str(kernel.proc_modules), str(kernel.sys_module)
+    )
+    return kernel_module_plugin.KernelModule(None, kernel, FakeKernelVersions(modules_dir), states=states)  # type: ignore[arg-type]
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestModuleIndex:
+    """Test answering module queries from the depmod files."""
+
+    def test_available_and_builtin(self, index):
+        """Test that loadable and builtin modules are told apart."""
+        assert index.available_modules() == [
+            "firmware_class",
+            "nvme",
+            "nvme-core",
+            "tcrypt",
+        ]
+        assert index.is_available("nvme_core")
+        assert index.is_available("nvme-core")
+        assert not index.is_available("ext4")
+        assert index.is_builtin("ext4")
+        assert index.is_builtin("sha256-generic")
+        assert not index.is_builtin("nvme")
+
+    def test_resolve(self, index):
+        """Test that names, plain aliases and alias patterns are resolved."""
+        assert index.resolve("nvme-core") == ["nvme_core"]
+        assert index.resolve("ext4") == ["ext4"]
+        assert index.resolve("nvme-fabrics") == ["nvme_core"]
+        assert index.resolve(
+            "pci:v00008086d00000953sv00008086sd00003702bc01sc08i02"
+        ) == ["nvme"]
+        assert index.resolve("pci:v00008086d00000953sv0sd0bc02sc00i00") == []
+
+    def test_dependency_closure(self, index):
+        """Test that indirect dependencies are included in load order."""
+        assert index.dependencies("nvme") == ["nvme_core", "firmware_class"]
+        assert index.dependency_closure("nvme") == ["firmware_class", "nvme_core"]
+        assert index.dependency_closure("tcrypt") == []
+        assert index.dependency_closure("unknown") == []
+
+    def test_dependency_graph(self, index):
+        """Test that the graph only contains the given modules."""
+        assert index.dependency_graph(["nvme", "firmware_class", "tcrypt"]) == {
+            "firmware_class": set(),
+            "nvme": {"firmware_class"},
+            "tcrypt": set(),
+        }
+
+    def test_cached_until_depmod(self, modules_dir):
+        """Test that the index is read again only if modules.dep changed."""
+        first = kernel_module_plugin.module_index(str(modules_dir))
+        assert kernel_module_plugin.module_index(str(modules_dir)) is first
+
+        (modules_dir / "modules.dep").write_text(MODULES_DEP + "kernel/fs/udf.ko:\n")
+        os.utime(modules_dir / "modules.dep", ns=(0, 0))
+        second = kernel_module_plugin.module_index(str(modules_dir))
+        assert second is not None and second is not first
+        assert second.is_available("udf")
+
+    def test_missing_modules_dep(self, tmp_path):
+        """Test that kernels without modules.dep have no index."""
+        assert kernel_module_plugin.module_index(str(tmp_path)) is None
+
+
+class TestKernelModule:
+    """Test that KernelModule uses the module index."""
+
+    def test_queries_without_subprocesses(self, kernel_module):
+        """Test that availability and dependencies need no find or modprobe."""
+        assert kernel_module.is_module_available("tcrypt")
+        assert not kernel_module.is_module_available("wireguard")
+        assert kernel_module.is_module_builtin("ext4")
+        assert kernel_module.resolve_module("nvme-fabrics") == ["nvme_core"]
+
+        kernel_module._loaded = {"nvme", "nvme_core"}
+        kernel_module._dependency_graph = {"nvme": set()}
+        kernel_module._update_module_dependencies("nvme")
+        assert kernel_module._dependency_graph == {"nvme": {"nvme_core"}}
+
+
+class TestModuleStates:
+    """Test tracking loaded modules and waiting for them to unload."""
+
+    def test_read(self, kernel):
+        """Test that /proc/modules is parsed with the holders of each module."""
+        states = kernel_module_plugin.ModuleStates(
+            str(kernel.proc_modules), str(kernel.sys_module)
+        )
+
+        modules = states.read()
+        assert list(modules) == [
+            "nvme",
+            "nvme_core",
+            "firmware_class",
+            "tcrypt",
+            "ext4",
+        ]
+        assert modules["firmware_class"] == kernel_module_plugin.ModuleState(
+            "firmware_class", 4096, 2, {"nvme", "nvme_core"}, "Live"
+        )
+        assert modules["nvme"].holders == set()
+        assert states.is_loaded("nvme-core")
+        assert not states.is_loaded("udf")
+
+    def test_wait_unloaded(self, kernel, monkeypatch):
+        """Test that the wait backs off and returns modules still loaded."""
+        states = kernel_module_plugin.ModuleStates(
+            str(kernel.proc_modules), str(kernel.sys_module)
+        )
+        slept = []
+        monkeypatch.setattr("plugins.kernel_module.time.sleep", slept.append)
+        monkeypatch.setattr("plugins.kernel_module.time.monotonic", lambda: sum(slept))
+
+        assert states.wait_unloaded(["tcrypt", "udf"], 0.1) == {"tcrypt"}
+        assert slept == pytest.approx([0.01, 0.02, 0.04, 0.03])
+
+        (kernel.sys_module / "tcrypt").rmdir()
+        # Gone from /sys/module, but still in /proc/modules
+        assert states.wait_unloaded(["tcrypt"], 0.1) == {"tcrypt"}
+
+
+class TestUnloadModules:
+    """Test unloading tracked modules in dependency order."""
+
+    def test_unload_modules(self, kernel_module, kernel):
+        """Test that leaves are unloaded concurrently, before their dependencies."""
+        kernel_module._initially_loaded = {"ext4"}
+        kernel_module._loaded = {"nvme", "nvme_core", "firmware_class", "tcrypt"}
+        kernel_module._dependency_graph = {"nvme": {"nvme_core"}}
+
+        assert kernel_module.unload_modules()
+        assert kernel_module.collect_loaded_modules() == ["ext4"]
+        assert kernel.max_active == 2
+        assert set(kernel.commands[:2]) == {"rmmod nvme", "rmmod tcrypt"}
+        assert kernel.commands[2:] == ["rmmod nvme_core", "rmmod firmware_class"]
+
+    def test_unload_failure(self, kernel_module, kernel):
+        """Test that modules in use by other modules are reported as failed."""
+        kernel_module._initially_loaded = set()
+        kernel_module._loaded = {"firmware_class"}
+
+        assert not kernel_module.unload_modules()
+        assert kernel_module.is_module_loaded("firmware_class")
+        assert kernel.commands == ["rmmod firmware_class"] * 2
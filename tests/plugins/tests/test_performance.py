@@ -0,0 +1,91 @@
+"""Tests for performance.py plugin."""
+
+import pytest
+from plugins import performance
+from plugins.systemd import CriticalChainLink, UnitActivation, UnitTiming
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+def profile(
+    unit_times=None, flavor="kvm,server", userspace=5.0
+) -> performance.BootProfile:
+    return performance.BootProfile(
+        flavor=flavor,
+        firmware=0.0,
+        loader=0.0,
+        kernel=1.0,
+        initrd=2.0,
+        userspace=userspace,
+        blame=[
+            UnitTiming(unit, seconds) for unit, seconds in (unit_times or {}).items()
+        ],
+    )
+
+
+@pytest.fixture
+def baseline() -> performance.BootProfile:
+    return profile({"a.service": 3.0, "b.service": 0.5, "c.service": 0.1})
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestBootProfile:
+    """Test boot profiles and their comparison with a baseline."""
+
+    def test_slowest_and_critical_path(self):
+        """Test that units are ranked and the critical path is in start order."""
+        boot_profile = profile({"a.service": 0.2, "b.service": 4.0, "c.service": 1.0})
+        boot_profile.critical_chain = [
+            CriticalChainLink("multi-user.target", 3.4),
+            CriticalChainLink("b.service", 3.1, 0.3),
+            CriticalChainLink("network.target", 2.0),
+            CriticalChainLink("c.service", 1.0, 1.0),
+        ]
+
+        assert [timing.unit for timing in boot_profile.slowest(2)] == [
+            "b.service",
+            "c.service",
+        ]
+        assert boot_profile.critical_path() == ["c.service", "b.service"]
+
+    def test_save_and_load(self, baseline, tmp_path):
+        """Test that profiles are stored per flavor and read back unchanged."""
+        path = tmp_path / "boot-profiles.json"
+        baseline.critical_chain = [CriticalChainLink("a.service", 1.0, 3.0)]
+        baseline.activations = {"a.service": UnitActivation("a.service", 1.0, 4.0)}
+        other = profile(flavor="aws,gardener")
+
+        performance.save_boot_profile(path, baseline)
+        performance.save_boot_profile(path, other)
+
+        assert performance.load_boot_profiles(path) == {
+            "kvm,server": baseline,
+            "aws,gardener": other,
+        }
+        assert performance.load_boot_profiles(tmp_path / "missing.json") == {}
+
+    def test_no_regressions(self, baseline):
+        """Test that small or relative-only differences are tolerated."""
+        current = profile(
+            {"a.service": 3.5, "b.service": 1.2, "c.service": 0.1}, userspace=5.9
+        )
+
+        assert performance.boot_profile_regressions(baseline, current) == []
+
+    def test_regressions_name_units(self, baseline):
+        """Test that slower phases, slower units and new slow units are named."""
+        current = profile(
+            {"a.service": 6.0, "b.service": 0.5, "new.service": 2.0}, userspace=9.0
+        )
+
+        assert performance.boot_profile_regressions(baseline, current) == [
+            "userspace: 5.00s -> 9.00s",
+            "a.service: 3.00s -> 6.00s",
+            "new.service: 0.00s -> 2.00s",
+        ]
@@ -0,0 +1,104 @@
+"""Tests for shell.py plugin."""
+
+import os
+
+import pytest
+from plugins.shell import ShellRunner, ShellWorker
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture(params=[False, True], ids=["spawn", "worker"])
+def runner(request) -> ShellRunner:
+    return ShellRunner(None, worker=request.param)
+
+
+@pytest.fixture
+def worker():
+    worker = ShellWorker(None)
+    yield worker
+    worker.stop()
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestShellRunner:
+    """Test that both execution modes behave like /bin/sh -e -c."""
+
+    def test_capture_output(self, runner):
+        """Test that stdout and stderr are captured separately."""
+        result = runner("echo out; echo err >&2; printf 'no newline'", True)
+
+        assert result.returncode == 0
+        assert result.stdout == "out\nno newline"
+        assert result.stderr == "err\n"
+
+    def test_exit_code(self, runner):
+        """Test that failing commands raise unless the exit code is ignored."""
+        with pytest.raises(RuntimeError, match="exit code 3"):
+            runner("exit 3")
+
+        assert runner("false; echo unreachable", True, True).returncode == 1
+        assert runner("false; echo unreachable", True, True).stdout == ""
+
+    def test_syntax_error(self, runner):
+        """Test that syntax errors fail the command only."""
+        assert runner("if then", True, True).returncode == 2
+        assert runner("echo ok", True).stdout == "ok\n"
+
+    def test_no_state_between_commands(self, runner):
+        """Test that variables, directory changes and options do not leak."""
+        runner("FOO=bar; cd /; set +e")
+
+        assert runner('echo "${FOO:-unset}"', True).stdout == "unset\n"
+        assert runner("pwd", True).stdout == f"{os.getcwd()}\n"
+        assert runner("false; echo unreachable", True, True).stdout == ""
+
+    def test_multiline_and_quotes(self, runner):
+        """Test that commands containing newlines and quotes are passed verbatim."""
+        result = runner("echo 'a b'\necho \"it's\" \\\n  continued", True)
+
+        assert result.stdout == "a b\nit's continued\n"
+
+    def test_environment(self, runner, monkeypatch):
+        """Test that commands see the current environment of the test process."""
+        runner("true")
+        monkeypatch.setenv("SHELL_RUNNER_TEST", "value")
+
+        assert runner('echo "$SHELL_RUNNER_TEST"', True).stdout == "value\n"
+
+    @pytest.mark.skipif(os.geteuid() != 0, reason="switching users requires root")
+    def test_user(self):
+        """Test that commands run as the given user in both modes."""
+        for worker in [False, True]:
+            shell = ShellRunner((65534, 65534), worker=worker)
+            assert shell("id -u; id -g", True).stdout == "65534\n65534\n"
+
+
+class TestShellWorker:
+    """Test the long-lived shell worker."""
+
+    def test_reuses_process(self, worker):
+        """Test that commands run in the same worker shell."""
+        # $$ is the pid of the worker shell in its subshells
+        assert worker.run("echo $$") == worker.run("echo $$")
+
+    def test_restarts_after_exit(self, worker):
+        """Test that a worker killed by a command is replaced."""
+        with pytest.raises(RuntimeError, match="shell worker died"):
+            worker.run("kill $$")
+
+        assert worker.run("echo ok") == (0, b"ok\n", b"")
+
+    def test_large_output(self, worker):
+        """Test that output exceeding the pipe buffers is read completely."""
+        exit_code, stdout, stderr = worker.run(
+            "head -c 1000000 /dev/zero; head -c 300000 /dev/zero >&2"
+        )
+
+        assert (exit_code, len(stdout), len(stderr)) == (0, 1000000, 300000)
@@ -0,0 +1,83 @@
+"""Tests for sysctl.py plugin."""
+
+import pytest
+from plugins import sysctl as sysctl_plugin
+from plugins.sysctl import Sysctl
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def proc_sys(tmp_path, monkeypatch):
+    """A fake /proc/sys tree"""
+    (tmp_path / "kernel").mkdir()
+    (tmp_path / "kernel" / "hostname").write_text("garden\n")
+    (tmp_path / "net" / "ipv4").mkdir(parents=True)
+    (tmp_path / "net" / "ipv4" / "tcp_rmem").write_text("4096\t131072  6291456\n")
+    (tmp_path / "fs").mkdir()
+    (tmp_path / "fs" / "protected_hardlinks").write_text("1\n")
+    monkeypatch.setattr(sysctl_plugin, "SYSCTL_BASE_PATH", str(tmp_path))
+    return tmp_path
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestSysctlSnapshot:
+    """Test lookups answered from the in-memory snapshot."""
+
+    def test_lookups_match_live_reads(self, proc_sys):
+        """Test that snapshot lookups normalize values like live reads."""
+        snapshot = Sysctl(None, snapshot=True)
+
+        assert snapshot["fs.protected_hardlinks"] == 1
+        assert snapshot["net.ipv4.tcp_rmem"] == "4096 131072 6291456"
+        assert snapshot["kernel.hostname"] == "garden"
+        assert "kernel.hostname" in snapshot
+        assert "kernel.missing" not in snapshot
+        assert 1 not in snapshot
+        with pytest.raises(KeyError):
+            snapshot["kernel.missing"]
+
+    def test_reads_once_until_invalidated(self, proc_sys, monkeypatch):
+        """Test that /proc/sys is only walked again after invalidate."""
+        snapshot = Sysctl(None, snapshot=True)
+        walks = []
+        collect = snapshot.collect_sysctl_parameters
+        monkeypatch.setattr(
+            snapshot,
+            "collect_sysctl_parameters",
+            lambda: walks.append(1) or collect(),
+        )
+
+        assert snapshot["fs.protected_hardlinks"] == 1
+        (proc_sys / "fs" / "protected_hardlinks").write_text("0\n")
+        assert snapshot["fs.protected_hardlinks"] == 1
+        assert "fs.protected_hardlinks" in snapshot
+        assert len(walks) == 1
+
+        snapshot.invalidate()
+        assert snapshot["fs.protected_hardlinks"] == 0
+        assert len(walks) == 2
+
+
+class TestSysctlKeys:
+    """Test keys of entries with dots in a path component."""
+
+    def test_dotted_component(self, proc_sys):
+        """Test that live and snapshot lookups agree on sysctl(8) style keys."""
+        conf = proc_sys / "net" / "ipv4" / "conf" / "eth0.100"
+        conf.mkdir(parents=True)
+        (conf / "forwarding").write_text("1\n")
+
+        snapshot = Sysctl(None, snapshot=True)
+        live = Sysctl(None)
+
+        key = "net.ipv4.conf.eth0/100.forwarding"
+        assert key in snapshot.collect_sysctl_parameters()
+        assert snapshot[key] == live[key] == 1
+        assert "net.ipv4.conf.eth0.100.forwarding" not in live
@@ -0,0 +1,493 @@
+"""Tests for sysdiff.py plugin."""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, replace
+from functools import partial
+
+import pytest
+from debian import deb822
+from plugins import sysdiff
+from plugins.kernel_module import LoadedKernelModule
+from plugins.shell import ShellRunner
+from plugins.sysctl import SysctlParam
+from plugins.systemd import SystemdUnit
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def file_collector() -> sysdiff.FileCollector:
+    return sysdiff.FileCollector(ShellRunner(None), workers=4)
+
+
+@pytest.fixture
+def file_tree(tmp_path):
+    """Create a small directory tree with files of different sizes."""
+    (tmp_path / "sub").mkdir()
+    contents = {
+        tmp_path / "a.txt": b"a",
+        tmp_path / "empty": b"",
+        tmp_path / "sub" / "b.txt": b"b" * 10_000,
+    }
+    for path, content in contents.items():
+        path.write_bytes(content)
+    return tmp_path, {
+        str(p): hashlib.sha256(c).hexdigest() for p, c in contents.items()
+    }
+
+
+# ============================================================================
+# FileCollector Tests
+# ============================================================================
+
+
+class TestFileCollectorHashes:
+    """Tests for FileCollector.collect_file_hashes()."""
+
+    def test_collect_file_hashes(
+        self, file_collector: sysdiff.FileCollector, file_tree
+    ):
+        """Test that hashes match hashlib and results are sorted by path."""
+        root, expected = file_tree
+
+        hashes = file_collector.collect_file_hashes([str(root)])
+
+        assert hashes == expected
+        assert list(hashes) == sorted(expected)
+
+    def test_collect_file_hashes_stats(
+        self, file_collector: sysdiff.FileCollector, file_tree
+    ):
+        """Test that throughput statistics are recorded."""
+        root, expected = file_tree
+
+        file_collector.collect_file_hashes([str(root)])
+
+        assert file_collector.stats is not None
+        assert file_collector.stats.files == len(expected)
+        assert file_collector.stats.bytes == 10_001
+        assert file_collector.stats.workers == 4
+
+    def test_collect_file_hashes_mmap(
+        self, file_collector: sysdiff.FileCollector, tmp_path, monkeypatch
+    ):
+        """Test that large files hashed via mmap produce the same digest."""
+        monkeypatch.setattr("plugins.checksum.CHECKSUM_MMAP_THRESHOLD", 1024)
+        large = tmp_path / "large.bin"
+        large.write_bytes(b"x" * 4096)
+
+        hashes = file_collector.collect_file_hashes([str(tmp_path)])
+
+        assert hashes == {str(large): hashlib.sha256(b"x" * 4096).hexdigest()}
+
+    def test_collect_file_hashes_ignore(
+        self, file_collector: sysdiff.FileCollector, file_tree
+    ):
+        """Test that ignore patterns are applied."""
+        root, expected = file_tree
+
+        hashes = file_collector.collect_file_hashes([str(root)], [r"/sub/"])
+
+        assert set(hashes) == {p for p in expected if "/sub/" not in p}
+
+
+class TestFileCollectorIncremental:
+    """Tests for incremental hashing with FileCollector.collect_file_entries()."""
+
+    def test_unchanged_files_reuse_cached_hash(
+        self, file_collector: sysdiff.FileCollector, file_tree
+    ):
+        """Test that files with matching stat metadata are not re-read."""
+        root, _ = file_tree
+        entries = file_collector.collect_file_entries([str(root)])
+        # A bogus hash proves the cached value was used instead of re-hashing
+        cache = {e.path: replace(e, sha256="cached") for e in entries}
+
+        incremental = file_collector.collect_file_entries([str(root)], cache=cache)
+
+        assert {e.sha256 for e in incremental} == {"cached"}
+        assert file_collector.stats is not None
+        assert file_collector.stats.cached == len(entries)
+        assert file_collector.stats.bytes == 0
+
+    def test_changed_files_are_rehashed(
+        self, file_collector: sysdiff.FileCollector, file_tree
+    ):
+        """Test that files with changed stat metadata are re-hashed."""
+        root, _ = file_tree
+        entries = file_collector.collect_file_entries([str(root)])
+        cache = {e.path: replace(e, sha256="cached") for e in entries}
+        changed = root / "a.txt"
+        changed.write_bytes(b"changed")
+
+        incremental = file_collector.collect_file_entries([str(root)], cache=cache)
+
+        hashes = {e.path: e.sha256 for e in incremental}
+        assert hashes[str(changed)] == hashlib.sha256(b"changed").hexdigest()
+        assert all(h == "cached" for p, h in hashes.items() if p != str(changed))
+
+    def test_entries_without_stat_metadata_are_rehashed(
+        self, file_collector: sysdiff.FileCollector, file_tree
+    ):
+        """Test that entries from old snapshots without stat metadata are not trusted."""
+        root, expected = file_tree
+        cache = {
+            path: sysdiff.FileEntry(path=path, sha256="cached") for path in expected
+        }
+
+        incremental = file_collector.collect_file_entries([str(root)], cache=cache)
+
+        assert {e.path: e.sha256 for e in incremental} == expected
+
+
+class TestIgnoreMatcher:
+    """Tests for IgnoreMatcher."""
+
+    PATTERNS = [
+        "^/etc/ssh/",
+        "/etc/mtab",
+        r"\.swp$",
+        "(?i)backup",
+        r"(cache)/\1",
+        "[invalid",
+    ]
+
+    @pytest.mark.parametrize(
+        "path",
+        [
+            "/etc/ssh/sshd_config",
+            "/opt/etc/ssh/sshd_config",
+            "/etc/mtab",
+            "/opt/etc/mtab.d/x",
+            "/etc/.hosts.swp",
+            "/etc/.hosts.swp.1",
+            "/etc/BACKUP/x",
+            "/var/cache/cache/x",
+            "/etc/[invalid",
+            "/etc/hosts",
+        ],
+    )
+    def test_matches_like_re_search(self, path):
+        """Test that the matcher has the same semantics as re.search per pattern."""
+
+        def search(pattern):
+            try:
+                return re.search(pattern, path) is not None
+            except re.error:
+                return pattern in path
+
+        expected = any(search(pattern) for pattern in self.PATTERNS)
+
+        assert sysdiff.IgnoreMatcher(self.PATTERNS).matches(path) == expected
+
+    def test_prunes(self):
+        """Test that only directories whose whole subtree is ignored are pruned."""
+        matcher = sysdiff.IgnoreMatcher(self.PATTERNS)
+
+        assert matcher.prunes("/etc/ssh")
+        assert matcher.prunes("/opt/etc/mtab.d")
+        assert not matcher.prunes("/etc")
+        assert not matcher.prunes("/etc/BACKUP")
+
+    def test_pruned_directories_are_not_listed(
+        self, file_collector: sysdiff.FileCollector, file_tree, monkeypatch
+    ):
+        """Test that ignored subtrees are not scanned during the walk."""
+        root, expected = file_tree
+        scanned = []
+        scandir = os.scandir
+
+        def recording_scandir(path):
+            scanned.append(str(path))
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", recording_scandir)
+
+        hashes = file_collector.collect_file_hashes([str(root)], [f"^{root}/sub/"])
+
+        assert str(root / "sub") not in scanned
+        assert set(hashes) == {p for p in expected if "/sub/" not in p}
+
+
+# ============================================================================
+# SnapshotManager Tests - storage format
+# ============================================================================
+
+
+def make_snapshot(name: str, sha256: str = "abc") -> sysdiff.Snapshot:
+    return sysdiff.Snapshot(
+        name,
+        sysdiff.SnapshotMetadata(created_at="now", paths=["/etc"], ignore_file=False),
+        [deb822.Deb822({"Package": "bash", "Version": "5.2", "Description": "x\n y"})],
+        [SystemdUnit("ssh.service", "loaded", "active", "running")],
+        [sysdiff.FileEntry(path="/etc/hosts", sha256=sha256, dev=1, inode=2, size=3)],
+        [SysctlParam(name="kernel.hostname", value="a\tb")],
+        [LoadedKernelModule(name="ext4")],
+    )
+
+
+@pytest.fixture
+def snapshot_manager(tmp_path) -> sysdiff.SnapshotManager:
+    return sysdiff.SnapshotManager(tmp_path)
+
+
+class TestSnapshotStorage:
+    """Tests for saving and loading snapshots."""
+
+    def test_roundtrip(self, snapshot_manager: sysdiff.SnapshotManager):
+        """Test that a saved snapshot loads with identical sections."""
+        snapshot = make_snapshot("snap")
+        snapshot_file = snapshot_manager.state_dir / f"snap{sysdiff.SNAPSHOT_SUFFIX}"
+        snapshot_manager._save_snapshot(snapshot, snapshot_file)
+
+        loaded = snapshot_manager.load_snapshot("snap")
+
+        assert snapshot_manager.list_snapshots() == ["snap"]
+        assert loaded.metadata == snapshot.metadata
+        assert [dict(p) for p in loaded.packages] == [
+            dict(p) for p in snapshot.packages
+        ]
+        for section in sysdiff.SNAPSHOT_SECTIONS[1:]:
+            assert getattr(loaded, section) == getattr(snapshot, section)
+
+    def test_sections_are_loaded_lazily(
+        self, snapshot_manager: sysdiff.SnapshotManager
+    ):
+        """Test that only accessed sections are read from the archive."""
+        snapshot_file = snapshot_manager.state_dir / f"snap{sysdiff.SNAPSHOT_SUFFIX}"
+        snapshot_manager._save_snapshot(make_snapshot("snap"), snapshot_file)
+
+        loaded = snapshot_manager.load_snapshot("snap")
+        assert loaded.package_versions() == [("bash", "5.2")]
+        assert loaded.files[0].path == "/etc/hosts"
+
+        assert set(vars(loaded)) & set(sysdiff.SNAPSHOT_SECTIONS) == {"files"}
+
+    def test_legacy_snapshot(self, snapshot_manager: sysdiff.SnapshotManager):
+        """Test that snapshots in the previous .json.gz format can still be read."""
+        snapshot = make_snapshot("legacy")
+        data = {
+            "name": snapshot.name,
+            "metadata": {"created_at": "now", "paths": ["/etc"], "ignore_file": False},
+            "packages": [dict(p) for p in snapshot.packages],
+            "systemd_units": [asdict(u) for u in snapshot.systemd_units],
+            "files": [{"path": "/etc/hosts", "sha256": "abc"}],
+            "sysctl_params": [asdict(p) for p in snapshot.sysctl_params],
+            "kernel_modules": [asdict(m) for m in snapshot.kernel_modules],
+        }
+        with gzip.open(snapshot_manager.state_dir / "legacy.json.gz", "wt") as f:
+            json.dump(data, f)
+
+        loaded = snapshot_manager.load_snapshot("legacy")
+
+        assert snapshot_manager.list_snapshots() == ["legacy"]
+        assert loaded.files == [sysdiff.FileEntry(path="/etc/hosts", sha256="abc")]
+        assert loaded.package_versions() == [("bash", "5.2")]
+
+
+def save_snapshot(
+    snapshot_manager: sysdiff.SnapshotManager, snapshot: sysdiff.Snapshot
+):
+    snapshot_file = (
+        snapshot_manager.state_dir / f"{snapshot.name}{sysdiff.SNAPSHOT_SUFFIX}"
+    )
+    snapshot_manager._save_snapshot(snapshot, snapshot_file)
+    return snapshot_file
+
+
+class TestSnapshotObjectStore:
+    """Tests for deduplication, garbage collection and retention."""
+
+    def test_identical_sections_are_stored_once(
+        self, snapshot_manager: sysdiff.SnapshotManager
+    ):
+        """Test that unchanged sections of a second snapshot reuse stored objects."""
+        save_snapshot(snapshot_manager, make_snapshot("a", "abc"))
+        objects_a = set(snapshot_manager.store.sizes())
+        save_snapshot(snapshot_manager, make_snapshot("b", "def"))
+        objects_b = set(snapshot_manager.store.sizes())
+
+        # only the files section differs
+        assert len(objects_b - objects_a) == 1
+        assert snapshot_manager.load_snapshot("b").files[0].sha256 == "def"
+
+    def test_collect_garbage(self, snapshot_manager: sysdiff.SnapshotManager):
+        """Test that only objects of deleted snapshots are removed."""
+        save_snapshot(snapshot_manager, make_snapshot("a", "abc"))
+        save_snapshot(snapshot_manager, make_snapshot("b", "def")).unlink()
+
+        assert snapshot_manager.collect_garbage() > 0
+        assert snapshot_manager.collect_garbage() == 0
+        assert snapshot_manager.load_snapshot("a").files[0].sha256 == "abc"
+
+    def test_retention_max_count(self, snapshot_manager: sysdiff.SnapshotManager):
+        """Test that the oldest snapshots exceeding max_count are deleted."""
+        for age, name in enumerate(["c", "b", "a"]):
+            snapshot_file = save_snapshot(snapshot_manager, make_snapshot(name, name))
+            os.utime(snapshot_file, (1000 - age, 1000 - age))
+
+        removed = snapshot_manager.apply_retention(sysdiff.RetentionPolicy(max_count=1))
+
+        assert removed == ["a", "b"]
+        assert snapshot_manager.list_snapshots() == ["c"]
+        assert snapshot_manager.load_snapshot("c").files[0].sha256 == "c"
+
+    def test_retention_max_age_and_bytes(
+        self, snapshot_manager: sysdiff.SnapshotManager
+    ):
+        """Test that old snapshots and snapshots exceeding max_bytes are deleted."""
+        old = save_snapshot(snapshot_manager, make_snapshot("old"))
+        os.utime(old, (0, 0))
+        save_snapshot(snapshot_manager, make_snapshot("new"))
+
+        assert snapshot_manager.apply_retention(
+            sysdiff.RetentionPolicy(max_age=3600)
+        ) == ["old"]
+        assert snapshot_manager.apply_retention(
+            sysdiff.RetentionPolicy(max_bytes=0)
+        ) == ["new"]
+        assert snapshot_manager.store.sizes() == {}
+
+
+class TestSnapshotCollectors:
+    """Tests for SnapshotManager._run_collectors()."""
+
+    def test_collectors_run_concurrently(
+        self, snapshot_manager: sysdiff.SnapshotManager
+    ):
+        """Test that collectors overlap and their timings are recorded."""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def collector(value):
+            # Only passes if all collectors are running at the same time
+            barrier.wait()
+            return [value]
+
+        results, timings = snapshot_manager._run_collectors(
+            {section: partial(collector, section) for section in ("a", "b", "c")}
+        )
+
+        assert results == {"a": ["a"], "b": ["b"], "c": ["c"]}
+        assert set(timings) == {"a", "b", "c"}
+
+    def test_collector_errors_are_raised(
+        self, snapshot_manager: sysdiff.SnapshotManager
+    ):
+        """Test that an exception in a collector is propagated."""
+
+        def failing():
+            raise RuntimeError("collector failed")
+
+        with pytest.raises(RuntimeError, match="collector failed"):
+            snapshot_manager._run_collectors({"a": list, "b": failing})
+
+
+class TestDiffEngineSections:
+    """Tests for DiffEngine.compare_snapshots() section selection."""
+
+    def test_compare_selected_sections(self, snapshot_manager: sysdiff.SnapshotManager):
+        """Test that only the selected sections are compared and loaded."""
+        for name, sha256 in (("a", "abc"), ("b", "def")):
+            snapshot_file = (
+                snapshot_manager.state_dir / f"{name}{sysdiff.SNAPSHOT_SUFFIX}"
+            )
+            snapshot_manager._save_snapshot(make_snapshot(name, sha256), snapshot_file)
+        snapshot_a = snapshot_manager.load_snapshot("a")
+        snapshot_b = snapshot_manager.load_snapshot("b")
+
+        result = sysdiff.DiffEngine().compare_snapshots(
+            snapshot_a, snapshot_b, ["sysctl_params"]
+        )
+
+        assert not result.has_changes
+        assert set(vars(snapshot_a)) & set(sysdiff.SNAPSHOT_SECTIONS) == {
+            "sysctl_params"
+        }
+
+        result = sysdiff.DiffEngine().compare_snapshots(
+            snapshot_a, snapshot_b, ["files"]
+        )
+
+        assert result.has_changes
+        assert result.file_changes == [
+            sysdiff.Change("/etc/hosts", sysdiff.CHANGE_MODIFIED, old="abc", new="def")
+        ]
+
+    def test_compare_unknown_section(self):
+        """Test that unknown sections are rejected."""
+        snapshot = make_snapshot("a")
+
+        with pytest.raises(ValueError):
+            sysdiff.DiffEngine().compare_snapshots(snapshot, snapshot, ["unknown"])
+
+
+class TestDiffEngineChanges:
+    """Tests for the keyed change records of DiffEngine."""
+
+    def test_file_changes(self):
+        """Test added, removed and modified files are classified by path."""
+        files_a = [sysdiff.FileEntry("/etc/a", "1"), sysdiff.FileEntry("/etc/b", "2")]
+        files_b = [sysdiff.FileEntry("/etc/c", "3"), sysdiff.FileEntry("/etc/a", "9")]
+
+        changes = sysdiff.DiffEngine()._compare_files(files_a, files_b)
+
+        assert changes == [
+            sysdiff.Change("/etc/a", sysdiff.CHANGE_MODIFIED, old="1", new="9"),
+            sysdiff.Change("/etc/b", sysdiff.CHANGE_REMOVED, old="2"),
+            sysdiff.Change("/etc/c", sysdiff.CHANGE_ADDED, new="3"),
+        ]
+
+    def test_reordering_is_no_change(self):
+        """Test that entries in a different order are not reported as changes."""
+        params_a = [SysctlParam("a", "1"), SysctlParam("b", "2")]
+        params_b = list(reversed(params_a))
+
+        assert sysdiff.DiffEngine()._compare_sysctl_params(params_a, params_b) == []
+
+    def test_ignored_entries(self):
+        """Test that ignored sysctl parameters and systemd units are skipped."""
+        engine = sysdiff.DiffEngine()
+
+        assert not engine._compare_sysctl_params(
+            [SysctlParam("fs.file-nr", "1")], [SysctlParam("fs.file-nr", "2")]
+        )
+        assert not engine._compare_systemd_units(
+            [], [SystemdUnit("session-1.scope", "loaded", "active", "running")]
+        )
+
+    def test_multiarch_packages(self):
+        """Test that packages installed for several architectures are merged."""
+        changes = sysdiff.DiffEngine()._compare_package_versions(
+            [("libc6", "2.36"), ("libc6", "2.36")],
+            [("libc6", "2.36"), ("libc6", "2.37")],
+        )
+
+        assert changes == [
+            sysdiff.Change(
+                "libc6", sysdiff.CHANGE_MODIFIED, old="2.36", new="2.36, 2.37"
+            )
+        ]
+
+    def test_generate_diff(self):
+        """Test rendering of change records for display."""
+        engine = sysdiff.DiffEngine()
+        result = engine.compare_snapshots(
+            make_snapshot("a", "abc"), make_snapshot("b", "def")
+        )
+
+        output = engine.generate_diff(result, "a", "b")
+
+        assert output.splitlines()[:5] == [
+            "=== File content changes (sha256, path) (a -> b) ===",
+            "--- files@snapshot_a",
+            "+++ files@snapshot_b",
+            "-abc  /etc/hosts",
+            "+def  /etc/hosts",
+        ]
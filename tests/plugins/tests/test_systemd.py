@@ -0,0 +1,261 @@
+"""Tests for systemd.py plugin."""
+
+import json
+import subprocess
+
+import pytest
+from plugins import systemd as systemd_plugin
+
+LIST_UNITS = [
+    {"unit": "ssh.service", "load": "loaded", "active": "active", "sub": "running"},
+    {"unit": "chrony.service", "load": "loaded", "active": "inactive", "sub": "dead"},
+    {"unit": "logrotate.timer", "load": "loaded", "active": "active", "sub": "waiting"},
+]
+
+LIST_UNIT_FILES = [
+    {"unit_file": "ssh.service", "state": "enabled", "preset": "enabled"},
+    {"unit_file": "sshd.service", "state": "alias", "preset": None},
+    {"unit_file": "chrony.service", "state": "disabled", "preset": "enabled"},
+    {"unit_file": "debug-shell.service", "state": "masked", "preset": "disabled"},
+]
+
+
+class FakeShell:
+    """Answers systemctl commands from canned output and records all commands"""
+
+    def __init__(self, live_states=None):
+        self.commands = []
+        self.live_states = live_states or {}
+        # unit name => sub-states returned by consecutive `systemctl show` calls
+        self.sub_states = {}
+
+    def __call__(self, cmd, capture_output=False, ignore_exit_code=False):
+        self.commands.append(cmd)
+        if cmd.endswith("list-units --all"):
+            stdout = json.dumps(LIST_UNITS)
+        elif cmd.endswith("list-unit-files"):
+            stdout = json.dumps(LIST_UNIT_FILES)
+        elif cmd.startswith("systemctl show"):
+            units = cmd.split()[3:]
+            stdout = "\n".join(
+                f"SubState={self._next_sub_state(unit)}\n" for unit in units
+            )
+        else:
+            stdout = self.live_states.get(cmd.split()[-1], "") + "\n"
+        return subprocess.CompletedProcess(cmd, 0, stdout, "")
+
+    def _next_sub_state(self, unit):
+        states = self.sub_states.get(unit, ["dead"])
+        return states.pop(0) if len(states) > 1 else states[0]
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+
+@pytest.fixture
+def shell():
+    return FakeShell()
+
+
+@pytest.fixture
+def systemd(shell) -> systemd_plugin.Systemd:
+    return systemd_plugin.Systemd(shell, systemd_plugin.UnitStateCache())  # type: ignore[arg-type]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record sleeps instead of sleeping, time advances by the slept duration"""
+    slept = []
+    monkeypatch.setattr("plugins.systemd.time.sleep", slept.append)
+    monkeypatch.setattr("plugins.systemd.time.monotonic", lambda: sum(slept))
+    return slept
+
+
+# ============================================================================
+# Tests
+# ============================================================================
+
+
+class TestUnitStateCache:
+    """Test answering unit state queries from the unit state cache."""
+
+    def test_unit_name(self):
+        """Test that names without a unit type refer to services."""
+        assert systemd_plugin.unit_name("ssh") == "ssh.service"
+        assert systemd_plugin.unit_name("getty@tty1") == "getty@tty1.service"
+        assert systemd_plugin.unit_name("logrotate.timer") == "logrotate.timer"
+
+    def test_predicates_from_cache(self, systemd, shell):
+        """Test that expected states are answered with two systemctl calls."""
+        assert systemd.is_active("ssh")
+        assert systemd.is_active("logrotate.timer")
+        assert systemd.is_inactive("chrony.service")
+        assert systemd.is_enabled("ssh.service")
+        assert systemd.is_disabled("chrony")
+        assert systemd.is_masked("debug-shell.service")
+
+        assert len(shell.commands) == 2
+
+    def test_unexpected_state_is_confirmed(self, systemd, shell):
+        """Test that states differing from the expectation are asked live."""
+        shell.live_states["chrony"] = "active"
+
+        assert systemd.is_active("chrony")
+        assert shell.commands[-1].endswith("is-active chrony")
+        assert not systemd.is_enabled("chrony")
+        assert shell.commands[-1].endswith("is-enabled chrony")
+
+    def test_unlisted_units_are_asked_live(self, systemd, shell):
+        """Test that aliases and unknown units are not answered from the cache."""
+        shell.live_states["sshd"] = "enabled"
+
+        assert systemd.is_enabled("sshd")
+        assert not systemd.is_active("getty@tty1")
+        assert len(shell.commands) == 4
+
+    def test_refresh_after_start_and_stop(self, systemd, shell, monkeypatch):
+        """Test that starting and stopping units reads the states again."""
+        monkeypatch.setattr("plugins.systemd.allow_system_modifications", lambda: True)
+        systemd.is_active("ssh")
+
+        systemd.stop_unit("ssh")
+        systemd.is_active("ssh")
+        systemd.start_unit("ssh")
+        systemd.is_active("ssh")
+
+        assert sum(cmd.endswith("list-units --all") for cmd in shell.commands) == 3
+
+    def test_without_cache(self, shell):
+        """Test that every query asks systemctl without a cache."""
+        systemd = systemd_plugin.Systemd(shell)  # type: ignore[arg-type]
+        shell.live_states["ssh"] = "active"
+
+        assert systemd.is_active("ssh")
+        assert shell.commands == [
+            "systemctl --plain --no-legend --no-pager --output=json is-active ssh"
+        ]
+
+
+class TestWaitForSubStates:
+    """Test waiting for units to reach their expected sub-states."""
+
+    def test_get_sub_states(self, systemd, shell):
+        """Test that sub-states of all units are read with one call."""
+        shell.sub_states = {"a.socket": ["listening"], "b.socket": ["running"]}
+
+        assert systemd.get_sub_states(["a.socket", "b.socket", "c.socket"]) == {
+            "a.socket": "listening",
+            "b.socket": "running",
+            "c.socket": "dead",
+        }
+        assert len(shell.commands) == 1
+
+    def test_settled(self, systemd, shell, sleeps):
+        """Test that no time is spent waiting if all units are settled."""
+        shell.sub_states = {"a.socket": ["listening"]}
+
+        assert systemd.wait_for_sub_states({"a.socket": "listening"}, 10) == set()
+        assert sleeps == []
+
+    def test_backoff(self, systemd, shell, sleeps):
+        """Test that the interval grows and only pending units are queried."""
+        shell.sub_states = {
+            "a.socket": ["listening"],
+            "b.socket": ["dead", "dead", "dead", "dead", "listening"],
+        }
+
+        assert (
+            systemd.wait_for_sub_states(
+                {"a.socket": "listening", "b.socket": "listening"},
+                10,
+                min_poll_interval=0.1,
+                max_poll_interval=0.3,
+            )
+            == set()
+        )
+        assert sleeps == [0.1, 0.2, 0.3, 0.3]
+        assert shell.commands[-1] == "systemctl show --property=SubState b.socket"
+
+    def test_timeout(self, systemd, shell, sleeps):
+        """Test that units not settled in time are returned."""
+        shell.sub_states = {"a.socket": ["listening"]}
+
+        assert systemd.wait_for_sub_states(
+            {"a.socket": "listening", "b.socket": "listening"}, 2.5
+        ) == {"b.socket"}
+        assert sum(sleeps) == pytest.approx(2.5)
+
+
+class TestBootTimings:
+    """Test parsing systemd-analyze and systemctl boot timings."""
+
+    def test_seconds(self):
+        """Test that all time units printed by systemd-analyze are converted."""
+        assert systemd_plugin._seconds("1h 2min 3.5s") == pytest.approx(3723.5)
+        assert systemd_plugin._seconds("120ms") == pytest.approx(0.12)
+        assert systemd_plugin._seconds("250us") == pytest.approx(0.00025)
+
+    def test_blame(self):
+        """Test that multi-part durations and instance names are parsed."""
+        stdout = "1min 2.345s cloud-init.service\n    123ms getty@tty1.service\n"
+
+        timings = systemd_plugin._parse_blame(stdout)
+        assert [timing.unit for timing in timings] == [
+            "cloud-init.service",
+            "getty@tty1.service",
+        ]
+        assert [timing.seconds for timing in timings] == pytest.approx([62.345, 0.123])
+
+    def test_critical_chain(self):
+        """Test that the tree is parsed and units without timings are skipped."""
+        stdout = (
+            'The time when unit became active or started is printed after the "@" character.\n'
+            'The time the unit took to start is printed after the "+" character.\n'
+            "\n"
+            "multi-user.target @3.427s\n"
+            "└─ssh.service @3.190s +236ms\n"
+            "  └─network.target @3.186s\n"
+            "    └─systemd-networkd.service @1min 2.1s +1.2s\n"
+            "      └─-.slice\n"
+        )
+
+        chain = systemd_plugin._parse_critical_chain(stdout)
+        assert [link.unit for link in chain] == [
+            "multi-user.target",
+            "ssh.service",
+            "network.target",
+            "systemd-networkd.service",
+        ]
+        assert [link.active_at for link in chain] == pytest.approx(
+            [3.427, 3.19, 3.186, 62.1]
+        )
+        assert [link.startup for link in chain] == [
+            None,
+            pytest.approx(0.236),
+            None,
+            pytest.approx(1.2),
+        ]
+
+    def test_activations(self):
+        """Test that monotonic timestamps are converted and 0 means never."""
+        stdout = (
+            "Id=ssh.service\n"
+            "InactiveExitTimestampMonotonic=1500000\n"
+            "ActiveEnterTimestampMonotonic=2000000\n"
+            "\n"
+            "Id=debug-shell.service\n"
+            "InactiveExitTimestampMonotonic=0\n"
+            "ActiveEnterTimestampMonotonic=0\n"
+        )
+
+        activations = systemd_plugin._parse_activations(stdout)
+        assert activations == {
+            "ssh.service": systemd_plugin.UnitActivation("ssh.service", 1.5, 2.0),
+            "debug-shell.service": systemd_plugin.UnitActivation(
+                "debug-shell.service", None, None
+            ),
+        }
+        assert activations["ssh.service"].activation_time == 0.5
+        assert activations["debug-shell.service"].activation_time is None
@@ -2,6 +2,9 @@ import logging
 import os
 from typing import List, Optional, TypeVar
 
+from .find import FIND_RESULT_TYPE_FILE_AND_DIR
+from .inventory import FilesystemInventory
+
 # Various utility functions to make tests more readable
 # This should not contain test-assertions, but only abstract details that make tests harder to read
 
@@ -21,8 +24,16 @@ def is_set(obj) -> bool:
     return isinstance(obj, set)
 
 
-def tree(path: str) -> set[str]:
-    """Returns all subpaths of `path`, like the find command"""
+def tree(path: str, inventory: Optional[FilesystemInventory] = None) -> set[str]:
+    """Returns all subpaths of `path`, like the find command
+
+    With an inventory covering `path` no directories are read.
+    """
+    if inventory is not None:
+        found = inventory.find(path, FIND_RESULT_TYPE_FILE_AND_DIR, same_mnt_only=False)
+        if found is not None:
+            return {path, *found}
+
     tree = {path}
     for root, dirs, files in os.walk(path):
         for file in files:
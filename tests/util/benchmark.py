@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Micro benchmarks comparing plugin implementations with their previous versions.
+This is not bundled in the test distribution but intended to be used for development purposes.
+Run it on a booted Garden Linux system (or container) with the python dependencies installed.
+
+Example Usage:
+    tests/util/benchmark.py sysctl
+    tests/util/benchmark.py sysctl --iterations 20
+    tests/util/benchmark.py find --root /usr --root /var
+    tests/util/benchmark.py shell --iterations 200
+"""
+
+import argparse
+import fnmatch
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, TypeVar
+
+# Add tests to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from plugins.find import FIND_RESULT_TYPE_FILE, Find  # noqa: E402
+from plugins.shell import ShellRunner  # noqa: E402
+from plugins.sysctl import Sysctl  # noqa: E402
+
+T = TypeVar("T")
+
+
+def measure(func: Callable[[], T], iterations: int) -> tuple[list[float], T]:
+    """Run func iterations times (at least once), return the durations in seconds and the last result"""
+    durations: list[float] = []
+    while True:
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+        if len(durations) >= iterations:
+            return durations, result
+
+
+def report(name: str, baseline: list[float], candidate: list[float]):
+    """Print timing statistics of the baseline and candidate implementation"""
+    for label, durations in (("baseline", baseline), ("candidate", candidate)):
+        print(
+            f"  {name} {label:9}: min {min(durations) * 1000:8.2f} ms, "
+            f"mean {statistics.mean(durations) * 1000:8.2f} ms"
+        )
+    print(f"  speedup (min): {min(baseline) / min(candidate):.1f}x")
+
+
+def legacy_collect_sysctl_parameters() -> dict[str, str]:
+    """Sysctl.collect_sysctl_parameters before the single-pass reader"""
+    sysctl_params: dict[str, str] = {}
+    base_path = "/proc/sys"
+    for root, _dirs, files in os.walk(base_path):
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            key = file_path[len(base_path) + 1 :].replace("/", ".")
+            try:
+                with open(f"/proc/sys/{key.replace('.', '/')}", "r") as f:
+                    sysctl_params[key] = f.read().strip()
+            except Exception:
+                continue
+    return dict(sorted(sysctl_params.items()))
+
+
+def benchmark_sysctl(iterations: int, args: argparse.Namespace):
+    """Compare the os.walk based and the single-pass /proc/sys reader"""
+    sysctl = Sysctl(None)
+    baseline, expected = measure(legacy_collect_sysctl_parameters, iterations)
+    candidate, actual = measure(sysctl.collect_sysctl_parameters, iterations)
+    print(f"sysctl: {len(actual)} parameters")
+    report("collect_sysctl_parameters", baseline, candidate)
+
+    # Values of dynamic parameters change between reads, only compare the keys.
+    # The legacy reader skips keys containing dots in path components (e.g. VLANs).
+    missing = set(expected) - set(actual)
+    if missing:
+        print(f"  keys only read by baseline: {', '.join(sorted(missing))}")
+
+
+def legacy_find(
+    root_paths: list[str], entry_type: str, pattern: str | None, same_mnt_only: bool
+) -> list[str]:
+    """Find before the scandir based walker (files only)"""
+    found = []
+    for root_path in root_paths:
+        root_dev = os.stat(root_path).st_dev
+        for dirpath, _dirnames, filenames in os.walk(root_path):
+            if entry_type != FIND_RESULT_TYPE_FILE:
+                continue
+            for filename in filenames:
+                if pattern and not fnmatch.fnmatch(filename, pattern):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                if same_mnt_only:
+                    try:
+                        if os.stat(full_path).st_dev != root_dev:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                found.append(full_path)
+    return found
+
+
+def benchmark_find(iterations: int, args: argparse.Namespace):
+    """Compare the os.walk based and the scandir based Find on the same mount"""
+    find = Find()
+    find.same_mnt_only = True
+    find.root_paths = args.root
+    find.entry_type = FIND_RESULT_TYPE_FILE
+    find.pattern = args.pattern
+
+    baseline, expected = measure(
+        lambda: legacy_find(args.root, FIND_RESULT_TYPE_FILE, args.pattern, True),
+        iterations,
+    )
+    candidate, actual = measure(lambda: list(find), iterations)
+
+    print(f"find: {len(actual)} files below {', '.join(args.root)}")
+    report("find", baseline, candidate)
+
+    # Files changing between runs (logs, caches) may differ
+    difference = set(expected) ^ set(actual)
+    if difference:
+        print(f"  paths found by only one implementation: {len(difference)}")
+        for path in sorted(difference)[:20]:
+            print(f"    {path}")
+
+
+def benchmark_shell(iterations: int, args: argparse.Namespace):
+    """Compare spawning a shell per command with the long-lived shell worker"""
+    spawn = ShellRunner(None, worker=False)
+    worker = ShellRunner(None, worker=True)
+    # Start the worker outside of the measurement
+    worker("true")
+
+    command: str = args.command
+
+    def run_spawned() -> subprocess.CompletedProcess:
+        return spawn(command, capture_output=True, ignore_exit_code=True)
+
+    def run_in_worker() -> subprocess.CompletedProcess:
+        return worker(command, capture_output=True, ignore_exit_code=True)
+
+    baseline, expected = measure(run_spawned, iterations)
+    candidate, actual = measure(run_in_worker, iterations)
+
+    print(f"shell: {command}")
+    report("ShellRunner", baseline, candidate)
+
+    if (expected.returncode, expected.stdout) != (actual.returncode, actual.stdout):
+        print("  results differ between the execution modes")
+
+
+BENCHMARKS = {
+    "find": benchmark_find,
+    "shell": benchmark_shell,
+    "sysctl": benchmark_sysctl,
+}
+
+
+def main():
+    """Main CLI function"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark plugin implementations against their previous versions",
+    )
+    parser.add_argument("benchmarks", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument(
+        "--iterations", "-n", type=int, default=10, help="Runs per implementation"
+    )
+    parser.add_argument(
+        "--root",
+        action="append",
+        help="find: root path to search, may be given multiple times (default: /usr)",
+    )
+    parser.add_argument("--pattern", help="find: fnmatch pattern of file names")
+    parser.add_argument(
+        "--command", default="true", help="shell: command to run (default: true)"
+    )
+    args = parser.parse_args()
+    args.root = args.root or ["/usr"]
+
+    for name in args.benchmarks:
+        BENCHMARKS[name](args.iterations, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
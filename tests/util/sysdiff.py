@@ -33,6 +33,8 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from plugins.shell import ShellRunner  # noqa: E402
+from plugins.sysdiff import SNAPSHOT_SECTIONS  # noqa: E402
+from plugins.sysdiff import RetentionPolicy  # noqa: E402
 from plugins.sysdiff import Sysdiff  # noqa: E402
 
 
@@ -64,7 +66,11 @@ def list_snapshots(sysdiff: Sysdiff, verbose: bool = False):
 
 
 def diff_snapshots(
-    sysdiff: Sysdiff, snapshot1_name: str, snapshot2_name: str, verbose: bool = False
+    sysdiff: Sysdiff,
+    snapshot1_name: str,
+    snapshot2_name: str,
+    verbose: bool = False,
+    sections: list | None = None,
 ):
     """Compare two snapshots and show differences"""
     try:
@@ -73,7 +79,9 @@ def diff_snapshots(
         print(f"  snapshot_b: {snapshot2_name}")
         print()
 
-        diff_result = sysdiff.compare_snapshots(snapshot1_name, snapshot2_name)
+        diff_result = sysdiff.compare_snapshots(
+            snapshot1_name, snapshot2_name, sections
+        )
 
         if not diff_result.has_changes:
             print("✓ No changes detected between snapshots")
@@ -126,6 +134,26 @@ def delete_snapshots(sysdiff: Sysdiff, snapshot_names: list, verbose: bool = Fal
         print(f"✗ Error deleting snapshots: {e}")
 
 
+def collect_garbage(sysdiff: Sysdiff, policy: RetentionPolicy, verbose: bool = False):
+    """Apply a retention policy and remove unreferenced objects"""
+    try:
+        usage_before = sysdiff.manager.disk_usage()
+        removed = sysdiff.manager.apply_retention(policy)
+        freed = sysdiff.manager.collect_garbage()
+        usage_after = sysdiff.manager.disk_usage()
+
+        if verbose and removed:
+            print(f"Deleted snapshot(s): {', '.join(removed)}")
+        print(
+            f"✓ Deleted {len(removed)} snapshot(s), "
+            f"disk usage {usage_before} -> {usage_after} bytes"
+        )
+        if verbose:
+            print(f"  Freed {freed} bytes of unreferenced objects")
+    except Exception as e:
+        print(f"✗ Error collecting garbage: {e}")
+
+
 def main():
     """Main CLI function"""
     parser = argparse.ArgumentParser(
@@ -135,11 +163,14 @@ def main():
 Examples:
   %(prog)s --name before-tests    # Create snapshot with name 'before-tests'
   %(prog)s --name after-tests     # Create snapshot with name 'after-tests'
+  %(prog)s --name after-tests --base before-snapshot  # Only re-hash changed files
   %(prog)s --list                 # List all snapshots
   %(prog)s --list --verbose       # List snapshots with details
   %(prog)s --delete snapshot-name # Delete specific snapshot
+  %(prog)s --gc --keep 5          # Keep the 5 newest snapshots, drop unused objects
   %(prog)s --diff snapshot_a snapshot_b     # Compare two snapshots
   %(prog)s --diff snapshot_a snapshot_b -v  # Compare with detailed output
+  %(prog)s --diff snapshot_a snapshot_b --sections files  # Only compare files
   %(prog)s --help                 # Show this help message
         """,
     )
@@ -173,10 +204,33 @@ Examples:
         help="Compare two snapshots and show differences",
     )
 
+    action_group.add_argument(
+        "--gc",
+        action="store_true",
+        help="Delete snapshots exceeding --keep/--max-age/--max-bytes and unreferenced objects",
+    )
+
     parser.add_argument(
         "--verbose", "-v", action="store_true", help="Enable verbose output"
     )
 
+    parser.add_argument(
+        "--keep", type=int, help="With --gc: keep at most this many snapshots"
+    )
+
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        metavar="SECONDS",
+        help="With --gc: delete snapshots older than this",
+    )
+
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        help="With --gc: delete the oldest snapshots until at most this many bytes are used",
+    )
+
     parser.add_argument(
         "--paths",
         nargs="+",
@@ -187,6 +241,26 @@ Examples:
         "--ignore-file", type=str, help="Path to file containing ignore patterns"
     )
 
+    parser.add_argument(
+        "--sections",
+        nargs="+",
+        choices=SNAPSHOT_SECTIONS,
+        help="Only compare these snapshot sections with --diff (default: all)",
+    )
+
+    parser.add_argument(
+        "--base",
+        type=str,
+        metavar="SNAPSHOT_NAME",
+        help="Reuse file hashes of this snapshot for files with unchanged metadata",
+    )
+
+    parser.add_argument(
+        "--full-verify",
+        action="store_true",
+        help="Re-hash all files even if --base is given",
+    )
+
     args = parser.parse_args()
 
     try:
@@ -200,10 +274,12 @@ Examples:
                 paths=args.paths,
                 ignore_file=Path(args.ignore_file) if args.ignore_file else None,
                 verbose=args.verbose,
+                base_snapshot=args.base,
+                full_verify=args.full_verify,
             )
 
             print(f"✓ Snapshot created successfully: {snapshot.name}")
-            print(f"  Location: {sysdiff.manager.state_dir}/{snapshot.name}.json.gz")
+            print(f"  Location: {sysdiff.manager.snapshot_file(snapshot.name)}")
             print(f"  Packages: {len(snapshot.packages)}")
             print(f"  Files: {len(snapshot.files)}")
             print(f"  Sysctl params: {len(snapshot.sysctl_params)}")
@@ -215,6 +291,10 @@ Examples:
                 print(f"  Created at: {snapshot.metadata.created_at}")
                 print(f"  Paths scanned: {snapshot.metadata.paths}")
                 print(f"  Ignore file used: {snapshot.metadata.ignore_file}")
+                print(f"  Base snapshot: {snapshot.metadata.base_snapshot}")
+                print("  Collector timings:")
+                for section, seconds in snapshot.metadata.collector_timings.items():
+                    print(f"    {section}: {seconds:.2f}s")
 
         elif args.list:
             list_snapshots(sysdiff, args.verbose)
@@ -222,9 +302,17 @@ Examples:
         elif args.delete:
             delete_snapshots(sysdiff, args.delete, args.verbose)
 
+        elif args.gc:
+            policy = RetentionPolicy(
+                max_count=args.keep, max_age=args.max_age, max_bytes=args.max_bytes
+            )
+            collect_garbage(sysdiff, policy, args.verbose)
+
         elif args.diff:
             snapshot_a_name, snapshot_b_name = args.diff
-            diff_snapshots(sysdiff, snapshot_a_name, snapshot_b_name, args.verbose)
+            diff_snapshots(
+                sysdiff, snapshot_a_name, snapshot_b_name, args.verbose, args.sections
+            )
 
         return 0
 